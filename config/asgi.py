@@ -3,6 +3,9 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Поток напоминаний /api/notifications/stream/ (SSE) работает только здесь:
+под WSGI ответ с асинхронным итератором не отдаётся по частям.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'workouts.middleware.TimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -54,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'workouts.middleware.NPlusOneMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -101,6 +103,66 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# По умолчанию — локальная память процесса; для нескольких воркеров
+# задайте общий бэкенд, например:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://redis:6379/0
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Сколько хранить отрендеренный месяц календаря (секунды).
+# Устаревание по записи — через версию данных пользователя.
+CALENDAR_CACHE_TIMEOUT = int(os.environ.get('CALENDAR_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Сколько хранить рассчитанную аналитику нагрузки (секунды); ключ
+# включает текущую дату и версию данных пользователя.
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get('ANALYTICS_CACHE_TIMEOUT', 60 * 60))
+
+# Сколько записей каждого типа отдаёт одна страница /api/sync/
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+# Надгробия удалённых записей старше RETENTION дней удаляются раз
+# в PRUNE_EVERY удалений; курсор старше них требует полной загрузки
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+SYNC_TOMBSTONE_PRUNE_EVERY = int(os.environ.get('SYNC_TOMBSTONE_PRUNE_EVERY', 100))
+
+# Диспетчер напоминаний (manage.py dispatch_notifications):
+# канал доставки — путь к классу с методом send(notification);
+# LogChannel пишет в лог и, если задан NOTIFICATION_LOG_FILE, в файл JSON Lines.
+NOTIFICATION_CHANNEL = os.environ.get('NOTIFICATION_CHANNEL', 'workouts.notifications.LogChannel')
+NOTIFICATION_LOG_FILE = os.environ.get('NOTIFICATION_LOG_FILE', '')
+# Время тренировки без указанного времени (для расчёта напоминания)
+NOTIFICATION_DEFAULT_TIME = os.environ.get('NOTIFICATION_DEFAULT_TIME', '09:00')
+# Как далеко вперёд держать напоминания в памяти (часы) и как часто
+# проверять изменения расписания (секунды)
+NOTIFICATION_HORIZON_HOURS = int(os.environ.get('NOTIFICATION_HORIZON_HOURS', 48))
+NOTIFICATION_POLL_SECONDS = float(os.environ.get('NOTIFICATION_POLL_SECONDS', 5))
+# Изменения расписания для диспетчера: без работающего диспетчера
+# изменения старше RETENTION часов удаляются раз в PRUNE_EVERY записей
+NOTIFICATION_CHANGE_RETENTION_HOURS = int(
+    os.environ.get('NOTIFICATION_CHANGE_RETENTION_HOURS', 24),
+)
+NOTIFICATION_CHANGE_PRUNE_EVERY = int(os.environ.get('NOTIFICATION_CHANGE_PRUNE_EVERY', 100))
+# После стольких неудачных попыток уведомление больше не отправляется
+NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', 5))
+# Поток /api/notifications/stream/: как часто процесс проверяет outbox
+# (один запрос на процесс, а не на соединение) и как часто шлёт heartbeat
+NOTIFICATION_STREAM_POLL_SECONDS = float(os.environ.get('NOTIFICATION_STREAM_POLL_SECONDS', 2))
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = float(
+    os.environ.get('NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 15),
+)
+# Срок одноразового пропуска к потоку (POST /api/notifications/stream/ticket/)
+NOTIFICATION_STREAM_TICKET_SECONDS = int(os.environ.get('NOTIFICATION_STREAM_TICKET_SECONDS', 30))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -152,8 +214,60 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Keyset-курсоры: стоимость страницы не зависит от её глубины
+    'DEFAULT_PAGINATION_CLASS': 'workouts.pagination.KeysetPagination',
 }
 
+# Размер страницы по умолчанию и верхняя граница для ?page_size=
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 200))
+
+# Максимум подходов в одном POST /api/workouts/{id}/sets/bulk/
+BULK_SETS_MAX_BATCH = int(os.environ.get('BULK_SETS_MAX_BATCH', 500))
+
+# Максимум подзапросов в одном POST /api/batch/
+BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+
+# Строк на одну выборку/пачку при потоковой выгрузке /api/export/
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Подходов в одной пачке импорта (bulk_create / COPY и одна транзакция)
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+
+# Секционирование подходов по месяцам created_at (только PostgreSQL,
+# см. workouts/partitions.py): включается до migrate, на SQLite игнорируется.
+# Сколько месяцев вперёд держать готовые секции и сколько месяцев
+# хранить подходы до архивации (manage.py partitions --archive)
+WORKOUTSET_PARTITIONING = os.environ.get(
+    'WORKOUTSET_PARTITIONING', 'False',
+).lower() in ('true', '1', 'yes')
+WORKOUTSET_PARTITIONS_AHEAD = int(os.environ.get('WORKOUTSET_PARTITIONS_AHEAD', 3))
+WORKOUTSET_RETENTION_MONTHS = int(os.environ.get('WORKOUTSET_RETENTION_MONTHS', 24))
+
+# Асинхронные варианты календаря, уведомлений и аналитики
+# (workouts/async_views.py) вместо синхронных — для запуска под ASGI.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False').lower() in ('true', '1', 'yes')
+# Независимые выборки одного запроса (тренировки и расписание календаря)
+# выполнять одновременно, каждую в своём потоке и соединении с БД
+ASYNC_PARALLEL_QUERIES = os.environ.get(
+    'ASYNC_PARALLEL_QUERIES', 'True',
+).lower() in ('true', '1', 'yes')
+
+# Замер запросов: заголовок Server-Timing и /metrics (формат Prometheus).
+# /metrics требует Authorization: Bearer <METRICS_TOKEN>; без токена — 403
+TIMING_ENABLED = os.environ.get('TIMING_ENABLED', 'True').lower() in ('true', '1', 'yes')
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'True').lower() in ('true', '1', 'yes')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Поиск N+1: одинаковые запросы NPLUSONE_THRESHOLD раз за HTTP-запрос.
+# По умолчанию включён вместе с DEBUG и только пишет в лог;
+# NPLUSONE_RAISE превращает предупреждение в исключение (для тестов).
+NPLUSONE_DETECTION = os.environ.get(
+    'NPLUSONE_DETECTION', str(DEBUG),
+).lower() in ('true', '1', 'yes')
+NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', 5))
+NPLUSONE_RAISE = os.environ.get('NPLUSONE_RAISE', 'False').lower() in ('true', '1', 'yes')
+
 # SimpleJWT
 from datetime import timedelta
 
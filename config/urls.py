@@ -5,6 +5,8 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from workouts.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('workouts.urls')),
@@ -15,4 +17,7 @@ urlpatterns = [
 
     # Auth: регистрация нового пользователя
     path('api/auth/', include('users.urls')),
+
+    # Метрики для Prometheus
+    path('metrics', metrics_view, name='metrics'),
 ]
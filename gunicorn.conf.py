@@ -0,0 +1,43 @@
+"""
+Gunicorn для продакшена: процессы-воркеры uvicorn (ASGI).
+
+Каждый воркер — один процесс с циклом событий: асинхронные
+представления (ASYNC_VIEWS) ждут БД, не занимая поток, и процесс
+держит одновременно много медленных запросов аналитики.
+
+Запуск: gunicorn -c gunicorn.conf.py config.asgi:application
+
+Кеш в памяти процесса (LocMemCache, по умолчанию) у каждого воркера
+свой: увеличение версии данных сбросило бы ответы только в воркере,
+принявшем запись. С несколькими воркерами нужен общий CACHE_BACKEND
+(в docker-compose — Redis), иначе сервер не запускается.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+# Медленный запрос дольше timeout — воркер перезапускается
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Перезапуск воркеров после N запросов (с разбросом) против утечек памяти
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    backend = os.environ.get('CACHE_BACKEND', '')
+    if workers > 1 and (not backend or backend.endswith('LocMemCache')):
+        raise RuntimeError(
+            f'{workers} воркеров с кешем в памяти процесса: задайте общий CACHE_BACKEND '
+            '(например, django.core.cache.backends.redis.RedisCache) или WEB_CONCURRENCY=1',
+        )
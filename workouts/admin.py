@@ -1,6 +1,16 @@
 from django.contrib import admin
 
-from .models import Exercise, ScheduledWorkout, Workout, WorkoutSet
+from .models import (
+    ArchivedSets,
+    DailyVolume,
+    Exercise,
+    Notification,
+    PersonalRecord,
+    ScheduledWorkout,
+    ScheduleRule,
+    Workout,
+    WorkoutSet,
+)
 
 
 @admin.register(Exercise)
@@ -33,3 +43,36 @@ class ScheduledWorkoutAdmin(admin.ModelAdmin):
     list_display = ['date', 'time', 'title', 'user', 'is_completed']
     list_filter = ['is_completed', 'user', 'date']
     filter_horizontal = ['exercises']
+
+
+@admin.register(ScheduleRule)
+class ScheduleRuleAdmin(admin.ModelAdmin):
+    list_display = ['title', 'user', 'start_date', 'until', 'count', 'interval']
+    list_filter = ['user']
+    filter_horizontal = ['exercises']
+
+
+@admin.register(DailyVolume)
+class DailyVolumeAdmin(admin.ModelAdmin):
+    list_display = ['date', 'user', 'volume', 'sets_count']
+    list_filter = ['user']
+
+
+@admin.register(ArchivedSets)
+class ArchivedSetsAdmin(admin.ModelAdmin):
+    list_display = ['workout', 'exercise', 'sets_count', 'volume', 'max_weight', 'last_set_at']
+    raw_id_fields = ['workout']
+
+
+@admin.register(PersonalRecord)
+class PersonalRecordAdmin(admin.ModelAdmin):
+    list_display = ['exercise', 'user', 'max_weight', 'best_e1rm', 'best_volume']
+    list_filter = ['user']
+    raw_id_fields = ['max_weight_set', 'best_e1rm_set', 'best_volume_set']
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['title', 'user', 'remind_at', 'sent_at', 'attempts']
+    list_filter = ['user']
+    raw_id_fields = ['scheduled']
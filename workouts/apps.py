@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_migrate
 
 
 class WorkoutsConfig(AppConfig):
     name = 'workouts'
+
+    def ready(self):
+        from . import partitions, signals  # noqa: F401
+
+        # Секции подходов вперёд при каждом migrate (только PostgreSQL)
+        post_migrate.connect(partitions.extend_after_migrate, sender=self)
+
+        if settings.TIMING_ENABLED:
+            from . import metrics
+            metrics.install()
+
+        if settings.NPLUSONE_DETECTION:
+            from . import middleware
+            middleware.install()
@@ -0,0 +1,382 @@
+"""
+Асинхронные варианты календаря, уведомлений и аналитики.
+
+Выборки и форматирование общие с views.py; здесь запросы выполняются
+через асинхронный ORM, и медленная агрегация не занимает поток воркера
+целиком — один ASGI-процесс держит много таких запросов одновременно
+(см. gunicorn.conf.py). Подключаются вместо синхронных при ASYNC_VIEWS.
+
+Асинхронный ORM сам по себе выполняет запросы по очереди в одном
+потоке, поэтому независимые выборки календаря (тренировки и расписание,
+каждая через свой читатель из readers.py) при ASYNC_PARALLEL_QUERIES
+идут в отдельных потоках, каждая со своим соединением с БД.
+
+Поток напоминаний (SSE) есть только асинхронный: открытое соединение
+ждёт событий в цикле событий процесса и не занимает поток.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import load, readers
+from .cache import CATALOG_SCOPE, aget_or_build, user_scope, volume_scope
+from .models import Notification
+from .notifications import hub, redeem_stream_ticket
+from .views import (
+    CALENDAR_VIEWS,
+    calendar_days,
+    calendar_range,
+    calendar_rules,
+    calendar_scheduled,
+    calendar_summary,
+    calendar_workouts,
+    days_option,
+    format_heatmap,
+    format_max_weight,
+    format_muscles,
+    format_records,
+    format_volume,
+    heatmap_options,
+    heatmap_rows,
+    load_options,
+    max_weight_options,
+    max_weight_rows,
+    muscle_options,
+    muscle_rows,
+    record_rows,
+    summary_rules,
+    summary_scheduled,
+    summary_workouts,
+    upcoming,
+    upcoming_range,
+    upcoming_scheduled,
+    volume_rows,
+)
+
+
+def _fetch(reader, queryset):
+    # Поток из пула: соединение этого потока закрывается так же,
+    # как в конце обычного запроса (с учётом CONN_MAX_AGE)
+    close_old_connections()
+    try:
+        return reader.read(queryset)
+    finally:
+        close_old_connections()
+
+
+async def fetch_all(*reads):
+    """Выполнить независимые чтения (читатель, queryset), по возможности одновременно."""
+    if not settings.ASYNC_PARALLEL_QUERIES:
+        return [await reader.aread(queryset) for reader, queryset in reads]
+    return await asyncio.gather(*(
+        sync_to_async(_fetch, thread_sensitive=False)(reader, queryset)
+        for reader, queryset in reads
+    ))
+
+
+class AsyncAPIView(View):
+    """
+    Минимальный асинхронный аналог APIView: аутентификация классами
+    из REST_FRAMEWORK, только для аутентифицированных, ответ — JSON
+    тем же JSONRenderer, что и у синхронных представлений.
+    """
+    http_method_names = ['get', 'head', 'options']
+
+    def _authenticate(self, request):
+        drf_request = Request(request, authenticators=[
+            auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ])
+        try:
+            user = drf_request.user
+        except exceptions.APIException as exc:
+            return None, exc, drf_request
+        if not user.is_authenticated:
+            return None, exceptions.NotAuthenticated(), drf_request
+        return user, None, drf_request
+
+    def _error(self, exc, drf_request):
+        # Как exception_handler DRF: 401 с WWW-Authenticate, если его
+        # может выставить первый аутентификатор, иначе 403
+        headers = {}
+        status = exc.status_code
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            header = drf_request.authenticators[0].authenticate_header(drf_request)
+            if header:
+                headers['WWW-Authenticate'] = header
+            else:
+                status = 403
+
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        return self.render(data, status=status, headers=headers)
+
+    def render(self, data, status=200, headers=None):
+        return HttpResponse(
+            JSONRenderer().render(data),
+            content_type='application/json',
+            status=status,
+            headers=headers,
+        )
+
+    async def dispatch(self, request, *args, **kwargs):
+        user, exc, drf_request = await sync_to_async(self._authenticate)(request)
+        if exc is not None:
+            return self._error(exc, drf_request)
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncCalendarView(AsyncAPIView):
+    """GET /api/calendar/ — см. CalendarView."""
+
+    async def get(self, request):
+        start, end = calendar_range(request.GET)
+        user = request.user
+        view = request.GET.get('view', 'full')
+        if view not in CALENDAR_VIEWS:
+            return self.render(
+                {'error': f'view: одно из {", ".join(CALENDAR_VIEWS)}'}, status=400,
+            )
+
+        if view == 'summary':
+            async def build_summary():
+                workouts = [row async for row in summary_workouts(user, start, end)]
+                scheduled = [row async for row in summary_scheduled(user, start, end)]
+                rules = [row async for row in summary_rules(user, start, end)]
+                return calendar_summary(start, end, workouts, scheduled, rules)
+
+            result = await aget_or_build(
+                'calendar-summary',
+                (user_scope(user.pk),),
+                (start, end),
+                build_summary,
+                settings.CALENDAR_CACHE_TIMEOUT,
+            )
+            return self.render(result)
+
+        async def build():
+            workouts, scheduled, rules = await fetch_all(
+                (readers.workouts, calendar_workouts(user, start, end)),
+                (readers.scheduled, calendar_scheduled(user, start, end)),
+                (readers.rules, calendar_rules(user, start, end)),
+            )
+            return calendar_days(start, end, workouts, scheduled, rules)
+
+        result = await aget_or_build(
+            'calendar',
+            (user_scope(user.pk), CATALOG_SCOPE),
+            (start, end),
+            build,
+            settings.CALENDAR_CACHE_TIMEOUT,
+        )
+        return self.render(result)
+
+
+class AsyncUpcomingNotificationsView(AsyncAPIView):
+    """GET /api/notifications/upcoming/ — см. UpcomingNotificationsView."""
+
+    async def get(self, request):
+        scheduled, rules = await fetch_all(
+            (readers.scheduled, upcoming_scheduled(request.user)),
+            (readers.rules, calendar_rules(request.user, *upcoming_range())),
+        )
+        return self.render(upcoming(scheduled, rules))
+
+
+class AsyncVolumeAnalyticsView(AsyncAPIView):
+    """GET /api/analytics/volume/ — см. VolumeAnalyticsView."""
+
+    async def get(self, request):
+        days, error = days_option(request.GET, 30)
+        if error:
+            return self.render({'error': error}, status=400)
+        rows = [row async for row in volume_rows(request.user, days)]
+        return self.render(format_volume(rows))
+
+
+class AsyncMaxWeightAnalyticsView(AsyncAPIView):
+    """GET /api/analytics/max/ — см. MaxWeightAnalyticsView."""
+
+    async def get(self, request):
+        options, error = max_weight_options(request.GET)
+        if error:
+            return self.render({'error': error}, status=400)
+
+        rows = [row async for row in max_weight_rows(request.user, *options)]
+        return self.render(format_max_weight(rows))
+
+
+class AsyncPersonalRecordsView(AsyncAPIView):
+    """GET /api/analytics/records/ — см. PersonalRecordsView."""
+
+    async def get(self, request):
+        rows = [row async for row in record_rows(request.user)]
+        return self.render(format_records(rows))
+
+
+class AsyncMuscleAnalyticsView(AsyncAPIView):
+    """GET /api/analytics/muscles/ — см. MuscleAnalyticsView."""
+
+    async def get(self, request):
+        options, error = muscle_options(request.GET)
+        if error:
+            return self.render({'error': error}, status=400)
+        user = request.user
+
+        async def build():
+            return format_muscles([row async for row in muscle_rows(user, *options)])
+
+        result = await aget_or_build(
+            'muscles',
+            (user_scope(user.pk), CATALOG_SCOPE),
+            (timezone.localdate(), *options),
+            build,
+            settings.ANALYTICS_CACHE_TIMEOUT,
+        )
+        return self.render(result)
+
+
+class AsyncLoadAnalyticsView(AsyncAPIView):
+    """GET /api/analytics/load/ — см. LoadAnalyticsView."""
+
+    async def get(self, request):
+        options, error = load_options(request.GET)
+        if error:
+            return self.render({'error': error}, status=400)
+        user = request.user
+
+        async def build():
+            # Расчёт на массивах идёт вне цикла событий
+            return await sync_to_async(load.training_load)(user, **options)
+
+        result = await aget_or_build(
+            'load',
+            (user_scope(user.pk), CATALOG_SCOPE),
+            (timezone.localdate(), *options.values()),
+            build,
+            settings.ANALYTICS_CACHE_TIMEOUT,
+        )
+        return self.render(result)
+
+
+class AsyncHeatmapView(AsyncAPIView):
+    """GET /api/analytics/heatmap/ — см. HeatmapView."""
+
+    async def get(self, request):
+        options, error = heatmap_options(request.GET)
+        if error:
+            return self.render({'error': error}, status=400)
+        year, metric = options
+        user = request.user
+
+        async def build():
+            rows = [row async for row in heatmap_rows(user, year, metric)]
+            return format_heatmap(year, metric, rows)
+
+        result = await aget_or_build(
+            'heatmap',
+            (volume_scope(user.pk, year),),
+            (metric,),
+            build,
+            settings.ANALYTICS_CACHE_TIMEOUT,
+        )
+        return self.render(result)
+
+
+def sse_event(row):
+    """Уведомление в формате text/event-stream; id — для Last-Event-ID."""
+    data = JSONRenderer().render({
+        'id': row['id'],
+        'scheduled': row['scheduled_id'],
+        'rule': row['rule_id'],
+        'rule_date': row['rule_date'] and row['rule_date'].isoformat(),
+        'remind_at': timezone.localtime(row['remind_at']).isoformat(),
+        'title': row['title'],
+        'body': row['body'],
+    })
+    return b'id: %d\nevent: reminder\ndata: %s\n\n' % (row['id'], data)
+
+
+class AsyncNotificationStreamView(AsyncAPIView):
+    """
+    GET /api/notifications/stream/
+
+    Server-Sent Events: напоминания пользователя по мере того, как
+    диспетчер (manage.py dispatch_notifications) их создаёт, и
+    комментарий-heartbeat раз в NOTIFICATION_STREAM_HEARTBEAT_SECONDS.
+    EventSource не умеет заголовки, поэтому вместо JWT можно передать
+    одноразовый пропуск ?ticket= (POST /api/notifications/stream/ticket/).
+    При переподключении с Last-Event-ID сначала отдаются пропущенные
+    уведомления. Требует ASGI.
+    """
+
+    def _authenticate(self, request):
+        ticket = request.GET.get('ticket')
+        if ticket is None or 'HTTP_AUTHORIZATION' in request.META:
+            return super()._authenticate(request)
+
+        # 401 с WWW-Authenticate, как и без пропуска
+        drf_request = Request(request, authenticators=[JWTAuthentication()])
+        user_id = redeem_stream_ticket(ticket)
+        user = User.objects.filter(pk=user_id, is_active=True).first() if user_id else None
+        if user is None:
+            return None, exceptions.AuthenticationFailed(
+                'Пропуск недействителен или уже использован', code='ticket_not_valid',
+            ), drf_request
+        return user, None, drf_request
+
+    async def events(self, user_id, last_event_id):
+        queue = hub.subscribe(user_id)
+        try:
+            last = last_event_id
+            if last_event_id is not None:
+                missed = (
+                    Notification.objects
+                    .filter(user_id=user_id, id__gt=last_event_id)
+                    .order_by('id')
+                    .values(*hub.columns)
+                )
+                async for row in missed:
+                    last = row['id']
+                    yield sse_event(row)
+
+            while True:
+                try:
+                    row = await asyncio.wait_for(
+                        queue.get(), settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS,
+                    )
+                except TimeoutError:
+                    yield b': heartbeat\n\n'
+                    continue
+                # Уже отдано из пропущенных
+                if last is None or row['id'] > last:
+                    yield sse_event(row)
+        finally:
+            hub.unsubscribe(user_id, queue)
+
+    async def get(self, request):
+        last_event_id = request.headers.get('Last-Event-ID', '')
+        last_event_id = int(last_event_id) if last_event_id.isdigit() else None
+
+        response = StreamingHttpResponse(
+            self.events(request.user.pk, last_event_id),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Прокси (nginx) не должен буферизовать поток
+        response['X-Accel-Buffering'] = 'no'
+        return response
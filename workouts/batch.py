@@ -0,0 +1,140 @@
+"""
+Пакетные запросы: POST /api/batch/.
+
+При запуске клиент подряд запрашивает несколько списков, и по медленной
+мобильной сети каждый запрос платит за соединение, проверку JWT,
+загрузку пользователя и цепочку middleware. Пакет выполняет подзапросы
+к тем же представлениям (по корневому URLconf) внутри одного HTTP-запроса:
+пользователь проверен один раз и передаётся представлениям готовым
+(ForcedAuthentication DRF), middleware не повторяются.
+
+С atomic все подзапросы идут в одной транзакции: первый ответ
+с ошибкой откатывает пакет целиком, остальные подзапросы не выполняются.
+"""
+
+import json
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework.response import Response
+
+from .middleware import query_scope
+
+# Заголовки пакета, которые не должны достаться подзапросам
+_SKIPPED_META = (
+    'CONTENT_TYPE', 'CONTENT_LENGTH',
+    'HTTP_IF_NONE_MATCH', 'HTTP_IF_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+)
+
+# Маршруты, которые нельзя вызывать из пакета
+EXCLUDED_ROUTES = {'batch'}
+
+
+class SubRequest(HttpRequest):
+    """Подзапрос пакета: заголовки, хост и схема — от запроса пакета."""
+
+    def __init__(self, parent, method, path, body):
+        super().__init__()
+        url = urlsplit(path)
+        content = b'' if body is None else json.dumps(body).encode()
+        self.parent = parent
+        self.method = method
+        self.path = self.path_info = url.path
+        self.META = {
+            key: value for key, value in parent.META.items() if key not in _SKIPPED_META
+        }
+        self.META.update({
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(content)),
+        })
+        self.GET = QueryDict(url.query)
+        self.COOKIES = parent.COOKIES
+        self._stream = BytesIO(content)
+        self._read_started = False
+
+    def _get_scheme(self):
+        return self.parent.scheme
+
+
+def _error(status, message):
+    return {'status': status, 'headers': {}, 'body': {'error': message}}
+
+
+def _body(response):
+    # Ответ DRF ещё не отрендерен — данные берутся как есть
+    if isinstance(response, Response):
+        return response.data
+    if not response.content:
+        return None
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content)
+    return response.content.decode(response.charset)
+
+
+def call(request, item):
+    """Выполнить подзапрос item ({method, path, body}) от имени пользователя request."""
+    sub = SubRequest(request._request, item['method'], item['path'], item.get('body'))
+    try:
+        match = resolve(sub.path_info)
+    except Resolver404:
+        return _error(404, f'Маршрут не найден: {sub.path_info}')
+    if match.url_name in EXCLUDED_ROUTES:
+        return _error(400, f'Маршрут нельзя вызвать из пакета: {sub.path_info}')
+
+    sub.resolver_match = match
+    sub.user = request.user
+    # APIView подзапроса не проверяет JWT заново (ForcedAuthentication)
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+
+    view = match.func
+    if iscoroutinefunction(view):
+        view = async_to_sync(view)
+    response = view(sub, *match.args, **match.kwargs)
+
+    if response.streaming:
+        response.close()
+        return _error(400, f'Потоковый ответ нельзя получить в пакете: {sub.path_info}')
+    return {
+        'status': response.status_code,
+        'headers': {
+            name: value for name, value in response.items() if name != 'Content-Type'
+        },
+        'body': _body(response),
+    }
+
+
+def run(request, items, atomic=False):
+    """
+    Ответы подзапросов по порядку и признак отката.
+
+    С atomic пакет выполняется в одной транзакции и останавливается
+    на первом ответе с ошибкой (откат — True).
+    """
+    responses = []
+
+    def execute():
+        for index, item in enumerate(items):
+            token = query_scope.set(index)
+            try:
+                responses.append(call(request, item))
+            finally:
+                query_scope.reset(token)
+            if atomic and responses[-1]['status'] >= 400:
+                return True
+        return False
+
+    if not atomic:
+        return responses, execute()
+    with transaction.atomic():
+        rolled_back = execute()
+        if rolled_back:
+            transaction.set_rollback(True)
+    return responses, rolled_back
@@ -0,0 +1,306 @@
+"""
+Замер эндпоинтов workouts/urls.py внутри процесса.
+
+Каждый маршрут вызывается через тестовый клиент DRF с JWT реальных
+пользователей (см. generate_data) — запрос проходит весь стек middleware.
+Для маршрута считаются p50/p95/p99 времени ответа, число SQL-запросов
+и размер тела. Пишущие запросы выполняются в транзакции с откатом,
+поэтому замер повторяем и не меняет данные (версии кеша при этом
+всё же увеличиваются).
+
+Результат — JSON (meta + results), который можно сравнить с результатом
+другого коммита: compare() показывает изменение p95 по маршрутам.
+"""
+
+import math
+import platform
+import statistics
+import subprocess
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+from importlib import import_module
+from time import perf_counter
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.utils.timezone import localdate
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import recurrence
+from .models import Exercise, ScheduledWorkout, ScheduleRule, Workout, WorkoutSet
+
+URLCONF = 'workouts.urls'
+
+# Небольшая выгрузка Strong для маршрута импорта
+SAMPLE_CSV = """Date,Workout Name,Duration,Exercise Name,Set Order,Weight,Reps,Distance,Seconds,Notes,Workout Notes,RPE
+2020-01-06 18:00:00,Грудь,1h,Bench Press (Barbell),1,60,10,,,,,
+2020-01-06 18:00:00,Грудь,1h,Bench Press (Barbell),2,70,8,,,,,
+2020-01-06 18:00:00,Грудь,1h,Squat (Barbell),1,100,5,,,,,
+"""
+
+
+def route_names():
+    """Имена маршрутов workouts/urls.py."""
+    return {
+        pattern.name
+        for pattern in import_module(URLCONF).urlpatterns
+        if pattern.name
+    }
+
+
+# Запросы клиента при запуске — замеряются и одним пакетом
+LAUNCH_PATHS = (
+    '/api/workouts/',
+    '/api/schedule/',
+    '/api/notifications/upcoming/',
+    '/api/analytics/records/',
+    '/api/calendar/',
+)
+
+
+def cases(user):
+    """
+    (маршрут, метод, url, тело) для пользователя с историей.
+
+    Тело может быть функцией: загружаемый файл нужен новый на каждый запрос.
+    """
+    workout = Workout.objects.filter(user=user).order_by('-start_time').first()
+    workout_set = WorkoutSet.objects.filter(workout=workout).first()
+    scheduled = ScheduledWorkout.objects.filter(user=user).order_by('date').first()
+    exercise = Exercise.objects.filter(user__isnull=True).order_by('pk').first()
+    rule = ScheduleRule.objects.filter(user=user).order_by('pk').first()
+    if workout is None or workout_set is None or scheduled is None or rule is None:
+        raise ValueError(f'У пользователя {user} нет тренировок или расписания')
+
+    exercise_ids = list(scheduled.exercises.values_list('pk', flat=True))
+
+    # Ближайшее повторение правила (запись откатывается, дата одна на все замеры)
+    today = max(localdate(), rule.start_date)
+    day = next(recurrence.occurrences(
+        recurrence.pattern(rule), today, today + timedelta(days=28),
+    )).isoformat()
+    occurrence = f'/api/schedule-rules/{rule.pk}/occurrences/{day}'
+    rule_data = {
+        'title': 'Программа', 'weekdays': [0, 2, 4], 'start_date': '2030-01-01',
+        'exercise_ids': exercise_ids,
+    }
+
+    sets = [{'exercise': exercise.pk, 'weight': 50, 'reps': 10} for _ in range(10)]
+
+    def upload():
+        return {'file': SimpleUploadedFile(
+            'strong.csv', SAMPLE_CSV.encode(), content_type='text/csv',
+        )}
+
+    return [
+        ('api-root', 'get', '/api/', None),
+        ('exercise-list', 'get', '/api/exercises/', None),
+        ('exercise-list', 'post', '/api/exercises/',
+         {'name': 'Тяга', 'muscle_group': 'BACK'}),
+        ('exercise-detail', 'get', f'/api/exercises/{exercise.pk}/', None),
+        ('workout-list', 'get', '/api/workouts/', None),
+        ('workout-list', 'post', '/api/workouts/', {'note': 'Ноги'}),
+        ('workout-detail', 'get', f'/api/workouts/{workout.pk}/', None),
+        ('workout-detail', 'patch', f'/api/workouts/{workout.pk}/', {'note': 'Спина'}),
+        ('workout-detail', 'delete', f'/api/workouts/{workout.pk}/', None),
+        ('workout-finish', 'post', f'/api/workouts/{workout.pk}/finish/', None),
+        ('workout-bulk-sets', 'post', f'/api/workouts/{workout.pk}/sets/bulk/', sets),
+        ('workoutset-list', 'get', '/api/sets/', None),
+        ('workoutset-list', 'post', '/api/sets/',
+         {'workout': workout.pk, 'exercise': exercise.pk, 'weight': 60, 'reps': 8}),
+        ('workoutset-detail', 'get', f'/api/sets/{workout_set.pk}/', None),
+        ('workoutset-detail', 'patch', f'/api/sets/{workout_set.pk}/', {'reps': 9}),
+        ('workoutset-detail', 'delete', f'/api/sets/{workout_set.pk}/', None),
+        ('schedule-list', 'get', '/api/schedule/', None),
+        ('schedule-list', 'post', '/api/schedule/',
+         {'date': '2030-01-01', 'title': 'Грудь', 'exercise_ids': exercise_ids}),
+        ('schedule-detail', 'get', f'/api/schedule/{scheduled.pk}/', None),
+        ('schedule-detail', 'put', f'/api/schedule/{scheduled.pk}/',
+         {'date': '2030-01-02', 'title': 'Грудь', 'exercise_ids': exercise_ids}),
+        ('schedule-detail', 'delete', f'/api/schedule/{scheduled.pk}/', None),
+        ('schedule-complete', 'post', f'/api/schedule/{scheduled.pk}/complete/', None),
+        ('schedule-start', 'post', f'/api/schedule/{scheduled.pk}/start/', None),
+        ('schedulerule-list', 'get', '/api/schedule-rules/', None),
+        ('schedulerule-list', 'post', '/api/schedule-rules/', rule_data),
+        ('schedulerule-detail', 'get', f'/api/schedule-rules/{rule.pk}/', None),
+        ('schedulerule-detail', 'put', f'/api/schedule-rules/{rule.pk}/', rule_data),
+        ('schedulerule-detail', 'delete', f'/api/schedule-rules/{rule.pk}/', None),
+        ('schedulerule-occurrence', 'patch', f'{occurrence}/', {'time': '07:00'}),
+        ('schedulerule-occurrence', 'delete', f'{occurrence}/', None),
+        ('schedulerule-occurrence-complete', 'post', f'{occurrence}/complete/', None),
+        ('schedulerule-occurrence-start', 'post', f'{occurrence}/start/', None),
+        ('calendar', 'get', '/api/calendar/', None),
+        ('calendar', 'get', '/api/calendar/?view=summary', None),
+        ('notifications-upcoming', 'get', '/api/notifications/upcoming/', None),
+        ('notifications-stream', 'get', '/api/notifications/stream/', None),
+        ('notifications-stream-ticket', 'post', '/api/notifications/stream/ticket/', None),
+        ('analytics-volume', 'get', '/api/analytics/volume/?days=365', None),
+        ('analytics-max', 'get',
+         f'/api/analytics/max/?exercise_id={exercise.pk}&days=365', None),
+        ('analytics-records', 'get', '/api/analytics/records/', None),
+        ('analytics-muscles', 'get', '/api/analytics/muscles/?days=365', None),
+        ('analytics-load', 'get', '/api/analytics/load/?days=365', None),
+        ('analytics-heatmap', 'get', '/api/analytics/heatmap/', None),
+        ('export', 'get', '/api/export/?format=ndjson', None),
+        ('import', 'post', '/api/import/', upload),
+        ('sync', 'get', '/api/sync/?since=0', None),
+        ('batch', 'post', '/api/batch/', {'requests': [
+            {'method': 'GET', 'path': path} for path in LAUNCH_PATHS
+        ]}),
+    ]
+
+
+def client_for(user, host='localhost'):
+    client = APIClient(HTTP_HOST=host, raise_request_exception=False)
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}',
+    )
+    return client
+
+
+def percentile(values, p):
+    """Перцентиль методом ближайшего ранга."""
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def request(client, method, url, data, cold_cache=False):
+    """Один запрос: (статус, секунды, SQL-запросов, байт тела)."""
+    if callable(data):
+        data = data()
+    upload = isinstance(data, dict) and any(
+        isinstance(value, SimpleUploadedFile) for value in data.values()
+    )
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    if cold_cache:
+        cache.clear()
+
+    # Пишущие запросы откатываются: следующий повтор видит те же данные
+    rollback = nullcontext() if method == 'get' else transaction.atomic()
+    with rollback, connection.execute_wrapper(count):
+        started = perf_counter()
+        response = getattr(client, method)(
+            url, data, format='multipart' if upload else 'json',
+        )
+        if not response.streaming:
+            body = response.content
+        elif response.is_async:
+            # Открытый поток (SSE): замеряется только установка соединения
+            body = b''
+        else:
+            body = b''.join(response.streaming_content)
+        elapsed = perf_counter() - started
+        if method != 'get':
+            transaction.set_rollback(True)
+
+    return response.status_code, elapsed, queries, len(body)
+
+
+def run(users, iterations=20, warmup=2, cold_cache=False, host='localhost', progress=None):
+    """
+    Замер всех маршрутов: запросы по кругу от имени users.
+
+    Возвращает список результатов по (маршрут, метод) в порядке cases().
+    """
+    plans = [(client_for(user, host), cases(user)) for user in users]
+    results = []
+
+    for index, (name, method, url, _) in enumerate(plans[0][1]):
+        samples = []
+        for attempt in range(warmup + iterations):
+            client, user_cases = plans[attempt % len(plans)]
+            _, _, user_url, data = user_cases[index]
+            sample = request(client, method, user_url, data, cold_cache)
+            if attempt >= warmup:
+                samples.append(sample)
+
+        statuses = [status for status, *_ in samples]
+        times = [elapsed * 1000 for _, elapsed, _, _ in samples]
+        queries = [count for _, _, count, _ in samples]
+        sizes = [size for *_, size in samples]
+        result = {
+            'route': name,
+            'method': method.upper(),
+            'url': url,
+            'status': statistics.mode(statuses),
+            'samples': len(samples),
+            'p50_ms': round(percentile(times, 50), 3),
+            'p95_ms': round(percentile(times, 95), 3),
+            'p99_ms': round(percentile(times, 99), 3),
+            'mean_ms': round(statistics.fmean(times), 3),
+            'queries': percentile(queries, 50),
+            'queries_max': max(queries),
+            'bytes': percentile(sizes, 50),
+        }
+        results.append(result)
+        if progress:
+            progress(result)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, users, iterations, warmup, cold_cache):
+    """Результаты с описанием окружения — для сохранения в JSON."""
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'debug': settings.DEBUG,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'users': len(users),
+            'iterations': iterations,
+            'warmup': warmup,
+            'cold_cache': cold_cache,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, results, threshold=20):
+    """
+    Изменение p95 и числа запросов относительно прежнего отчёта.
+
+    (маршрут, метод, p95 было, p95 стало, изменение %, запросов было,
+    запросов стало, регрессия) — регрессия, если p95 вырос больше
+    чем на threshold % или запросов стало больше.
+    """
+    # id в url зависят от данных, поэтому сравниваем по маршруту и методу
+    before = {(r['route'], r['method']): r for r in baseline['results']}
+    rows = []
+    for result in results:
+        old = before.get((result['route'], result['method']))
+        if old is None:
+            continue
+        change = (
+            (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            if old['p95_ms'] else 0.0
+        )
+        rows.append((
+            result['route'], result['method'],
+            old['p95_ms'], result['p95_ms'], round(change, 1),
+            old['queries'], result['queries'],
+            change > threshold or result['queries'] > old['queries'],
+        ))
+    return rows
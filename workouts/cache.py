@@ -0,0 +1,108 @@
+"""
+Версионированный кеш отрендеренных ответов.
+
+Каждой области данных (scope) — например, данным одного пользователя —
+соответствует номер версии в кеше. Запись в области увеличивает версию
+(см. signals.py), а ключи готовых ответов содержат текущие версии,
+поэтому устаревший ответ просто перестаёт находиться и вытесняется
+по TTL — удалять ключи по одному не нужно.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Справочник общих упражнений: его правка затрагивает всех пользователей
+CATALOG_SCOPE = 'catalog'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def exercises_scope(user_id):
+    """Только пользовательские упражнения (ETag списка упражнений)."""
+    return f'exercises:{user_id}'
+
+
+def volume_scope(user_id, year):
+    """Дневной тоннаж пользователя за год (тепловая карта)."""
+    return f'volume:{user_id}:{year}'
+
+
+def _version_key(scope):
+    return f'data-version:{scope}'
+
+
+def get_version(scope):
+    """Текущая версия области (создаётся при первом обращении)."""
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Начальное значение — время в наносекундах: после вытеснения
+        # ключа версия не повторит ни одну из прежних
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(scope):
+    key = _version_key(scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_version(scope):
+    """
+    Сделать недействительными все ответы области.
+
+    Версия увеличивается сразу (чтобы сам пишущий запрос не прочитал
+    старый ответ) и ещё раз после коммита: параллельный запрос мог
+    успеть закешировать данные до коммита под промежуточной версией.
+    """
+    _bump(scope)
+    transaction.on_commit(lambda: _bump(scope))
+
+
+async def aget_version(scope):
+    """Асинхронный вариант get_version."""
+    key = _version_key(scope)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def _response_key(name, scopes, versions, params):
+    versions = '.'.join(map(str, versions))
+    return ':'.join([name, *scopes, versions, *map(str, params)])
+
+
+def get_or_build(name, scopes, params, build, timeout):
+    """
+    Ответ из кеша или build() с сохранением в кеш.
+
+    Ключ — имя ответа, версии всех scopes и параметры запроса.
+    """
+    versions = [get_version(scope) for scope in scopes]
+    key = _response_key(name, scopes, versions, params)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+async def aget_or_build(name, scopes, params, build, timeout):
+    """Асинхронный вариант get_or_build: build — корутинная функция."""
+    versions = [await aget_version(scope) for scope in scopes]
+    key = _response_key(name, scopes, versions, params)
+    value = await cache.aget(key)
+    if value is None:
+        value = await build()
+        await cache.aset(key, value, timeout)
+    return value
@@ -0,0 +1,82 @@
+"""
+Общий справочник упражнений в памяти процесса.
+
+Справочник (user IS NULL, ~150 строк из 0003_load_exercises) меняется
+почти никогда, а читается на каждый список упражнений и каждую проверку
+exercise в подходах и расписании. Процесс держит его копию вместе
+с версией CATALOG_SCOPE из общего кеша (cache.py): сигнал изменения
+общего упражнения увеличивает версию, и каждый процесс перечитывает
+справочник при первом обращении после этого.
+
+Порядок — (name, id) по кодовым точкам; пользовательские упражнения
+вливаются в него на каждый запрос (heapq.merge), справочник
+не пересортировывается.
+"""
+
+import copy
+import heapq
+import threading
+from operator import attrgetter
+
+from django.db import connection
+
+from .cache import CATALOG_SCOPE, get_version
+from .models import Exercise
+
+ORDERING = ('name', 'id')
+sort_key = attrgetter(*ORDERING)
+
+_lock = threading.Lock()
+# (версия, упражнения по порядку, упражнения по id, прочитан в транзакции)
+_state = (None, (), {}, False)
+
+
+def _current():
+    global _state
+    version = get_version(CATALOG_SCOPE)
+    # Прочитанное внутри транзакции могло включать её незакоммиченные
+    # изменения, а откат версию не увеличит — перечитываем вне транзакции
+    if _state[0] != version or (_state[3] and not connection.in_atomic_block):
+        # Версия читается до выборки: запись, успевшая после неё,
+        # увеличит версию ещё раз (после коммита), и справочник перечитается
+        exercises = tuple(sorted(
+            Exercise.objects.filter(user__isnull=True).order_by(), key=sort_key,
+        ))
+        with _lock:
+            _state = (
+                version, exercises, {e.pk: e for e in exercises},
+                connection.in_atomic_block,
+            )
+    return _state
+
+
+def invalidate():
+    """Сбросить копию процесса (другие процессы увидят новую версию)."""
+    global _state
+    with _lock:
+        _state = (None, (), {}, False)
+
+
+def version():
+    return get_version(CATALOG_SCOPE)
+
+
+def global_exercises():
+    """Общие упражнения в порядке ORDERING (объекты не изменять)."""
+    return _current()[1]
+
+
+def get(pk):
+    """Общее упражнение по id (копия) или None."""
+    exercise = _current()[2].get(pk)
+    return copy.copy(exercise) if exercise is not None else None
+
+
+def contains(pk):
+    return pk in _current()[2]
+
+
+def exercises_for(user):
+    """Общие упражнения и упражнения пользователя в порядке ORDERING."""
+    custom = sorted(Exercise.objects.filter(user=user).order_by(), key=sort_key)
+    return list(heapq.merge(global_exercises(), custom, key=sort_key))
@@ -0,0 +1,140 @@
+"""
+Потоковая выгрузка истории подходов (NDJSON / CSV).
+
+Строки читаются итератором (на PostgreSQL — серверным курсором)
+пачками по EXPORT_CHUNK_SIZE и сразу кодируются в байты, поэтому
+память не зависит от размера истории, а первые байты уходят клиенту
+до того, как запрос дочитан до конца.
+
+Под ASGI Django собирает синхронный поток целиком перед отправкой
+(sync_to_async(list)), поэтому там выгрузка и прогресс импорта
+отдаются асинхронным итератором (см. for_server()).
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils import timezone
+
+from .models import WorkoutSet
+
+# Колонка выгрузки → поле запроса
+COLUMNS = (
+    ('set_id', 'id'),
+    ('workout_id', 'workout_id'),
+    ('workout_start', 'workout__start_time'),
+    ('workout_end', 'workout__end_time'),
+    ('workout_status', 'workout__status'),
+    ('workout_note', 'workout__note'),
+    ('exercise_id', 'exercise_id'),
+    ('exercise_name', 'exercise__name'),
+    ('muscle_group', 'exercise__muscle_group'),
+    ('weight', 'weight'),
+    ('reps', 'reps'),
+    ('rir', 'rir'),
+    ('created_at', 'created_at'),
+)
+
+HEADER = [name for name, _ in COLUMNS]
+
+
+def export_rows(user):
+    """
+    Подходы пользователя в хронологическом порядке, по одному кортежу.
+
+    Тренировки идут по индексу (user, start_time, id), подходы каждой —
+    по (workout, created_at): досортировка нужна только внутри одной
+    тренировки, и вся история не сортируется перед выдачей первой строки.
+    """
+    return (
+        WorkoutSet.objects
+        .filter(workout__user=user)
+        .order_by('workout__start_time', 'workout_id', 'created_at')
+        .values_list(*(field for _, field in COLUMNS))
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+
+def _chunks(rows):
+    rows = iter(rows)
+    while chunk := list(islice(rows, settings.EXPORT_CHUNK_SIZE)):
+        yield chunk
+
+
+def _value(value):
+    # Время — в локальной зоне, как в остальных ответах API
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    return value
+
+
+def ndjson_stream(rows):
+    """Объект JSON на строку."""
+    for chunk in _chunks(rows):
+        yield ''.join(
+            json.dumps(
+                dict(zip(HEADER, map(_value, row))), ensure_ascii=False,
+            ) + '\n'
+            for row in chunk
+        ).encode()
+
+
+def csv_stream(rows):
+    """CSV с заголовком (заголовок уходит ещё до первой выборки)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    yield buffer.getvalue().encode()
+
+    for chunk in _chunks(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(map(_value, row) for row in chunk)
+        yield buffer.getvalue().encode()
+
+
+def gzip_stream(chunks):
+    """
+    Сжатие на лету: каждая пачка сбрасывается (Z_SYNC_FLUSH),
+    чтобы клиент получал данные сразу, а не после заполнения окна.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+_END = object()
+
+
+async def _async_chunks(chunks):
+    # Каждая пачка — в потоке представления (thread_sensitive):
+    # итератор запроса не переходит на другое соединение с БД
+    chunks = iter(chunks)
+    fetch = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await fetch(chunks, _END)) is not _END:
+            yield chunk
+    finally:
+        # Отключение клиента: закрыть и синхронный генератор
+        if hasattr(chunks, 'close'):
+            await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def for_server(request, chunks):
+    """
+    Поток для StreamingHttpResponse: под ASGI — асинхронный итератор
+    по тем же пачкам, под WSGI — сами пачки.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return _async_chunks(chunks)
+    return chunks
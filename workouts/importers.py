@@ -0,0 +1,504 @@
+"""
+Импорт истории из CSV-выгрузок других трекеров (Strong, Hevy, FitNotes).
+
+Файл читается построчно и пишется пачками по IMPORT_BATCH_SIZE подходов:
+тренировки — bulk_create, подходы — одним executemany или COPY на PostgreSQL.
+Названия упражнений сопоставляются со справочником (включая английские
+названия из ALIASES); не найденные создаются как пользовательские.
+
+Повторный импорт того же файла не дублирует историю: тренировки,
+начало которых уже есть у пользователя, пропускаются. Агрегаты
+(DailyVolume, PersonalRecord) пересобираются один раз в конце, в том
+числе когда импорт прерван отключением клиента или ошибкой в пачке.
+"""
+
+import csv
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import records, rollups, sync
+from .cache import bump_version, exercises_scope, user_scope
+from .models import Exercise, Workout, WorkoutSet
+
+LB = 0.45359237
+
+MAX_REPORTED_ERRORS = 20
+
+# Формат → колонки. weight — варианты (колонка, множитель до кг),
+# используется первый, который есть в заголовке.
+FORMATS = {
+    'strong': {
+        'date': 'Date',
+        'date_formats': ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'),
+        'title': 'Workout Name',
+        'exercise': 'Exercise Name',
+        'weight': (('Weight', 1),),
+        'unit': 'Weight Unit',
+        'reps': 'Reps',
+        'rpe': 'RPE',
+        'note': 'Workout Notes',
+    },
+    'hevy': {
+        'date': 'start_time',
+        'end': 'end_time',
+        'date_formats': ('%d %b %Y, %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S'),
+        'title': 'title',
+        'exercise': 'exercise_title',
+        'weight': (('weight_kg', 1), ('weight_lbs', LB)),
+        'reps': 'reps',
+        'rpe': 'rpe',
+        'note': 'description',
+    },
+    'fitnotes': {
+        'date': 'Date',
+        'date_formats': ('%Y-%m-%d',),
+        'exercise': 'Exercise',
+        'category': 'Category',
+        'weight': (('Weight (kgs)', 1), ('Weight (lbs)', LB)),
+        'reps': 'Reps',
+    },
+}
+
+# Английские названия (Strong/Hevy/FitNotes) → упражнение справочника
+ALIASES = {
+    'bench press (barbell)': 'Жим штанги лёжа',
+    'flat barbell bench press': 'Жим штанги лёжа',
+    'incline bench press (barbell)': 'Жим штанги на наклонной скамье',
+    'incline barbell bench press': 'Жим штанги на наклонной скамье',
+    'decline bench press (barbell)': 'Жим штанги на скамье с отрицательным наклоном',
+    'bench press (dumbbell)': 'Жим гантелей лёжа',
+    'flat dumbbell bench press': 'Жим гантелей лёжа',
+    'incline bench press (dumbbell)': 'Жим гантелей на наклонной скамье',
+    'incline dumbbell bench press': 'Жим гантелей на наклонной скамье',
+    'chest fly (dumbbell)': 'Разводка гантелей лёжа',
+    'flat dumbbell fly': 'Разводка гантелей лёжа',
+    'cable crossover': 'Сведение рук в кроссовере',
+    'chest dip': 'Отжимания на брусьях (грудной стиль)',
+    'push up': 'Отжимания от пола',
+    'pull up': 'Подтягивания широким хватом',
+    'chin up': 'Подтягивания обратным хватом',
+    'lat pulldown (cable)': 'Тяга верхнего блока широким хватом',
+    'lat pulldown': 'Тяга верхнего блока широким хватом',
+    'seated row (cable)': 'Тяга горизонтального блока',
+    'seated cable row': 'Тяга горизонтального блока',
+    'bent over row (barbell)': 'Тяга штанги в наклоне',
+    'barbell row': 'Тяга штанги в наклоне',
+    'dumbbell row': 'Тяга гантели в наклоне',
+    't bar row': 'Тяга Т-грифа',
+    'deadlift (barbell)': 'Становая тяга',
+    'deadlift': 'Становая тяга',
+    'overhead press (barbell)': 'Жим штанги стоя (армейский жим)',
+    'overhead press': 'Жим штанги стоя (армейский жим)',
+    'seated shoulder press (dumbbell)': 'Жим гантелей сидя',
+    'lateral raise (dumbbell)': 'Махи гантелями в стороны',
+    'lateral dumbbell raise': 'Махи гантелями в стороны',
+    'face pull (cable)': 'Тяга верхнего блока на заднюю дельту',
+    'bicep curl (barbell)': 'Подъём штанги на бицепс стоя',
+    'barbell curl': 'Подъём штанги на бицепс стоя',
+    'bicep curl (dumbbell)': 'Подъём гантелей на бицепс стоя',
+    'dumbbell curl': 'Подъём гантелей на бицепс стоя',
+    'hammer curl (dumbbell)': 'Молотковые сгибания (молотки)',
+    'preacher curl (barbell)': 'Сгибание рук на скамье Скотта',
+    'triceps pushdown (cable - straight bar)': 'Разгибание рук на верхнем блоке (прямая рукоятка)',
+    'triceps rope pushdown': 'Разгибание рук на верхнем блоке (канат)',
+    'skullcrusher (barbell)': 'Французский жим лёжа (EZ-гриф)',
+    'close grip bench press': 'Жим штанги узким хватом',
+    'squat (barbell)': 'Приседания со штангой',
+    'barbell squat': 'Приседания со штангой',
+    'front squat (barbell)': 'Фронтальные приседания',
+    'leg press': 'Жим ногами в тренажёре',
+    'leg press (machine)': 'Жим ногами в тренажёре',
+    'leg extension (machine)': 'Разгибание ног в тренажёре',
+    'leg extension machine': 'Разгибание ног в тренажёре',
+    'lunge (dumbbell)': 'Выпады с гантелями',
+    'bulgarian split squat': 'Болгарские выпады',
+    'lying leg curl (machine)': 'Сгибание ног лёжа в тренажёре',
+    'lying leg curl machine': 'Сгибание ног лёжа в тренажёре',
+    'seated leg curl (machine)': 'Сгибание ног сидя в тренажёре',
+    'romanian deadlift (barbell)': 'Румынская тяга со штангой',
+    'romanian deadlift': 'Румынская тяга со штангой',
+    'romanian deadlift (dumbbell)': 'Румынская тяга с гантелями',
+    'hip thrust (barbell)': 'Ягодичный мостик со штангой',
+    'barbell hip thrust': 'Ягодичный мостик со штангой',
+    'standing calf raise (machine)': 'Подъём на носки стоя в тренажёре',
+    'standing calf raise': 'Подъём на носки стоя в тренажёре',
+    'seated calf raise (machine)': 'Подъём на носки сидя в тренажёре',
+    'crunch': 'Скручивания на полу',
+    'hanging leg raise': 'Подъём ног в висе',
+    'plank': 'Планка',
+    'russian twist': 'Русский твист',
+    'cable crunch': 'Молитва (скручивания на верхнем блоке)',
+    'shrug (barbell)': 'Шраги со штангой',
+    'shrug (dumbbell)': 'Шраги с гантелями',
+}
+
+# Группа мышц для создаваемых упражнений: категория FitNotes
+# или ключевое слово в названии; иначе — DEFAULT_MUSCLE_GROUP
+CATEGORIES = {
+    'chest': 'CHEST',
+    'back': 'BACK',
+    'shoulders': 'SHOULDERS',
+    'biceps': 'BICEPS',
+    'triceps': 'TRICEPS',
+    'legs': 'QUADS',
+    'abs': 'CORE',
+    'cardio': 'CARDIO',
+}
+
+KEYWORDS = (
+    ('calf', 'CALVES'),
+    ('shrug', 'TRAPS'),
+    ('leg curl', 'HAMSTRINGS'),
+    ('romanian', 'HAMSTRINGS'),
+    ('hip thrust', 'GLUTES'),
+    ('glute', 'GLUTES'),
+    ('squat', 'QUADS'),
+    ('lunge', 'QUADS'),
+    ('leg', 'QUADS'),
+    ('curl', 'BICEPS'),
+    ('tricep', 'TRICEPS'),
+    ('pushdown', 'TRICEPS'),
+    ('skull', 'TRICEPS'),
+    ('bench', 'CHEST'),
+    ('chest', 'CHEST'),
+    ('fly', 'CHEST'),
+    ('row', 'BACK'),
+    ('pull', 'BACK'),
+    ('deadlift', 'BACK'),
+    ('shoulder', 'SHOULDERS'),
+    ('overhead', 'SHOULDERS'),
+    ('raise', 'SHOULDERS'),
+    ('crunch', 'CORE'),
+    ('plank', 'CORE'),
+    ('wrist', 'FOREARMS'),
+)
+
+DEFAULT_MUSCLE_GROUP = 'CORE'
+
+
+class ImportFormatError(ValueError):
+    """Файл не похож ни на один из поддерживаемых форматов."""
+
+
+def normalize_name(name):
+    return ' '.join(name.casefold().replace('ё', 'е').replace('-', ' ').split())
+
+
+def guess_muscle_group(name, category=''):
+    group = CATEGORIES.get(category.strip().casefold())
+    if group:
+        return group
+    name = normalize_name(name)
+    for keyword, group in KEYWORDS:
+        if keyword in name:
+            return group
+    return DEFAULT_MUSCLE_GROUP
+
+
+def detect_format(header):
+    """Формат по заголовку CSV."""
+    columns = set(header)
+    for name, spec in FORMATS.items():
+        required = {spec['date'], spec['exercise'], spec['reps']}
+        if required <= columns and any(col in columns for col, _ in spec['weight']):
+            return name
+    raise ImportFormatError(
+        f'Неизвестный формат файла, поддерживаются: {", ".join(FORMATS)}',
+    )
+
+
+def _number(value):
+    value = value.strip().replace(',', '.')
+    return float(value) if value else None
+
+
+def insert_sets(rows, seq=0):
+    """
+    Вставка подходов (workout_id, exercise_id, weight, reps, rir, created_at)
+    без ORM-объектов: created_at — auto_now_add, и bulk_create затёр бы
+    переданное время. На PostgreSQL — COPY FROM STDIN, на остальных БД —
+    один executemany на пачку. Сигналы не отправляются: агрегаты
+    пересобирает вызывающий код. seq — номер изменения всех подходов.
+    """
+    meta = WorkoutSet._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    columns = ', '.join(
+        quote(meta.get_field(name).column)
+        for name in ('workout', 'exercise', 'weight', 'reps', 'rir', 'created_at', 'seq')
+    )
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            with cursor.copy(f'COPY {table} ({columns}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row((*row, seq))
+            return
+
+        adapt = connection.ops.adapt_datetimefield_value
+        cursor.executemany(
+            f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s, %s, %s)',
+            [(*row[:-1], adapt(row[-1]), seq) for row in rows],
+        )
+
+
+class HistoryImporter:
+    """
+    Импорт одного файла. run() — генератор: после каждой пачки
+    отдаёт словарь прогресса, последним — итог с 'done': True.
+    """
+
+    def __init__(self, user, stream, fmt=None, batch_size=None):
+        self.user = user
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+
+        first_line = stream.readline()
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+        header = [column.strip() for column in next(csv.reader([first_line], delimiter=delimiter), [])]
+        if fmt is not None and fmt not in FORMATS:
+            raise ImportFormatError(f'format: одно из {", ".join(FORMATS)}')
+        self.format = fmt or detect_format(header)
+        self.spec = FORMATS[self.format]
+        self.columns = {column: index for index, column in enumerate(header)}
+        self.reader = csv.reader(stream, delimiter=delimiter)
+
+        self.weight_column, self.weight_factor = next(
+            (col, factor) for col, factor in self.spec['weight'] if col in self.columns
+        )
+        # Ключ тренировки → {'id', 'position'} (id = None — пропущена)
+        self.workouts = {}
+        self.exercises = {}
+        self.dates = {}
+        self.stats = {
+            'format': self.format,
+            'rows': 0,
+            'workouts': 0,
+            'sets': 0,
+            'exercises_created': 0,
+            'skipped': 0,
+            'errors': 0,
+        }
+        self.error_messages = []
+
+    # --- разбор строк ---
+
+    def _column(self, row, column):
+        index = self.columns.get(column)
+        if index is None or index >= len(row):
+            return ''
+        return row[index].strip()
+
+    def _cell(self, row, key):
+        return self._column(row, self.spec.get(key))
+
+    def _datetime(self, value):
+        # Дата повторяется у всех подходов тренировки — разбираем один раз
+        parsed = self.dates.get(value)
+        if parsed is None:
+            parsed = self.dates[value] = self._parse_datetime(value)
+        return parsed
+
+    def _parse_datetime(self, value):
+        for fmt in self.spec['date_formats']:
+            try:
+                parsed = datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            return parsed
+        raise ValueError(f'не удалось разобрать дату {value!r}')
+
+    def _parse(self, row):
+        """Строка CSV → подход или None (кардио, пустые повторения)."""
+        reps = _number(self._cell(row, 'reps'))
+        if not reps:
+            return None
+
+        weight = _number(self._column(row, self.weight_column)) or 0
+        factor = self.weight_factor
+        if self._cell(row, 'unit').casefold() in ('lbs', 'lb'):
+            factor = LB
+        rpe = _number(self._cell(row, 'rpe'))
+
+        start = self._datetime(self._cell(row, 'date'))
+        end = self._cell(row, 'end')
+        title = self._cell(row, 'title')
+        return {
+            'key': (start, title),
+            'start': start,
+            'end': self._datetime(end) if end else None,
+            'note': '\n'.join(filter(None, (title, self._cell(row, 'note')))),
+            'exercise': self._cell(row, 'exercise'),
+            'category': self._cell(row, 'category'),
+            'weight': round(weight * factor, 2),
+            'reps': int(reps),
+            'rir': None if rpe is None else max(0, round(10 - rpe)),
+        }
+
+    def _rows(self):
+        for line, row in enumerate(self.reader, start=2):
+            if not any(row):
+                continue
+            self.stats['rows'] += 1
+            try:
+                parsed = self._parse(row)
+            except ValueError as exc:
+                self.stats['errors'] += 1
+                if len(self.error_messages) < MAX_REPORTED_ERRORS:
+                    self.error_messages.append(f'строка {line}: {exc}')
+                continue
+            if parsed is None:
+                self.stats['skipped'] += 1
+                continue
+            yield parsed
+
+    # --- запись ---
+
+    def _load_exercises(self):
+        rows = (
+            Exercise.objects
+            .filter(Q(user__isnull=True) | Q(user=self.user))
+            .order_by()
+            .values_list('id', 'name', 'user_id')
+        )
+        for exercise_id, name, owner_id in rows:
+            key = normalize_name(name)
+            # Своё упражнение перекрывает общее с тем же названием
+            if owner_id is not None or key not in self.exercises:
+                self.exercises[key] = exercise_id
+
+        for alias, name in ALIASES.items():
+            exercise_id = self.exercises.get(normalize_name(name))
+            if exercise_id is not None:
+                self.exercises.setdefault(normalize_name(alias), exercise_id)
+
+    def _resolve_exercises(self, batch, seq):
+        missing = {}
+        for item in batch:
+            key = normalize_name(item['exercise'])
+            if key not in self.exercises and key not in missing:
+                missing[key] = Exercise(
+                    user=self.user,
+                    is_custom=True,
+                    seq=seq,
+                    name=item['exercise'][:100],
+                    muscle_group=guess_muscle_group(item['exercise'], item['category']),
+                )
+        if missing:
+            created = Exercise.objects.bulk_create(missing.values())
+            for key, exercise in zip(missing, created):
+                self.exercises[key] = exercise.pk
+            self.stats['exercises_created'] += len(created)
+
+    def _create_workouts(self, batch, seq):
+        new = {}
+        for item in batch:
+            if item['key'] not in self.workouts and item['key'] not in new:
+                new[item['key']] = item
+        if not new:
+            return
+
+        # Уже импортированные тренировки (повторный импорт) пропускаем
+        existing = set(
+            Workout.objects
+            .filter(user=self.user, start_time__in={item['start'] for item in new.values()})
+            .values_list('start_time', flat=True)
+        )
+        to_create = []
+        for key, item in new.items():
+            if item['start'] in existing:
+                self.workouts[key] = {'id': None}
+            else:
+                to_create.append((key, item))
+
+        workouts = Workout.objects.bulk_create([
+            Workout(
+                user=self.user, status='FINISHED',
+                end_time=item['end'], note=item['note'], seq=seq,
+            )
+            for _, item in to_create
+        ])
+        # start_time — auto_now_add: bulk_create проставил текущее время
+        for workout, (key, item) in zip(workouts, to_create):
+            workout.start_time = item['start']
+            self.workouts[key] = {'id': workout.pk, 'position': 0}
+        Workout.objects.bulk_update(workouts, ['start_time'])
+        self.stats['workouts'] += len(workouts)
+
+    def _set_rows(self, batch):
+        """(workout_id, exercise_id, weight, reps, rir, created_at) для новых подходов."""
+        rows = []
+        for item in batch:
+            workout = self.workouts[item['key']]
+            if workout['id'] is None:
+                self.stats['skipped'] += 1
+                continue
+            # Порядок подходов внутри тренировки — как в файле
+            created_at = item['start'] + timedelta(seconds=workout['position'])
+            workout['position'] += 1
+            rows.append((
+                workout['id'],
+                self.exercises[normalize_name(item['exercise'])],
+                item['weight'],
+                item['reps'],
+                item['rir'],
+                created_at,
+            ))
+        return rows
+
+    def _import_batch(self, batch):
+        with transaction.atomic():
+            # Пачка — одно изменение для синхронизации (bulk_create без pre_save)
+            seq = sync.next_seq(self.user.pk)
+            self._resolve_exercises(batch, seq)
+            self._create_workouts(batch, seq)
+            rows = self._set_rows(batch)
+            if rows:
+                insert_sets(rows, seq)
+        self.stats['sets'] += len(rows)
+
+    def _rebuild(self):
+        # bulk_create/COPY не отправляют сигналы: агрегаты — одним проходом
+        if self.stats['sets']:
+            rollups.rebuild_daily_volume(user_ids=[self.user.pk])
+            rollups.rebuild_workout_totals(user_ids=[self.user.pk])
+            records.rebuild_personal_records(user_ids=[self.user.pk])
+            bump_version(user_scope(self.user.pk))
+        if self.stats['exercises_created']:
+            # ETag списка упражнений (Exercise.objects.bulk_create)
+            bump_version(exercises_scope(self.user.pk))
+
+    def _progress(self, started):
+        elapsed = time.monotonic() - started
+        return {
+            **self.stats,
+            'elapsed': round(elapsed, 3),
+            'rows_per_second': round(self.stats['rows'] / elapsed) if elapsed else None,
+        }
+
+    def run(self):
+        started = time.monotonic()
+        self._load_exercises()
+
+        rows = self._rows()
+        try:
+            while batch := list(islice(rows, self.batch_size)):
+                self._import_batch(batch)
+                yield self._progress(started)
+        finally:
+            # Пачки коммитятся по одной: если клиент отключился или пачка
+            # упала, агрегаты всё равно нужны по уже записанным
+            self._rebuild()
+
+        yield {
+            **self._progress(started),
+            'error_messages': self.error_messages,
+            'done': True,
+        }
@@ -0,0 +1,237 @@
+"""
+Тренировочная нагрузка по истории подходов (NumPy).
+
+Подходы окна читаются двумя запросами в колонки-массивы (тренировка,
+упражнение, вес, повторения, RIR), дата берётся из тренировки:
+локальный день считается по разу на тренировку, а не на подход.
+Дальше всё считается над массивами целиком, без цикла по подходам:
+
+* расчётный 1ПМ (Эпли или Бжицки) с поправкой на RIR — повторения
+  до отказа считаются как reps + rir; лучшее значение за день
+  по каждому упражнению;
+* острая (7 дней) и хроническая (28 дней) нагрузка — средний тоннаж
+  в день за скользящее окно — и их отношение (ACWR);
+* недельный тоннаж по группам мышц.
+"""
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .models import Exercise, Workout, WorkoutSet
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+# Брзицки не определена от 37 повторений: такие подходы не учитываются
+FORMULAS = {
+    'epley': lambda weight, reps: weight * (1 + reps / 30),
+    'brzycki': lambda weight, reps: np.where(
+        reps < 37, weight * 36 / np.maximum(37 - reps, 1), np.nan,
+    ),
+}
+
+MUSCLE_GROUPS = [code for code, _ in Exercise.MUSCLE_CHOICES]
+
+_EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def _day_number(day):
+    return (np.datetime64(day, 'D') - _EPOCH).astype(np.int64)
+
+
+def _date(number):
+    return (_EPOCH + np.timedelta64(int(number), 'D')).astype(object)
+
+
+def history(user, since):
+    """
+    Подходы пользователя с локального дня since: словарь колонок
+    day (номер дня от эпохи), exercise, weight, reps, rir (nan — не указан).
+    """
+    start = timezone.make_aware(datetime.combine(since, time.min))
+
+    workouts = list(
+        Workout.objects
+        .filter(user=user, start_time__gte=start)
+        .order_by()
+        .values_list('id', 'start_time')
+    )
+    workout_ids = np.array([pk for pk, _ in workouts], dtype=np.int64)
+    workout_days = np.array(
+        [timezone.localdate(start_time) for _, start_time in workouts],
+        dtype='datetime64[D]',
+    )
+    order = np.argsort(workout_ids)
+    workout_ids, workout_days = workout_ids[order], workout_days[order]
+
+    rows = list(
+        WorkoutSet.objects
+        .filter(workout__user=user, workout__start_time__gte=start)
+        .order_by()
+        .values_list('workout_id', 'exercise_id', 'weight', 'reps', 'rir')
+    )
+    # None в rir становится nan
+    table = np.array(rows, dtype=np.float64).reshape(-1, 5)
+    set_workouts = table[:, 0].astype(np.int64)
+
+    # Подходы тренировки, созданной между двумя запросами, отбрасываются
+    index = np.searchsorted(workout_ids, set_workouts)
+    index = np.minimum(index, max(len(workout_ids) - 1, 0))
+    known = (
+        workout_ids[index] == set_workouts if len(workout_ids)
+        else np.zeros(len(set_workouts), dtype=bool)
+    )
+    table, index = table[known], index[known]
+
+    return {
+        'day': (workout_days[index] - _EPOCH).astype(np.int64),
+        'exercise': table[:, 1].astype(np.int64),
+        'weight': table[:, 2],
+        'reps': table[:, 3],
+        'rir': table[:, 4],
+    }
+
+
+def e1rm_curves(columns, first_day, formula='epley', exercise_id=None):
+    """Лучший расчётный 1ПМ за день: {упражнение: [(номер дня, 1ПМ), ...]}."""
+    mask = (columns['day'] >= first_day) & (columns['reps'] > 0)
+    if exercise_id is not None:
+        mask &= columns['exercise'] == exercise_id
+    day = columns['day'][mask]
+    exercise = columns['exercise'][mask]
+    reps = columns['reps'][mask] + np.nan_to_num(columns['rir'][mask])
+
+    estimate = FORMULAS[formula](columns['weight'][mask], reps)
+    valid = ~np.isnan(estimate)
+    day, exercise, estimate = day[valid], exercise[valid], estimate[valid]
+    if not len(day):
+        return {}
+
+    # Группы (упражнение, день) подряд; maximum.reduceat по границам групп
+    order = np.lexsort((day, exercise))
+    day, exercise, estimate = day[order], exercise[order], estimate[order]
+    starts = np.flatnonzero(np.r_[True, (day[1:] != day[:-1]) | (exercise[1:] != exercise[:-1])])
+    best = np.maximum.reduceat(estimate, starts)
+
+    curves = {}
+    for pk, number, value in zip(exercise[starts].tolist(), day[starts].tolist(), best.tolist()):
+        curves.setdefault(pk, []).append((number, value))
+    return curves
+
+
+def workload(columns, first_day, last_day):
+    """
+    Острая и хроническая нагрузка по дням first_day..last_day.
+
+    Массивы (acute, chronic, ratio); ratio — nan, если хронической нагрузки нет.
+    """
+    origin = first_day - CHRONIC_DAYS + 1
+    length = last_day - origin + 1
+    inside = (columns['day'] >= origin) & (columns['day'] <= last_day)
+    daily = np.bincount(
+        columns['day'][inside] - origin,
+        weights=columns['weight'][inside] * columns['reps'][inside],
+        minlength=length,
+    )
+
+    total = np.concatenate(([0.0], np.cumsum(daily)))
+    end = np.arange(CHRONIC_DAYS, length + 1)
+    acute = (total[end] - total[end - ACUTE_DAYS]) / ACUTE_DAYS
+    chronic = (total[end] - total[end - CHRONIC_DAYS]) / CHRONIC_DAYS
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(chronic > 0, acute / chronic, np.nan)
+    return acute, chronic, ratio
+
+
+def muscle_volume(columns, first_day, muscles):
+    """
+    Недельный тоннаж по группам мышц с первого понедельника не позже first_day.
+
+    muscles — {упражнение: группа}. Список (номер понедельника, группа, подходов, тоннаж).
+    """
+    # 1970-01-01 — четверг: сдвиг на 3 делает понедельник началом недели
+    monday = first_day - (first_day + 3) % 7
+    inside = columns['day'] >= monday
+    if not inside.any():
+        return []
+
+    exercise = columns['exercise'][inside]
+    ids = np.fromiter(muscles, dtype=np.int64, count=len(muscles))
+    codes = np.array(
+        [MUSCLE_GROUPS.index(muscles[pk]) for pk in ids.tolist()], dtype=np.int64,
+    )
+    order = np.argsort(ids)
+    ids, codes = ids[order], codes[order]
+    group = codes[np.searchsorted(ids, exercise)]
+
+    week = (columns['day'][inside] - monday) // 7
+    key = week * len(MUSCLE_GROUPS) + group
+    volume = columns['weight'][inside] * columns['reps'][inside]
+    sets = np.bincount(key)
+    tonnage = np.bincount(key, weights=volume)
+
+    result = []
+    for index in np.flatnonzero(sets).tolist():
+        week_index, code = divmod(index, len(MUSCLE_GROUPS))
+        result.append((
+            monday + week_index * 7, MUSCLE_GROUPS[code], int(sets[index]), float(tonnage[index]),
+        ))
+    return result
+
+
+def training_load(user, days=90, formula='epley', exercise_id=None):
+    """Ответ /api/analytics/load/ за последние days дней."""
+    today = timezone.localdate()
+    first = today - timedelta(days=days)
+    first_day, last_day = _day_number(first), _day_number(today)
+
+    columns = history(user, first - timedelta(days=CHRONIC_DAYS - 1))
+    exercises = {}
+    if len(columns['exercise']):
+        exercises = {
+            pk: (name, muscle_group)
+            for pk, name, muscle_group in Exercise.objects
+            .filter(pk__in=np.unique(columns['exercise']).tolist())
+            .values_list('id', 'name', 'muscle_group')
+        }
+        # Упражнение, удалённое между запросами, пропадает вместе с подходами
+        known = np.isin(columns['exercise'], list(exercises))
+        columns = {name: values[known] for name, values in columns.items()}
+
+    curves = e1rm_curves(columns, first_day, formula, exercise_id)
+    acute, chronic, ratio = workload(columns, first_day, last_day)
+    weeks = muscle_volume(
+        columns, first_day, {pk: group for pk, (_, group) in exercises.items()},
+    )
+
+    return {
+        'formula': formula,
+        'e1rm': [
+            {
+                'exercise_id': pk,
+                'exercise_name': exercises[pk][0],
+                'points': [
+                    {'date': _date(number), 'e1rm': round(value, 1)}
+                    for number, value in points
+                ],
+            }
+            for pk, points in sorted(curves.items(), key=lambda item: exercises[item[0]][0])
+        ],
+        'load': [
+            {
+                'date': _date(first_day + offset),
+                'acute': round(a, 1),
+                'chronic': round(c, 1),
+                'ratio': None if np.isnan(r) else round(r, 2),
+            }
+            for offset, (a, c, r) in enumerate(zip(
+                acute.tolist(), chronic.tolist(), ratio.tolist(),
+            ))
+        ],
+        'muscles': [
+            {'week': _date(week), 'muscle_group': group, 'sets': sets, 'volume': round(volume, 1)}
+            for week, group, sets, volume in weeks
+        ],
+    }
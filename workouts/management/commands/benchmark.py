@@ -0,0 +1,99 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Замеряет эндпоинты /api/ (p50/p95/p99, SQL-запросы, байты) на данных generate_data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench', help='Префикс имён пользователей')
+        parser.add_argument('--users', type=int, default=5, help='Сколько пользователей чередовать')
+        parser.add_argument('--iterations', type=int, default=20, help='Замеров на маршрут')
+        parser.add_argument('--warmup', type=int, default=2, help='Запросов на прогрев (не учитываются)')
+        parser.add_argument(
+            '--cold-cache', action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument('--host', default='localhost', help='Заголовок Host запросов')
+        parser.add_argument('--output', help='Сохранить отчёт в JSON-файл')
+        parser.add_argument('--compare', help='Сравнить с прежним JSON-отчётом')
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help='Рост p95 (%%), считающийся регрессией',
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help='Завершиться с ошибкой при регрессии',
+        )
+
+    def handle(self, *args, **options):
+        users = list(
+            User.objects.filter(username__startswith=options['prefix'])
+            .order_by('pk')[:options['users']]
+        )
+        if not users:
+            raise CommandError(
+                f'Нет пользователей {options["prefix"]}*: сначала выполните generate_data',
+            )
+
+        missing = benchmark.route_names() - {
+            name for name, *_ in benchmark.cases(users[0])
+        }
+        if missing:
+            self.stderr.write(f'Маршруты без замера: {", ".join(sorted(missing))}')
+
+        def progress(result):
+            self.stdout.write(
+                f'{result["method"]:6} {result["route"]:24} {result["status"]}  '
+                f'p50 {result["p50_ms"]:8.1f}  p95 {result["p95_ms"]:8.1f}  '
+                f'p99 {result["p99_ms"]:8.1f} мс  '
+                f'{result["queries"]:3} запр.  {result["bytes"]} Б'
+            )
+
+        try:
+            results = benchmark.run(
+                users,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                cold_cache=options['cold_cache'],
+                host=options['host'],
+                progress=progress,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['output']:
+            data = benchmark.report(
+                results, users,
+                options['iterations'], options['warmup'], options['cold_cache'],
+            )
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(data, stream, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Отчёт: {options["output"]}'))
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                baseline = json.load(stream)
+            self._compare(baseline, results, options)
+
+    def _compare(self, baseline, results, options):
+        regressions = 0
+        for route, method, old, new, change, old_q, new_q, regression in benchmark.compare(
+            baseline, results, options['threshold'],
+        ):
+            line = (
+                f'{method:6} {route:24} p95 {old:8.1f} → {new:8.1f} мс ({change:+.1f}%)  '
+                f'запросов {old_q} → {new_q}'
+            )
+            if regression:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Регрессий: {regressions}')
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from workouts.notifications import Dispatcher
+
+
+class Command(BaseCommand):
+    help = 'Отправляет напоминания о запланированных тренировках (долгоживущий процесс)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Один проход: отправить наступившие напоминания и выйти',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=None,
+            help='Как часто проверять изменения расписания, секунд '
+                 '(по умолчанию NOTIFICATION_POLL_SECONDS)',
+        )
+        parser.add_argument(
+            '--horizon', type=int, default=None,
+            help='На сколько часов вперёд держать напоминания в памяти '
+                 '(по умолчанию NOTIFICATION_HORIZON_HOURS)',
+        )
+
+    def handle(self, *args, **options):
+        horizon = options['horizon']
+        dispatcher = Dispatcher(horizon=timedelta(hours=horizon) if horizon else None)
+        dispatcher.start()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено напоминаний: {len(dispatcher.pending)}'
+        ))
+        if options['once']:
+            dispatcher.tick()
+            return
+
+        poll = options['poll'] or settings.NOTIFICATION_POLL_SECONDS
+        try:
+            while True:
+                time.sleep(min(dispatcher.tick(), poll))
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено')
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts.synthetic import SyntheticData
+
+
+class Command(BaseCommand):
+    help = 'Генерирует синтетических пользователей с историей тренировок и расписанием'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Число пользователей')
+        parser.add_argument('--years', type=int, default=1, help='Лет истории')
+        parser.add_argument('--per-week', type=int, default=3, help='Тренировок в неделю')
+        parser.add_argument('--exercises', type=int, default=5, help='Упражнений в тренировке')
+        parser.add_argument('--sets', type=int, default=3, help='Подходов на упражнение')
+        parser.add_argument(
+            '--schedule-days', type=int, default=30,
+            help='Дней расписания вперёд от сегодня',
+        )
+        parser.add_argument('--prefix', default='bench', help='Префикс имён пользователей')
+        parser.add_argument('--password', default='bench', help='Пароль пользователей')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users должно быть положительным')
+
+        generator = SyntheticData(
+            users=options['users'],
+            years=options['years'],
+            per_week=options['per_week'],
+            exercises=options['exercises'],
+            sets=options['sets'],
+            schedule_days=options['schedule_days'],
+            prefix=options['prefix'],
+            password=options['password'],
+            seed=options['seed'],
+        )
+        started = time.monotonic()
+        try:
+            users = generator.run()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        stats = generator.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с: '
+            f'{stats["users"]} пользователей ({users[0].username}…{users[-1].username}), '
+            f'{stats["workouts"]} тренировок, {stats["sets"]} подходов, '
+            f'{stats["scheduled"]} в расписании, {stats["rules"]} правил повторения'
+        ))
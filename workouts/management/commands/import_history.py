@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts.importers import FORMATS, HistoryImporter, ImportFormatError
+
+
+class Command(BaseCommand):
+    help = 'Импортирует историю тренировок из CSV-выгрузки Strong, Hevy или FitNotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к CSV-файлу')
+        parser.add_argument('--user', required=True, help='Имя пользователя')
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS),
+            help='Формат файла (по умолчанию — по заголовку)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Подходов в одной пачке (по умолчанию IMPORT_BATCH_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+            try:
+                importer = HistoryImporter(
+                    user, stream,
+                    fmt=options['format'], batch_size=options['batch_size'],
+                )
+            except ImportFormatError as exc:
+                raise CommandError(str(exc))
+
+            for progress in importer.run():
+                if progress.get('done'):
+                    break
+                self.stdout.write(
+                    f'{progress["rows"]} строк: {progress["workouts"]} тренировок, '
+                    f'{progress["sets"]} подходов '
+                    f'({progress["rows_per_second"] or 0} строк/с)'
+                )
+
+        for message in progress['error_messages']:
+            self.stderr.write(message)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {progress["elapsed"]} с: '
+            f'{progress["workouts"]} тренировок, {progress["sets"]} подходов, '
+            f'новых упражнений — {progress["exercises_created"]}, '
+            f'пропущено {progress["skipped"]}, ошибок {progress["errors"]}'
+        ))
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from workouts import partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт месячные секции подходов вперёд и архивирует секции старше '
+        'срока хранения (PostgreSQL с WORKOUTSET_PARTITIONING)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive', action='store_true',
+            help='Свернуть секции старше срока хранения в ArchivedSets и отсоединить',
+        )
+        parser.add_argument(
+            '--retention-months', type=int, default=None,
+            help='Срок хранения подходов, месяцев '
+                 '(по умолчанию WORKOUTSET_RETENTION_MONTHS)',
+        )
+        parser.add_argument(
+            '--drop', action='store_true',
+            help='Удалить отсоединённые секции (без него остаются отдельными таблицами)',
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.enabled():
+            raise CommandError(
+                'Секционирование выключено: нужны PostgreSQL и WORKOUTSET_PARTITIONING=True',
+            )
+        retention = options['retention_months']
+        if retention is not None and retention < 1:
+            raise CommandError('--retention-months: не меньше 1')
+
+        created = partitions.prepare()
+        for name in created:
+            self.stdout.write(f'Создана секция {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Секции: {len(created)} новых, '
+            f'вперёд на {settings.WORKOUTSET_PARTITIONS_AHEAD} мес.'
+        ))
+        if not options['archive']:
+            return
+
+        archived = partitions.archive(retention, drop=options['drop'])
+        for name, count in archived:
+            action = 'удалена' if options['drop'] else 'отсоединена'
+            self.stdout.write(f'{name}: {count} подходов в архиве, секция {action}')
+        self.stdout.write(self.style.SUCCESS(f'Архивировано секций: {len(archived)}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from workouts.records import rebuild_personal_records
+from workouts.rollups import rebuild_daily_volume, rebuild_workout_totals
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает агрегаты по подходам (тоннаж по дням, итоги тренировок, личные рекорды) с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='ID пользователя (можно указать несколько раз)',
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_volume(options['users'])
+        self.stdout.write(self.style.SUCCESS(f'DailyVolume: {count} строк'))
+
+        count = rebuild_workout_totals(options['users'])
+        self.stdout.write(self.style.SUCCESS(f'Workout: итоги {count} тренировок'))
+
+        count = rebuild_personal_records(options['users'])
+        self.stdout.write(self.style.SUCCESS(f'PersonalRecord: {count} строк'))
@@ -0,0 +1,165 @@
+"""
+Метрики запросов в памяти процесса (формат Prometheus).
+
+TimingMiddleware (middleware.py) заводит на запрос одну запись
+RequestTiming; время и число SQL-запросов в неё добавляет обёртка
+execute, один раз установленная на каждое соединение с БД (install()
+из AppConfig.ready). Текущая запись ищется через ContextVar, поэтому
+учитываются и запросы из потоков sync_to_async.
+
+По окончании запроса запись сворачивается в счётчики маршрута:
+гистограмму времени ответа и суммы времени БД, рендера, запросов
+и байт.
+
+Счётчики у каждого процесса свои: при нескольких воркерах Prometheus
+видит процесс, ответивший на конкретный опрос /metrics.
+"""
+
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Границы корзин гистограммы времени ответа (секунды)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Поля счётчиков маршрута (перед ними — корзины гистограммы)
+COUNT, TOTAL, DB, QUERIES, RENDER, BYTES = range(len(BUCKETS) + 1, len(BUCKETS) + 7)
+
+current = ContextVar('request_timing', default=None)
+
+_lock = threading.Lock()
+_routes = {}
+
+
+class RequestTiming:
+    """Измерения одного запроса."""
+    __slots__ = ('start', 'db', 'queries', 'render_start', 'render')
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.render_start = 0.0
+        self.render = 0.0
+
+    def rendered(self, response):
+        # post_render_callback: рендер начался в process_template_response
+        self.render = perf_counter() - self.render_start
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timing = current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db += perf_counter() - started
+        timing.queries += 1
+
+
+def _install(connection):
+    # Обёртки живут в объекте соединения и переживают переподключение.
+    # Первой в списке: execute_wrapper() снимает последнюю обёртку, и
+    # соединение, открытое внутри такого блока, не должно потерять эту
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _timed_execute)
+
+
+def _connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+def install():
+    """Учитывать запросы всех соединений, включая уже открытые."""
+    connection_created.connect(_connection_created, dispatch_uid='workouts.metrics')
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+def observe(route, method, timing, total, size):
+    """Свернуть запрос в счётчики маршрута."""
+    key = (route, method)
+    bucket = bisect_left(BUCKETS, total)
+    with _lock:
+        stats = _routes.get(key)
+        if stats is None:
+            stats = _routes[key] = [0] * (BYTES + 1)
+        stats[bucket] += 1
+        stats[COUNT] += 1
+        stats[TOTAL] += total
+        stats[DB] += timing.db
+        stats[QUERIES] += timing.queries
+        stats[RENDER] += timing.render
+        stats[BYTES] += size
+
+
+def add_bytes(route, method, size):
+    """Байты потокового ответа — учитываются после отправки тела."""
+    with _lock:
+        stats = _routes.get((route, method))
+        if stats is not None:
+            stats[BYTES] += size
+
+
+def reset():
+    with _lock:
+        _routes.clear()
+
+
+def _labels(route, method, **extra):
+    pairs = {'route': route, 'method': method, **extra}
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'),
+        )
+        for name, value in pairs.items()
+    )
+
+
+COUNTERS = (
+    ('http_request_db_seconds_total', DB, 'Время SQL-запросов'),
+    ('http_request_db_queries_total', QUERIES, 'Число SQL-запросов'),
+    ('http_request_render_seconds_total', RENDER, 'Время рендера ответа'),
+    ('http_response_bytes_total', BYTES, 'Размер тел ответов'),
+)
+
+
+def render():
+    """Все счётчики в текстовом формате Prometheus."""
+    with _lock:
+        snapshot = sorted((key, list(stats)) for key, stats in _routes.items())
+
+    lines = [
+        '# HELP http_request_duration_seconds Время ответа по маршрутам',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (route, method), stats in snapshot:
+        cumulative = 0
+        for bound, count in zip(BUCKETS, stats):
+            cumulative += count
+            lines.append(
+                f'http_request_duration_seconds_bucket{{{_labels(route, method, le=bound)}}} '
+                f'{cumulative}'
+            )
+        labels = _labels(route, method)
+        lines.append(
+            f'http_request_duration_seconds_bucket{{{_labels(route, method, le="+Inf")}}} '
+            f'{stats[COUNT]}'
+        )
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats[TOTAL]}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats[COUNT]}')
+
+    for name, field, description in COUNTERS:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        for (route, method), stats in snapshot:
+            lines.append(f'{name}{{{_labels(route, method)}}} {stats[field]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,219 @@
+"""
+Middleware: замер времени запросов и (для разработки) поиск N+1.
+
+TimingMiddleware для каждого маршрута считает общее время, время
+и число SQL-запросов, время рендера и размер ответа (см. metrics.py)
+и отдаёт их клиенту в заголовке Server-Timing. Стоимость — одна
+небольшая запись на запрос, поэтому middleware включён всегда.
+
+За время запроса считаются «формы» SQL — текст запроса с плейсхолдерами
+вместо значений (списки IN (...) любой длины сворачиваются в одну форму).
+Если одна и та же форма выполнилась NPLUSONE_THRESHOLD раз и больше,
+это почти наверняка запрос в цикле по объектам: middleware пишет
+предупреждение в лог, а с NPLUSONE_RAISE = True (в тестах) — падает.
+Подзапросы POST /api/batch/ (batch.py) считаются каждый отдельно.
+Формы считает обёртка execute, один раз установленная на каждое
+соединение (как в metrics.py): счётчик запроса ищется через ContextVar,
+поэтому учитываются и соединения, открытые внутри запроса, и запросы
+из потоков sync_to_async.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+# Номер текущего подзапроса пакета: одинаковые запросы разных
+# подзапросов — не N+1
+query_scope = ContextVar('query_scope', default=None)
+
+# Формы запросов текущего HTTP-запроса (None — поиск N+1 не ведётся)
+query_shapes = ContextVar('query_shapes', default=None)
+
+
+class NPlusOneError(Exception):
+    """Повторяющиеся одинаковые запросы внутри одного HTTP-запроса."""
+
+
+def query_shape(sql):
+    """Форма запроса: одинакова для запросов, отличающихся только значениями."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def _count_shapes(execute, sql, params, many, context):
+    shapes = query_shapes.get()
+    if shapes is not None:
+        shapes[query_scope.get(), query_shape(sql)] += 1
+    return execute(sql, params, many, context)
+
+
+def _install(connection):
+    # Первой в списке: execute_wrapper() снимает последнюю обёртку
+    if _count_shapes not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_shapes)
+
+
+def _connection_created(sender, connection, **kwargs):
+    _install(connection)
+
+
+def install():
+    """Считать формы запросов всех соединений, включая уже открытые."""
+    connection_created.connect(_connection_created, dispatch_uid='workouts.middleware')
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+
+
+class TimingMiddleware:
+    """
+    Должен стоять первым в MIDDLEWARE, чтобы учитывать всю цепочку.
+
+    Для потоковых ответов время и запросы учитываются до отправки
+    заголовков, байты — по мере отдачи тела.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = settings.SERVER_TIMING
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timing = metrics.RequestTiming()
+        token = metrics.current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self._finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = metrics.RequestTiming()
+        token = metrics.current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        return self._finish(request, response, timing)
+
+    def process_template_response(self, request, response):
+        # Вызывается прямо перед рендером (ответы DRF)
+        timing = metrics.current.get()
+        if timing is not None:
+            timing.render_start = perf_counter()
+            response.add_post_render_callback(timing.rendered)
+        return response
+
+    def _finish(self, request, response, timing):
+        total = perf_counter() - timing.start
+        match = request.resolver_match
+        route = match.view_name if match else '<unmatched>'
+
+        if response.streaming:
+            size = 0
+            count = self._acount if response.is_async else self._count
+            response.streaming_content = count(
+                response.streaming_content, route, request.method,
+            )
+        else:
+            size = len(response.content)
+        metrics.observe(route, request.method, timing, total, size)
+
+        if self.server_timing:
+            app = max(total - timing.db - timing.render, 0)
+            response['Server-Timing'] = (
+                f'db;dur={timing.db * 1000:.2f};desc="{timing.queries} queries", '
+                f'render;dur={timing.render * 1000:.2f}, '
+                f'app;dur={app * 1000:.2f}, '
+                f'total;dur={total * 1000:.2f}'
+            )
+        return response
+
+    @staticmethod
+    def _count(chunks, route, method):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        metrics.add_bytes(route, method, size)
+
+    @staticmethod
+    async def _acount(chunks, route, method):
+        # Поток может оборваться отключением клиента (SSE)
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.add_bytes(route, method, size)
+
+
+class NPlusOneMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_DETECTION:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.threshold = settings.NPLUSONE_THRESHOLD
+        self.raise_errors = settings.NPLUSONE_RAISE
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        shapes = Counter()
+        token = query_shapes.set(shapes)
+        try:
+            response = self.get_response(request)
+        finally:
+            query_shapes.reset(token)
+        self._check(request, shapes)
+        return response
+
+    async def __acall__(self, request):
+        shapes = Counter()
+        token = query_shapes.set(shapes)
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_shapes.reset(token)
+        self._check(request, shapes)
+        return response
+
+    def _check(self, request, shapes):
+        repeated = [
+            (shape, times) for (_, shape), times in shapes.most_common()
+            if times >= self.threshold
+        ]
+        if repeated:
+            report = '\n'.join(f'{times}× {shape}' for shape, times in repeated)
+            message = f'N+1 в {request.method} {request.path}:\n{report}'
+            if self.raise_errors:
+                raise NPlusOneError(message)
+            logger.warning(message)
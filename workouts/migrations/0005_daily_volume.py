@@ -0,0 +1,59 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_volume(apps, schema_editor):
+    WorkoutSet = apps.get_model('workouts', 'WorkoutSet')
+    DailyVolume = apps.get_model('workouts', 'DailyVolume')
+    rows = (
+        WorkoutSet.objects
+        .annotate(day=TruncDate('workout__start_time'))
+        .values('workout__user_id', 'day')
+        .annotate(volume=Sum(F('weight') * F('reps')), sets_count=Count('id'))
+        .order_by()
+    )
+    DailyVolume.objects.bulk_create(
+        [
+            DailyVolume(
+                user_id=row['workout__user_id'],
+                date=row['day'],
+                volume=row['volume'] or 0,
+                sets_count=row['sets_count'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0004_add_scheduled_workout'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVolume',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('volume', models.FloatField(default=0, verbose_name='Тоннаж')),
+                ('sets_count', models.IntegerField(default=0, verbose_name='Подходов')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_volumes', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Тоннаж за день',
+                'verbose_name_plural': 'Тоннаж по дням',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_volume')],
+            },
+        ),
+        migrations.RunPython(fill_daily_volume, migrations.RunPython.noop),
+    ]
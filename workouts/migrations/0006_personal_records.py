@@ -0,0 +1,64 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_personal_records(apps, schema_editor):
+    WorkoutSet = apps.get_model('workouts', 'WorkoutSet')
+    PersonalRecord = apps.get_model('workouts', 'PersonalRecord')
+    metrics = {
+        'max_weight': lambda weight, reps: weight,
+        'best_e1rm': lambda weight, reps: weight * (1 + reps / 30),
+        'best_volume': lambda weight, reps: weight * reps,
+    }
+    best = {}
+    rows = (
+        WorkoutSet.objects
+        .values_list('workout__user_id', 'exercise_id', 'id', 'weight', 'reps')
+        .order_by('id')
+    )
+    for user_id, exercise_id, set_id, weight, reps in rows.iterator():
+        record = best.setdefault(
+            (user_id, exercise_id),
+            PersonalRecord(user_id=user_id, exercise_id=exercise_id),
+        )
+        for metric, compute in metrics.items():
+            value = compute(weight, reps)
+            current = getattr(record, metric)
+            if current is None or value > current:
+                setattr(record, metric, value)
+                setattr(record, f'{metric}_set_id', set_id)
+    PersonalRecord.objects.bulk_create(best.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0005_daily_volume'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_weight', models.FloatField(null=True, verbose_name='Максимальный вес')),
+                ('best_e1rm', models.FloatField(null=True, verbose_name='Расчётный 1ПМ')),
+                ('best_volume', models.FloatField(null=True, verbose_name='Тоннаж подхода')),
+                ('best_e1rm_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workouts.workoutset', verbose_name='Подход с лучшим 1ПМ')),
+                ('best_volume_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workouts.workoutset', verbose_name='Подход с лучшим тоннажем')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to='workouts.exercise', verbose_name='Упражнение')),
+                ('max_weight_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workouts.workoutset', verbose_name='Подход с максимальным весом')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Личный рекорд',
+                'verbose_name_plural': 'Личные рекорды',
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise'), name='unique_personal_record')],
+            },
+        ),
+        migrations.RunPython(fill_personal_records, migrations.RunPython.noop),
+    ]
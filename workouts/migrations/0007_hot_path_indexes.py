@@ -0,0 +1,57 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0006_personal_records'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Сначала создаём составные индексы, затем убираем покрытые ими FK-индексы
+    operations = [
+        migrations.AddIndex(
+            model_name='scheduledworkout',
+            index=models.Index(fields=['user', 'date', 'time'], name='schedule_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledworkout',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['user', 'date', 'time'], name='schedule_upcoming_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user', '-start_time'], name='workout_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutset',
+            index=models.Index(fields=['workout', 'created_at'], name='set_workout_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutset',
+            index=models.Index(fields=['exercise', 'workout'], name='set_exercise_workout_idx'),
+        ),
+        migrations.AlterField(
+            model_name='scheduledworkout',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_workouts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='workout',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='workouts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='workoutset',
+            name='exercise',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sets', to='workouts.exercise', verbose_name='Упражнение'),
+        ),
+        migrations.AlterField(
+            model_name='workoutset',
+            name='workout',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='sets', to='workouts.workout', verbose_name='Тренировка'),
+        ),
+    ]
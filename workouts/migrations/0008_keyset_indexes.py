@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0007_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scheduledworkout',
+            index=models.Index(fields=['user', 'date', 'time', 'id'], name='schedule_user_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user', 'start_time', 'id'], name='workout_user_start_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='scheduledworkout',
+            name='schedule_user_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='workout',
+            name='workout_user_start_idx',
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 6.0.2 on 2026-10-17 07:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0010_notifications'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='rule_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Дата повторения'),
+        ),
+        migrations.AddField(
+            model_name='reminderchange',
+            name='rule_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='ID правила повторения'),
+        ),
+        migrations.AddField(
+            model_name='scheduledworkout',
+            name='rule_date',
+            field=models.DateField(blank=True, null=True, verbose_name='Дата повторения'),
+        ),
+        migrations.AlterField(
+            model_name='reminderchange',
+            name='scheduled_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='ID запланированной тренировки'),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='kind',
+            field=models.CharField(choices=[('workout', 'Тренировка'), ('set', 'Подход'), ('schedule', 'Запланированная тренировка'), ('exercise', 'Упражнение'), ('rule', 'Правило повторения')], max_length=20, verbose_name='Тип'),
+        ),
+        migrations.CreateModel(
+            name='ScheduleRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100, verbose_name='Название')),
+                ('time', models.TimeField(blank=True, null=True, verbose_name='Время')),
+                ('note', models.TextField(blank=True, verbose_name='Заметка')),
+                ('notify_before', models.PositiveIntegerField(default=30, verbose_name='Напомнить за (минут)')),
+                ('weekdays', models.JSONField(default=list, verbose_name='Дни недели')),
+                ('interval', models.PositiveSmallIntegerField(default=1, verbose_name='Каждые N недель')),
+                ('start_date', models.DateField(verbose_name='Начало')),
+                ('until', models.DateField(blank=True, null=True, verbose_name='Последний день')),
+                ('count', models.PositiveIntegerField(blank=True, null=True, verbose_name='Число повторений')),
+                ('exceptions', models.JSONField(blank=True, default=list, verbose_name='Исключения')),
+                ('last_date', models.DateField(blank=True, editable=False, null=True, verbose_name='Последнее повторение')),
+                ('seq', models.BigIntegerField(db_default=0, default=0, editable=False, verbose_name='Номер изменения')),
+                ('exercises', models.ManyToManyField(blank=True, related_name='schedule_rules', to='workouts.exercise', verbose_name='Упражнения')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='schedule_rules', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Правило повторения',
+                'verbose_name_plural': 'Правила повторения',
+                'ordering': ['start_date', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='rule',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='workouts.schedulerule', verbose_name='Правило повторения'),
+        ),
+        migrations.AddField(
+            model_name='scheduledworkout',
+            name='rule',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='workouts.schedulerule', verbose_name='Правило повторения'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('rule', 'rule_date', 'remind_at'), name='unique_rule_reminder'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduledworkout',
+            constraint=models.UniqueConstraint(fields=('rule', 'rule_date'), name='unique_rule_occurrence'),
+        ),
+        migrations.AddIndex(
+            model_name='schedulerule',
+            index=models.Index(fields=['user', 'start_date', 'id'], name='rule_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedulerule',
+            index=models.Index(fields=['user', 'seq'], name='rule_user_seq_idx'),
+        ),
+    ]
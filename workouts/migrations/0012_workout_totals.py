@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-17 08:05
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_workout_totals(apps, schema_editor):
+    Workout = apps.get_model('workouts', 'Workout')
+    WorkoutSet = apps.get_model('workouts', 'WorkoutSet')
+    sets = WorkoutSet.objects.filter(workout=OuterRef('pk')).order_by().values('workout')
+
+    def column(aggregate):
+        return Subquery(sets.annotate(value=aggregate).values('value'))
+
+    Workout.objects.update(
+        total_sets=Coalesce(column(Count('id')), 0),
+        total_volume=Coalesce(column(Sum(F('weight') * F('reps'))), 0.0),
+        exercise_count=Coalesce(column(Count('exercise', distinct=True)), 0),
+        last_set_at=column(Max('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0011_schedule_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workout',
+            name='exercise_count',
+            field=models.IntegerField(db_default=0, default=0, editable=False, verbose_name='Упражнений'),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='last_set_at',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Последний подход'),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='total_sets',
+            field=models.IntegerField(db_default=0, default=0, editable=False, verbose_name='Подходов'),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='total_volume',
+            field=models.FloatField(db_default=0, default=0, editable=False, verbose_name='Тоннаж'),
+        ),
+        migrations.RunPython(fill_workout_totals, migrations.RunPython.noop),
+    ]
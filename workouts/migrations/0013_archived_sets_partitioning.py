@@ -0,0 +1,61 @@
+# Generated by Django 6.0.2 on 2026-10-17 08:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from workouts import partitions
+
+
+def partition_sets(apps, schema_editor):
+    # Только PostgreSQL с WORKOUTSET_PARTITIONING: секционирование
+    # и секции на WORKOUTSET_PARTITIONS_AHEAD месяцев вперёд
+    partitions.prepare(schema_editor.connection)
+
+
+def merge_sets(apps, schema_editor):
+    if partitions.is_partitioned(schema_editor.connection):
+        partitions.merge_table(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0012_workout_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='personalrecord',
+            name='best_e1rm_set',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workouts.workoutset', verbose_name='Подход с лучшим 1ПМ'),
+        ),
+        migrations.AlterField(
+            model_name='personalrecord',
+            name='best_volume_set',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workouts.workoutset', verbose_name='Подход с лучшим тоннажем'),
+        ),
+        migrations.AlterField(
+            model_name='personalrecord',
+            name='max_weight_set',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='workouts.workoutset', verbose_name='Подход с максимальным весом'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedSets',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sets_count', models.IntegerField(verbose_name='Подходов')),
+                ('reps', models.IntegerField(verbose_name='Повторений')),
+                ('volume', models.FloatField(verbose_name='Тоннаж')),
+                ('max_weight', models.FloatField(verbose_name='Максимальный вес')),
+                ('last_set_at', models.DateTimeField(verbose_name='Последний подход')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_sets', to='workouts.exercise', verbose_name='Упражнение')),
+                ('workout', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_sets', to='workouts.workout', verbose_name='Тренировка')),
+            ],
+            options={
+                'verbose_name': 'Архив подходов',
+                'verbose_name_plural': 'Архив подходов',
+                'constraints': [models.UniqueConstraint(fields=('workout', 'exercise'), name='unique_archived_sets')],
+            },
+        ),
+        migrations.RunPython(partition_sets, merge_sets),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_archived_bests(apps, schema_editor):
+    # Подходы уже отсоединены: известна только нижняя граница
+    # (1ПМ и тоннаж подхода не меньше его веса)
+    ArchivedSets = apps.get_model('workouts', 'ArchivedSets')
+    ArchivedSets.objects.update(best_e1rm=F('max_weight'), best_volume=F('max_weight'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0013_archived_sets_partitioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsets',
+            name='best_e1rm',
+            field=models.FloatField(default=0, verbose_name='Расчётный 1ПМ'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedsets',
+            name='best_volume',
+            field=models.FloatField(default=0, verbose_name='Тоннаж подхода'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_archived_bests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0014_archived_sets_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changecounter',
+            name='pruned_seq',
+            field=models.BigIntegerField(default=0, verbose_name='Удалены надгробия до номера'),
+        ),
+    ]
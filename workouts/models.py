@@ -35,6 +35,8 @@ class Exercise(models.Model):
         verbose_name='Автор',
         related_name='exercises',
     )
+    # Номер изменения из ChangeCounter владельца (см. sync.py)
+    seq = models.BigIntegerField('Номер изменения', default=0, db_default=0, editable=False)
 
     class Meta:
         verbose_name = 'Упражнение'
@@ -58,6 +60,7 @@ class Workout(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
         related_name='workouts',
+        db_index=False,  # покрыт индексом (user, start_time, id)
     )
     start_time = models.DateTimeField('Начало', auto_now_add=True)
     end_time = models.DateTimeField('Конец', null=True, blank=True)
@@ -65,15 +68,44 @@ class Workout(models.Model):
         'Статус', max_length=20, choices=STATUS_CHOICES, default='STARTED',
     )
     note = models.TextField('Заметка', blank=True)
+    # Итоги по подходам: поддерживаются при записи подходов (rollups.py)
+    total_sets = models.IntegerField('Подходов', default=0, db_default=0, editable=False)
+    total_volume = models.FloatField('Тоннаж', default=0, db_default=0, editable=False)
+    exercise_count = models.IntegerField('Упражнений', default=0, db_default=0, editable=False)
+    last_set_at = models.DateTimeField('Последний подход', null=True, editable=False)
+    # Номер изменения из ChangeCounter владельца (см. sync.py)
+    seq = models.BigIntegerField('Номер изменения', default=0, db_default=0, editable=False)
 
     class Meta:
         verbose_name = 'Тренировка'
         verbose_name_plural = 'Тренировки'
         ordering = ['-start_time']
+        indexes = [
+            # Список, календарь и аналитика: WHERE user = ? по времени начала.
+            # id завершает ключ курсора (-start_time, -id) — обратный проход
+            models.Index(
+                fields=['user', 'start_time', 'id'], name='workout_user_start_id_idx',
+            ),
+            # Синхронизация: WHERE user = ? AND seq > курсор
+            models.Index(fields=['user', 'seq'], name='workout_user_seq_idx'),
+        ]
+
+    # Поля, которые меняет только UPDATE из rollups.py
+    TOTAL_FIELDS = ('total_sets', 'total_volume', 'exercise_count', 'last_set_at')
 
     def __str__(self):
         return f'Тренировка {self.pk} — {self.start_time:%d.%m.%Y %H:%M}'
 
+    def save(self, *args, **kwargs):
+        # Загруженная раньше тренировка не затирает итоги,
+        # изменённые подходами после её загрузки
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TOTAL_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class WorkoutSet(models.Model):
     """Один подход в тренировке."""
@@ -83,22 +115,36 @@ class WorkoutSet(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Тренировка',
         related_name='sets',
+        db_index=False,  # покрыт индексом (workout, created_at)
     )
     exercise = models.ForeignKey(
         Exercise,
         on_delete=models.CASCADE,
         verbose_name='Упражнение',
         related_name='sets',
+        db_index=False,  # покрыт индексом (exercise, workout)
     )
     weight = models.FloatField('Вес (кг)')
     reps = models.PositiveIntegerField('Повторения')
     rir = models.PositiveIntegerField('RIR', null=True, blank=True)
     created_at = models.DateTimeField('Создан', auto_now_add=True)
+    # Номер изменения из ChangeCounter владельца (см. sync.py)
+    seq = models.BigIntegerField('Номер изменения', default=0, db_default=0, editable=False)
 
     class Meta:
         verbose_name = 'Подход'
         verbose_name_plural = 'Подходы'
         ordering = ['created_at']
+        indexes = [
+            # Подходы тренировки в порядке выполнения (детали, prefetch)
+            models.Index(
+                fields=['workout', 'created_at'], name='set_workout_created_idx',
+            ),
+            # Подходы упражнения с переходом к тренировке (макс. вес, рекорды)
+            models.Index(
+                fields=['exercise', 'workout'], name='set_exercise_workout_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.exercise.name}: {self.weight}кг × {self.reps}'
@@ -122,6 +168,7 @@ class ScheduledWorkout(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
         related_name='scheduled_workouts',
+        db_index=False,  # покрыт индексом (user, date, time, id)
     )
     date = models.DateField('Дата')
     time = models.TimeField('Время', null=True, blank=True)
@@ -146,11 +193,372 @@ class ScheduledWorkout(models.Model):
         'Напомнить за (минут)',
         default=30,
     )
+    # Повторение правила, ставшее отдельной записью (см. recurrence.py)
+    rule = models.ForeignKey(
+        'ScheduleRule',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Правило повторения',
+        related_name='occurrences',
+        db_index=False,  # покрыт уникальностью (rule, rule_date)
+    )
+    rule_date = models.DateField('Дата повторения', null=True, blank=True)
+    # Номер изменения из ChangeCounter владельца (см. sync.py)
+    seq = models.BigIntegerField('Номер изменения', default=0, db_default=0, editable=False)
 
     class Meta:
         verbose_name = 'Запланированная тренировка'
         verbose_name_plural = 'Запланированные тренировки'
         ordering = ['date', 'time']
+        indexes = [
+            # Расписание и календарь: WHERE user = ? AND date BETWEEN ...
+            # и ключ курсора (date, time, id)
+            models.Index(
+                fields=['user', 'date', 'time', 'id'], name='schedule_user_date_id_idx',
+            ),
+            # Уведомления: только невыполненные
+            models.Index(
+                fields=['user', 'date', 'time'],
+                condition=models.Q(is_completed=False),
+                name='schedule_upcoming_idx',
+            ),
+            # Синхронизация: WHERE user = ? AND seq > курсор
+            models.Index(fields=['user', 'seq'], name='schedule_user_seq_idx'),
+            # Диспетчер напоминаний: невыполненные за период у всех пользователей
+            models.Index(
+                fields=['date'],
+                condition=models.Q(is_completed=False),
+                name='schedule_pending_date_idx',
+            ),
+        ]
+        constraints = [
+            # Повторение правила становится записью один раз
+            models.UniqueConstraint(
+                fields=['rule', 'rule_date'], name='unique_rule_occurrence',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.date} — {self.title}'
+
+
+class ScheduleRule(models.Model):
+    """
+    Повторяющаяся тренировка: по дням недели раз в interval недель
+    с start_date до until или count повторений.
+
+    Повторения не хранятся, а вычисляются для запрошенного периода
+    (recurrence.py). Отдельная ScheduledWorkout появляется, когда
+    повторение начинают, выполняют или меняют; его дата попадает
+    в exceptions вместе с пропущенными датами.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='schedule_rules',
+        db_index=False,  # покрыт индексом (user, start_date)
+    )
+    title = models.CharField('Название', max_length=100)
+    time = models.TimeField('Время', null=True, blank=True)
+    exercises = models.ManyToManyField(
+        Exercise,
+        blank=True,
+        verbose_name='Упражнения',
+        related_name='schedule_rules',
+    )
+    note = models.TextField('Заметка', blank=True)
+    notify_before = models.PositiveIntegerField(
+        'Напомнить за (минут)',
+        default=30,
+    )
+    # Номера дней из ScheduledWorkout.DAY_CHOICES
+    weekdays = models.JSONField('Дни недели', default=list)
+    interval = models.PositiveSmallIntegerField('Каждые N недель', default=1)
+    start_date = models.DateField('Начало')
+    until = models.DateField('Последний день', null=True, blank=True)
+    count = models.PositiveIntegerField('Число повторений', null=True, blank=True)
+    # ISO-даты пропущенных повторений и ставших отдельной записью
+    exceptions = models.JSONField('Исключения', default=list, blank=True)
+    # Дата последнего повторения (None — бессрочно); считается при сохранении
+    last_date = models.DateField('Последнее повторение', null=True, blank=True, editable=False)
+    # Номер изменения из ChangeCounter владельца (см. sync.py)
+    seq = models.BigIntegerField('Номер изменения', default=0, db_default=0, editable=False)
+
+    class Meta:
+        verbose_name = 'Правило повторения'
+        verbose_name_plural = 'Правила повторения'
+        ordering = ['start_date', 'id']
+        indexes = [
+            # Правила, действующие в период: WHERE user = ? AND start_date <= конец
+            models.Index(fields=['user', 'start_date', 'id'], name='rule_user_start_idx'),
+            models.Index(fields=['user', 'seq'], name='rule_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.title} (с {self.start_date})'
+
+
+class DailyVolume(models.Model):
+    """Тоннаж пользователя за локальный день (агрегат по подходам)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='daily_volumes',
+    )
+    date = models.DateField('Дата')
+    volume = models.FloatField('Тоннаж', default=0)
+    sets_count = models.IntegerField('Подходов', default=0)
+
+    class Meta:
+        verbose_name = 'Тоннаж за день'
+        verbose_name_plural = 'Тоннаж по дням'
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date'], name='unique_daily_volume',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.date}: {self.volume}'
+
+
+class ArchivedSets(models.Model):
+    """
+    Сводка подходов упражнения в тренировке из архивной секции WorkoutSet.
+
+    Сами подходы старше срока хранения отсоединяются вместе с месячной
+    секцией (см. partitions.py), итоги тренировок и тоннаж по дням
+    продолжают учитывать их через эти строки.
+    """
+
+    workout = models.ForeignKey(
+        Workout,
+        on_delete=models.CASCADE,
+        verbose_name='Тренировка',
+        related_name='archived_sets',
+        db_index=False,  # покрыт ограничением (workout, exercise)
+    )
+    exercise = models.ForeignKey(
+        Exercise,
+        on_delete=models.CASCADE,
+        verbose_name='Упражнение',
+        related_name='archived_sets',
+    )
+    sets_count = models.IntegerField('Подходов')
+    reps = models.IntegerField('Повторений')
+    volume = models.FloatField('Тоннаж')
+    max_weight = models.FloatField('Максимальный вес')
+    # Лучшие значения метрик рекордов (records.METRICS) среди этих подходов
+    best_e1rm = models.FloatField('Расчётный 1ПМ')
+    best_volume = models.FloatField('Тоннаж подхода')
+    last_set_at = models.DateTimeField('Последний подход')
+
+    class Meta:
+        verbose_name = 'Архив подходов'
+        verbose_name_plural = 'Архив подходов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['workout', 'exercise'], name='unique_archived_sets',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.exercise}: {self.sets_count} подх.'
+
+
+class PersonalRecord(models.Model):
+    """Личные рекорды пользователя по упражнению (обновляются при записи)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='personal_records',
+    )
+    exercise = models.ForeignKey(
+        Exercise,
+        on_delete=models.CASCADE,
+        verbose_name='Упражнение',
+        related_name='personal_records',
+    )
+    max_weight = models.FloatField('Максимальный вес', null=True)
+    max_weight_set = models.ForeignKey(
+        WorkoutSet,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        # Без ограничения в БД: подход может уйти в архивную секцию
+        db_constraint=False,
+        verbose_name='Подход с максимальным весом',
+        related_name='+',
+    )
+    best_e1rm = models.FloatField('Расчётный 1ПМ', null=True)
+    best_e1rm_set = models.ForeignKey(
+        WorkoutSet,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        verbose_name='Подход с лучшим 1ПМ',
+        related_name='+',
+    )
+    best_volume = models.FloatField('Тоннаж подхода', null=True)
+    best_volume_set = models.ForeignKey(
+        WorkoutSet,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_constraint=False,
+        verbose_name='Подход с лучшим тоннажем',
+        related_name='+',
+    )
+
+    class Meta:
+        verbose_name = 'Личный рекорд'
+        verbose_name_plural = 'Личные рекорды'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'exercise'], name='unique_personal_record',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.exercise}: {self.max_weight}кг'
+
+
+class ChangeCounter(models.Model):
+    """Последний номер изменения данных пользователя (курсор синхронизации)."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name='Пользователь',
+        related_name='change_counter',
+    )
+    seq = models.BigIntegerField('Последний номер', default=0)
+    # Надгробия с номером до этого удалены (sync.prune_tombstones)
+    pruned_seq = models.BigIntegerField('Удалены надгробия до номера', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик изменений'
+        verbose_name_plural = 'Счётчики изменений'
+
+    def __str__(self):
+        return f'{self.user}: {self.seq}'
+
+
+class Tombstone(models.Model):
+    """Удалённая запись: клиент синхронизации удаляет её у себя."""
+
+    KIND_CHOICES = [
+        ('workout', 'Тренировка'),
+        ('set', 'Подход'),
+        ('schedule', 'Запланированная тренировка'),
+        ('exercise', 'Упражнение'),
+        ('rule', 'Правило повторения'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='tombstones',
+        db_index=False,  # покрыт индексом (user, seq)
+    )
+    kind = models.CharField('Тип', max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField('ID записи')
+    seq = models.BigIntegerField('Номер изменения')
+    deleted_at = models.DateTimeField('Удалена', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Удалённая запись'
+        verbose_name_plural = 'Удалённые записи'
+        indexes = [
+            models.Index(fields=['user', 'seq'], name='tombstone_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id} (#{self.seq})'
+
+
+class ReminderChange(models.Model):
+    """Сохранённая запись расписания или правило: диспетчер напоминаний перечитывает их."""
+
+    scheduled_id = models.BigIntegerField('ID запланированной тренировки', null=True, blank=True)
+    rule_id = models.BigIntegerField('ID правила повторения', null=True, blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Изменение расписания'
+        verbose_name_plural = 'Изменения расписания'
+
+    def __str__(self):
+        return f'{self.scheduled_id or self.rule_id} ({self.created_at:%d.%m.%Y %H:%M})'
+
+
+class Notification(models.Model):
+    """Уведомление в очереди отправки (outbox)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='notifications',
+    )
+    scheduled = models.ForeignKey(
+        ScheduledWorkout,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Запланированная тренировка',
+        related_name='notifications',
+    )
+    # Напоминание о повторении правила, ещё не ставшем отдельной записью
+    rule = models.ForeignKey(
+        ScheduleRule,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Правило повторения',
+        related_name='notifications',
+        db_index=False,  # покрыт уникальностью (rule, rule_date, remind_at)
+    )
+    rule_date = models.DateField('Дата повторения', null=True, blank=True)
+    remind_at = models.DateTimeField('Время напоминания')
+    title = models.CharField('Заголовок', max_length=200)
+    body = models.TextField('Текст', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True)
+    attempts = models.PositiveIntegerField('Попыток отправки', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        constraints = [
+            # Одно напоминание на запись и время, даже после перезапуска диспетчера
+            models.UniqueConstraint(
+                fields=['scheduled', 'remind_at'], name='unique_reminder',
+            ),
+            models.UniqueConstraint(
+                fields=['rule', 'rule_date', 'remind_at'], name='unique_rule_reminder',
+            ),
+        ]
+        indexes = [
+            # Очередь отправки: неотправленные по порядку
+            models.Index(
+                fields=['id'],
+                condition=models.Q(sent_at__isnull=True),
+                name='notification_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.title} ({self.remind_at:%d.%m.%Y %H:%M})'
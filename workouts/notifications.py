@@ -0,0 +1,411 @@
+"""
+Диспетчер напоминаний о запланированных тренировках.
+
+Процесс manage.py dispatch_notifications держит невыполненные записи
+расписания и повторения правил (recurrence.py) на NOTIFICATION_HORIZON_HOURS
+вперёд в куче по времени напоминания (начало тренировки минус
+notify_before) и спит до ближайшего из них. Сохранение записи расписания
+или правила оставляет ReminderChange (signals.py): диспетчер раз
+в NOTIFICATION_POLL_SECONDS перечитывает только их.
+Удаление и выполнение не отслеживаются — перед отправкой записи
+перечитываются, и устаревшие напоминания отбрасываются.
+Разобранные изменения диспетчер удаляет; при запуске он перечитывает
+расписание целиком и удаляет все накопленные. Без диспетчера таблицу
+ограничивает record_change: изменения старше
+NOTIFICATION_CHANGE_RETENTION_HOURS удаляются раз в
+NOTIFICATION_CHANGE_PRUNE_EVERY записей.
+Напоминание о тренировке, которая уже началась (правка записи прошлой
+даты, напоминания, пропущенные за время простоя), не отправляется.
+Записи, по которым тренировка уже начата (workout), пропускаются;
+повторение правила после правки (recurrence.materialize) не напоминает
+повторно, если о нём уже напомнили как о повторении.
+
+Наступившее напоминание записывается в Notification (outbox), затем
+отправляется каналом NOTIFICATION_CHANNEL; неудачная отправка
+повторяется на следующих проходах. Уникальность (запись, время)
+и (правило, дата, время) не даёт продублировать напоминание после
+перезапуска.
+
+Диспетчер рассчитан на один процесс.
+
+Открытым потокам SSE (/api/notifications/stream/) новые уведомления
+раздаёт NotificationHub: один опрос outbox на процесс, пока открыт
+хотя бы один поток; соединение без событий ждёт свою очередь и БД
+не трогает. EventSource не умеет заголовки, поэтому поток открывается
+по одноразовому пропуску (issue_stream_ticket): JWT в адресе попал бы
+в журнал доступа.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import secrets
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import recurrence
+from .models import Notification, ReminderChange, ScheduledWorkout, ScheduleRule
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('id', 'user_id', 'title', 'date', 'time', 'notify_before')
+RULE_FIELDS = (
+    'id', 'user_id', 'title', 'time', 'notify_before',
+    'weekdays', 'interval', 'start_date', 'until', 'count', 'exceptions',
+)
+
+
+class LogChannel:
+    """Канал-заглушка: уведомление в лог и, если задан path, строкой JSON в файл."""
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else settings.NOTIFICATION_LOG_FILE
+
+    def send(self, notification):
+        logger.info(
+            'Уведомление %s пользователю %s: %s',
+            notification.pk, notification.user_id, notification.title,
+        )
+        if self.path:
+            with open(self.path, 'a', encoding='utf-8') as handle:
+                handle.write(json.dumps({
+                    'id': notification.pk,
+                    'user': notification.user_id,
+                    'scheduled': notification.scheduled_id,
+                    'rule': notification.rule_id,
+                    'rule_date': notification.rule_date and notification.rule_date.isoformat(),
+                    'remind_at': notification.remind_at.isoformat(),
+                    'title': notification.title,
+                    'body': notification.body,
+                }, ensure_ascii=False) + '\n')
+
+
+def get_channel():
+    return import_string(settings.NOTIFICATION_CHANNEL)()
+
+
+def starts_at(day, start):
+    """Начало тренировки (без времени — NOTIFICATION_DEFAULT_TIME) как aware datetime."""
+    if start is None:
+        start = time.fromisoformat(settings.NOTIFICATION_DEFAULT_TIME)
+    return timezone.make_aware(datetime.combine(day, start))
+
+
+def remind_at(row, day=None):
+    """Время напоминания записи расписания или повторения правила в день day."""
+    day = row['date'] if day is None else day
+    return starts_at(day, row['time']) - timedelta(minutes=row['notify_before'])
+
+
+def _notification(row, at, **target):
+    start = starts_at(target.get('rule_date') or row['date'], row['time'])
+    return Notification(
+        user_id=row['user_id'],
+        remind_at=at,
+        title=f'Скоро тренировка: {row["title"]}',
+        body=timezone.localtime(start).strftime('%d.%m.%Y %H:%M'),
+        **target,
+    )
+
+
+def record_change(**target):
+    """Запомнить сохранённую запись расписания или правило (scheduled_id= / rule_id=)."""
+    change = ReminderChange.objects.create(**target)
+    # Работающий диспетчер разбирает изменения за секунды; без него
+    # старые удаляются здесь — один запрос на NOTIFICATION_CHANGE_PRUNE_EVERY
+    if change.pk % settings.NOTIFICATION_CHANGE_PRUNE_EVERY == 0:
+        prune_changes()
+
+
+def prune_changes():
+    """Удалить изменения старше NOTIFICATION_CHANGE_RETENTION_HOURS."""
+    cutoff = timezone.now() - timedelta(hours=settings.NOTIFICATION_CHANGE_RETENTION_HOURS)
+    return ReminderChange.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+class Dispatcher:
+    """
+    Куча напоминаний одного процесса; tick() — один проход.
+
+    Ключ напоминания — ('schedule', id) или ('rule', id, дата повторения).
+    """
+
+    def __init__(self, channel=None, horizon=None, clock=timezone.now):
+        self.channel = channel or get_channel()
+        self.horizon = horizon or timedelta(hours=settings.NOTIFICATION_HORIZON_HOURS)
+        self.clock = clock
+        self.heap = []
+        # id записи → актуальное время напоминания; остальное в куче устарело
+        self.pending = {}
+        self.loaded_until = None
+        self.last_change = 0
+
+    def _push(self, key, at, start):
+        if start <= self.clock():
+            # Тренировка уже началась — напоминать поздно
+            self.pending.pop(key, None)
+            return
+        if self.pending.get(key) != at:
+            self.pending[key] = at
+            heapq.heappush(self.heap, (at, key))
+
+    def _push_schedule(self, row):
+        self._push(('schedule', row['id']), remind_at(row), starts_at(row['date'], row['time']))
+
+    def _push_rule(self, rule, first, last):
+        for day in recurrence.occurrences(recurrence.pattern(rule), first, last):
+            self._push(
+                ('rule', rule['id'], day), remind_at(rule, day), starts_at(day, rule['time']),
+            )
+
+    def _rules(self, first, last):
+        return (
+            ScheduleRule.objects
+            .filter(start_date__lte=last)
+            .filter(Q(last_date__isnull=True) | Q(last_date__gte=first))
+            .order_by()
+            .values(*RULE_FIELDS)
+        )
+
+    def _load_days(self, first, last):
+        rows = (
+            ScheduledWorkout.objects
+            .filter(is_completed=False, workout__isnull=True, date__gte=first, date__lte=last)
+            .order_by()
+            .values(*FIELDS)
+        )
+        for row in rows:
+            self._push_schedule(row)
+        for rule in self._rules(first, last):
+            self._push_rule(rule, first, last)
+
+    def start(self):
+        """Первичная загрузка: сегодня и дни в пределах горизонта."""
+        # Изменения, записанные во время загрузки, применятся на первом проходе
+        self.last_change = (
+            ReminderChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        )
+        # Всё, что накопилось до запуска, покрывает полная загрузка ниже
+        ReminderChange.objects.filter(id__lte=self.last_change).delete()
+        today = timezone.localdate(self.clock())
+        self.loaded_until = timezone.localdate(self.clock() + self.horizon)
+        self._load_days(today, self.loaded_until)
+
+    def extend(self, now):
+        """Сдвинуть горизонт: загрузить наступившие в нём дни."""
+        until = timezone.localdate(now + self.horizon)
+        if until > self.loaded_until:
+            self._load_days(self.loaded_until + timedelta(days=1), until)
+            self.loaded_until = until
+
+    def apply_changes(self):
+        """Перечитать записи расписания и правила, сохранённые с прошлого прохода."""
+        changes = list(
+            ReminderChange.objects
+            .filter(id__gt=self.last_change)
+            .order_by('id')
+            .values_list('id', 'scheduled_id', 'rule_id')
+        )
+        if not changes:
+            return
+        self.last_change = changes[-1][0]
+        scheduled_ids = {pk for _, pk, _ in changes if pk is not None}
+        rule_ids = {pk for _, _, pk in changes if pk is not None}
+
+        if scheduled_ids:
+            for row in ScheduledWorkout.objects.filter(
+                pk__in=scheduled_ids, is_completed=False, workout__isnull=True,
+                date__lte=self.loaded_until,
+            ).values(*FIELDS):
+                self._push_schedule(row)
+        if rule_ids:
+            # Повторения правила разворачиваются заново
+            for key in [key for key in self.pending if key[0] == 'rule' and key[1] in rule_ids]:
+                del self.pending[key]
+            today = timezone.localdate(self.clock())
+            for rule in ScheduleRule.objects.filter(pk__in=rule_ids).values(*RULE_FIELDS):
+                self._push_rule(rule, today, self.loaded_until)
+        ReminderChange.objects.filter(id__lte=self.last_change).delete()
+
+    def fire(self, now):
+        """Наступившие напоминания — в outbox."""
+        scheduled_ids, rule_days = set(), defaultdict(set)
+        while self.heap and self.heap[0][0] <= now:
+            at, key = heapq.heappop(self.heap)
+            if self.pending.get(key) == at:
+                del self.pending[key]
+                if key[0] == 'schedule':
+                    scheduled_ids.add(key[1])
+                else:
+                    rule_days[key[1]].add(key[2])
+
+        # Запись или правило могли удалить, выполнить или перенести
+        notifications = []
+        if scheduled_ids:
+            rows = list(ScheduledWorkout.objects.filter(
+                pk__in=scheduled_ids, is_completed=False, workout__isnull=True,
+            ).values(*FIELDS, 'rule_id', 'rule_date'))
+            # Повторение правила, о котором уже напомнили до его правки
+            occurrences = [row for row in rows if row['rule_id'] is not None]
+            reminded = set(
+                Notification.objects.filter(
+                    rule_id__in={row['rule_id'] for row in occurrences},
+                    rule_date__in={row['rule_date'] for row in occurrences},
+                ).values_list('rule_id', 'rule_date')
+            ) if occurrences else set()
+            for row in rows:
+                if starts_at(row['date'], row['time']) <= now:
+                    continue
+                if (row['rule_id'], row['rule_date']) in reminded:
+                    continue
+                at = remind_at(row)
+                if at > now:
+                    self._push_schedule(row)
+                    continue
+                notifications.append(_notification(row, at, scheduled_id=row['id']))
+        if rule_days:
+            for rule in ScheduleRule.objects.filter(pk__in=rule_days).values(*RULE_FIELDS):
+                current = recurrence.pattern(rule)
+                for day in rule_days[rule['id']]:
+                    if not any(recurrence.occurrences(current, day, day)):
+                        continue
+                    start = starts_at(day, rule['time'])
+                    if start <= now:
+                        continue
+                    at = remind_at(rule, day)
+                    if at > now:
+                        self._push(('rule', rule['id'], day), at, start)
+                        continue
+                    notifications.append(
+                        _notification(rule, at, rule_id=rule['id'], rule_date=day),
+                    )
+        Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+        return len(notifications)
+
+    def deliver(self, limit=100):
+        """Отправить неотправленные уведомления каналом."""
+        batch = list(
+            Notification.objects
+            .filter(sent_at__isnull=True, attempts__lt=settings.NOTIFICATION_MAX_ATTEMPTS)
+            .order_by('id')[:limit]
+        )
+        for notification in batch:
+            notification.attempts += 1
+            try:
+                self.channel.send(notification)
+            except Exception as exc:
+                logger.warning('Не удалось отправить уведомление %s: %s', notification.pk, exc)
+                notification.last_error = str(exc)
+            else:
+                notification.sent_at = timezone.now()
+                notification.last_error = ''
+        if batch:
+            Notification.objects.bulk_update(batch, ['attempts', 'sent_at', 'last_error'])
+        return sum(1 for notification in batch if notification.sent_at)
+
+    def tick(self):
+        """Один проход; возвращает, сколько секунд можно спать."""
+        now = self.clock()
+        with transaction.atomic():
+            self.apply_changes()
+        self.extend(now)
+        self.fire(now)
+        self.deliver()
+
+        wait = settings.NOTIFICATION_POLL_SECONDS
+        if self.heap:
+            wait = min(wait, max((self.heap[0][0] - self.clock()).total_seconds(), 0))
+        return wait
+
+
+class NotificationHub:
+    """
+    Новые уведомления → очереди открытых потоков процесса.
+
+    Опрос идёт одной задачей в цикле событий (по первичному ключу,
+    раз в NOTIFICATION_STREAM_POLL_SECONDS) и останавливается, когда
+    закрыт последний поток.
+    """
+    columns = ('id', 'user_id', 'scheduled_id', 'rule_id', 'rule_date', 'remind_at', 'title', 'body')
+
+    def __init__(self):
+        self.queues = defaultdict(set)
+        self.task = None
+        self.last = None
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue()
+        self.queues[user_id].add(queue)
+        # Задача прошлого цикла событий (тесты) не продолжится
+        if (
+            self.task is None or self.task.done()
+            or self.task.get_loop() is not asyncio.get_running_loop()
+        ):
+            self.last = None
+            self.task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.queues.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.queues[user_id]
+
+    async def poll(self):
+        rows = (
+            Notification.objects
+            .filter(id__gt=self.last)
+            .order_by('id')
+            .values(*self.columns)
+        )
+        async for row in rows:
+            self.last = row['id']
+            for queue in self.queues.get(row['user_id'], ()):
+                queue.put_nowait(row)
+
+    async def run(self):
+        try:
+            result = await Notification.objects.aaggregate(last=Max('id'))
+            self.last = result['last'] or 0
+            while self.queues:
+                await asyncio.sleep(settings.NOTIFICATION_STREAM_POLL_SECONDS)
+                try:
+                    await self.poll()
+                except Exception:
+                    logger.exception('Не удалось прочитать новые уведомления')
+        finally:
+            # Следующий поток начнёт с текущего конца outbox
+            self.last = None
+
+
+hub = NotificationHub()
+
+
+def _ticket_key(ticket):
+    return f'stream-ticket:{ticket}'
+
+
+def issue_stream_ticket(user_id):
+    """Одноразовый пропуск к потоку SSE на NOTIFICATION_STREAM_TICKET_SECONDS."""
+    ticket = secrets.token_urlsafe(32)
+    cache.set(_ticket_key(ticket), user_id, settings.NOTIFICATION_STREAM_TICKET_SECONDS)
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """id пользователя по пропуску или None; пропуск сразу гасится."""
+    key = _ticket_key(ticket)
+    user_id = cache.get(key)
+    # Из одновременных запросов с одним пропуском ключ удалит только один
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
@@ -0,0 +1,208 @@
+"""
+Keyset-пагинация (курсоры) для списков.
+
+В отличие от стандартного CursorPagination из DRF, позиция курсора
+содержит значения всех полей сортировки, включая завершающий id.
+Поэтому страница выбирается одним условием вида
+(start_time, id) < (:start_time, :id) без OFFSET, и её стоимость
+не зависит ни от глубины, ни от числа совпадающих значений.
+
+Порядок берётся из атрибута ordering у view; последним полем должен
+быть уникальный id. NULL в nullable-полях сортируется так, как принято
+в самой БД (features.nulls_order_largest), чтобы порядок совпадал
+с индексом и не требовал отдельной сортировки.
+
+Вместо QuerySet можно передать уже отсортированный по ordering список
+объектов (например, справочник из памяти): страница тогда ищется
+бинарным поиском. Для списков поддерживается только сортировка
+по возрастанию без NULL.
+"""
+
+import json
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _positive_int, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    page_size_query_param = 'page_size'
+    ordering = ('-id',)
+
+    def get_page_size(self, request):
+        # Размеры из настроек на каждый запрос, а не при импорте модуля
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True, cutoff=settings.API_MAX_PAGE_SIZE,
+            )
+        except (KeyError, ValueError):
+            return settings.API_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = tuple(ordering)
+        assert ordering[-1].lstrip('-') == 'id', (
+            'Keyset-пагинации нужен уникальный id последним полем сортировки.'
+        )
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            reverse, current_position = self.cursor.reverse, self.cursor.position
+
+        if isinstance(queryset, list):
+            results = self._slice_list(queryset, reverse, current_position)
+        else:
+            results = self._slice_queryset(queryset, reverse, current_position)
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering,
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _slice_queryset(self, queryset, reverse, current_position):
+        self.nulls_largest = connections[queryset.db].features.nulls_order_largest
+        model = queryset.model
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(
+                self._after(model, ordering, self._decode_position(current_position, model)),
+            )
+
+        # Лишняя строка показывает, есть ли следующая страница
+        return list(queryset[:self.page_size + 1])
+
+    def _slice_list(self, items, reverse, current_position):
+        assert not any(order.startswith('-') for order in self.ordering), (
+            'Список можно пагинировать только по возрастанию.'
+        )
+        names = [order.lstrip('-') for order in self.ordering]
+        keys = [tuple(getattr(item, name) for name in names) for item in items]
+
+        if current_position is None:
+            start = end = 0 if not reverse else len(items)
+        else:
+            model = type(items[0]) if items else None
+            position = tuple(self._decode_position(current_position, model))
+            start = bisect_right(keys, position)
+            end = bisect_left(keys, position)
+
+        # Как и для запроса — на одну строку больше страницы,
+        # при обратном проходе в обратном порядке
+        if reverse:
+            return items[max(end - self.page_size - 1, 0):end][::-1]
+        return items[start:start + self.page_size + 1]
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                value = getattr(instance, name)
+            values.append(None if value is None else str(value))
+        return json.dumps(values, separators=(',', ':'))
+
+    def _decode_position(self, position, model):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if model is None:
+            return values
+        # Значения из курсора приходят от клиента: приводим к типам полей,
+        # иначе ["not-a-date", "x"] дойдёт до базы и вернёт 500
+        try:
+            return [
+                None if value is None
+                else model._meta.get_field(order.lstrip('-')).to_python(value)
+                for order, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _beyond(self, model, order, value):
+        """Строки строго дальше value по одному полю сортировки."""
+        name = order.lstrip('-')
+        descending = order.startswith('-')
+        # Идут ли NULL после остальных значений в этом направлении
+        nulls_next = (
+            model._meta.get_field(name).null
+            and self.nulls_largest != descending
+        )
+        if value is None:
+            if nulls_next:
+                return Q(pk__in=[])
+            return Q(**{f'{name}__isnull': False})
+        condition = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+        if nulls_next:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    def _after(self, model, ordering, values):
+        """(a, b, id) > (:a, :b, :id) с учётом направления каждого поля."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for order, value in zip(ordering, values):
+            name = order.lstrip('-')
+            condition |= equal & self._beyond(model, order, value)
+            if value is None:
+                equal &= Q(**{f'{name}__isnull': True})
+            else:
+                equal &= Q(**{name: value})
+
+        # Избыточная граница по первому полю: без неё OR-условие остаётся
+        # фильтром, и индекс читается с начала, а не с позиции курсора.
+        first, value = ordering[0], values[0]
+        name = first.lstrip('-')
+        if value is not None and not model._meta.get_field(name).null:
+            lookup = 'lte' if first.startswith('-') else 'gte'
+            condition &= Q(**{f'{name}__{lookup}': value})
+        return condition
@@ -0,0 +1,346 @@
+"""
+Секционирование WorkoutSet по месяцам и архивация старых секций (PostgreSQL).
+
+С WORKOUTSET_PARTITIONING таблица подходов — декларативно секционированная
+по RANGE (created_at): секция на календарный месяц (границы в UTC)
+и секция по умолчанию для строк вне созданных месяцев. Запросы
+с условием на created_at читают только нужные секции, а старую
+историю можно убрать целым месяцем без DELETE и VACUUM.
+
+Первичный ключ секционированной таблицы обязан включать ключ
+секционирования, поэтому он (id, created_at); id по-прежнему
+выдаёт последовательность. Ссылки личных рекордов на подходы
+не имеют ограничения в БД (FK на такую таблицу невозможен).
+
+Секции создаются заранее на WORKOUTSET_PARTITIONS_AHEAD месяцев вперёд:
+миграцией 0013 и после каждого migrate (post_migrate), а также
+командой partitions. Строки, попавшие в секцию по умолчанию
+(импорт старой истории), переносятся в созданные для них месяцы.
+
+archive() сворачивает секции старше срока хранения в ArchivedSets
+(строка на упражнение тренировки), отсоединяет их от таблицы
+и с drop удаляет. Итоги тренировок и тоннаж по дням не меняются.
+Личные рекорды сохраняют значения: сводки хранят лучшие 1ПМ и тоннаж
+подхода, и пересчёт рекордов их учитывает. Детали тренировки, выгрузка
+и синхронизация архивные подходы не возвращают.
+
+На SQLite и без настройки таблица остаётся обычной, функции модуля
+ничего не делают.
+"""
+
+import re
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+from django.utils import timezone
+
+from .cache import bump_version, user_scope
+from .models import ArchivedSets, Workout, WorkoutSet
+
+TABLE = WorkoutSet._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_NAME_PATTERN = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def month_start(value):
+    """Первый день месяца даты или момента времени (момент — в UTC)."""
+    if isinstance(value, datetime):
+        value = value.astimezone(dt_timezone.utc).date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    """Первый день месяца, отстоящего от month на count месяцев."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_y{month.year}m{month.month:02}'
+
+
+def partition_month(name):
+    """Месяц секции по её имени (None — не месячная секция)."""
+    match = _NAME_PATTERN.match(name)
+    if match is None:
+        return None
+    return date(int(match[1]), int(match[2]), 1)
+
+
+def _bounds(month):
+    """Границы секции: [начало месяца, начало следующего) в UTC."""
+    return tuple(
+        datetime(m.year, m.month, 1, tzinfo=dt_timezone.utc)
+        for m in (month, add_months(month, 1))
+    )
+
+
+def enabled(connection=default_connection):
+    return connection.vendor == 'postgresql' and settings.WORKOUTSET_PARTITIONING
+
+
+def is_partitioned(connection=default_connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [TABLE],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def attached_months(connection=default_connection):
+    """Месяцы секций, присоединённых к таблице, по возрастанию."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(filter(None, map(partition_month, names)))
+
+
+# ============================================================
+# Перестройка таблицы
+# ============================================================
+
+def _definitions(cursor, table):
+    """DDL индексов (кроме первичного ключа) и ограничений FK/CHECK таблицы."""
+    cursor.execute(
+        'SELECT indexdef FROM pg_indexes '
+        'WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s',
+        [table, f'{table}_pkey'],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype IN ('f', 'c')",
+        [table],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _restore(cursor, indexes, constraints):
+    q = cursor.db.ops.quote_name
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in constraints:
+        cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(name)} {definition}')
+
+
+def _swap(cursor, partitioned):
+    """
+    Пересоздать таблицу подходов секционированной или обычной.
+
+    Старая таблица переименовывается, строки копируются в новую,
+    после удаления старой на новой под прежними именами создаются
+    индексы и ограничения. Выполняется в транзакции миграции.
+    """
+    q = cursor.db.ops.quote_name
+    old = f'{TABLE}_old'
+    indexes, constraints = _definitions(cursor, TABLE)
+
+    # id копируется как есть: последовательность старой таблицы
+    # удаляется вместе с ней, новая создаётся ниже
+    cursor.execute(f'ALTER TABLE {q(TABLE)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+    cursor.execute(f'ALTER TABLE {q(TABLE)} ALTER COLUMN id DROP DEFAULT')
+    cursor.execute(f'ALTER TABLE {q(TABLE)} RENAME TO {q(old)}')
+    partition_by = ' PARTITION BY RANGE (created_at)' if partitioned else ''
+    cursor.execute(
+        f'CREATE TABLE {q(TABLE)} (LIKE {q(old)} INCLUDING DEFAULTS){partition_by}',
+    )
+    if partitioned:
+        cursor.execute(f'CREATE TABLE {q(DEFAULT_PARTITION)} PARTITION OF {q(TABLE)} DEFAULT')
+        cursor.execute(f'SELECT min(created_at) FROM {q(old)}')
+        first = cursor.fetchone()[0]
+        for month in _months_ahead(month_start(first) if first else None):
+            _create_partition(cursor, month)
+    cursor.execute(f'INSERT INTO {q(TABLE)} SELECT * FROM {q(old)}')
+    cursor.execute(f'DROP TABLE {q(old)} CASCADE')
+
+    key = '(id, created_at)' if partitioned else '(id)'
+    cursor.execute(f'ALTER TABLE {q(TABLE)} ADD CONSTRAINT {q(TABLE + "_pkey")} PRIMARY KEY {key}')
+    if partitioned:
+        sequence = f'{TABLE}_id_seq'
+        cursor.execute(f'CREATE SEQUENCE {q(sequence)} OWNED BY {q(TABLE)}.id')
+        cursor.execute(
+            f"ALTER TABLE {q(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')",
+        )
+    else:
+        cursor.execute(
+            f'ALTER TABLE {q(TABLE)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY',
+        )
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+        f"coalesce(max(id), 0) + 1, false) FROM {q(TABLE)}",
+        [TABLE],
+    )
+    _restore(cursor, indexes, constraints)
+
+
+def partition_table(connection=default_connection):
+    """Секционировать таблицу подходов (миграция 0013, post_migrate)."""
+    with connection.cursor() as cursor:
+        _swap(cursor, partitioned=True)
+
+
+def merge_table(connection=default_connection):
+    """Вернуть таблицу подходов к обычной (откат миграции 0013)."""
+    with connection.cursor() as cursor:
+        _swap(cursor, partitioned=False)
+
+
+# ============================================================
+# Создание секций
+# ============================================================
+
+def _months_ahead(first=None):
+    """Месяцы от first (или текущего) до WORKOUTSET_PARTITIONS_AHEAD вперёд."""
+    current = month_start(timezone.now())
+    month = min(first, current) if first else current
+    last = add_months(current, settings.WORKOUTSET_PARTITIONS_AHEAD)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def _create_partition(cursor, month):
+    """
+    Создать и присоединить секцию месяца; False — таблица уже есть
+    (в том числе отсоединённая архивная). Строки месяца из секции
+    по умолчанию переносятся в новую секцию до присоединения.
+    """
+    q = cursor.db.ops.quote_name
+    name = partition_name(month)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+    if cursor.fetchone()[0]:
+        return False
+
+    start, end = _bounds(month)
+    cursor.execute(
+        f'CREATE TABLE {q(name)} (LIKE {q(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+    )
+    cursor.execute(
+        f'WITH moved AS ('
+        f'DELETE FROM {q(DEFAULT_PARTITION)} WHERE created_at >= %s AND created_at < %s '
+        f'RETURNING *) INSERT INTO {q(name)} SELECT * FROM moved',
+        [start, end],
+    )
+    cursor.execute(
+        f'ALTER TABLE {q(TABLE)} ATTACH PARTITION {q(name)} FOR VALUES FROM (%s) TO (%s)',
+        [start, end],
+    )
+    return True
+
+
+def ensure_partitions(connection=default_connection):
+    """
+    Создать секции по WORKOUTSET_PARTITIONS_AHEAD месяцев вперёд
+    и для месяцев, чьи строки лежат в секции по умолчанию.
+    Возвращает имена созданных секций.
+    """
+    q = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date "
+            f'FROM {q(DEFAULT_PARTITION)}',
+        )
+        months = set(_months_ahead()) | {row[0] for row in cursor.fetchall()}
+        return [
+            partition_name(month) for month in sorted(months)
+            if _create_partition(cursor, month)
+        ]
+
+
+def prepare(connection=default_connection):
+    """
+    Секционировать таблицу, если это ещё не сделано, и создать секции
+    вперёд. Без настройки или не на PostgreSQL — ничего (None).
+    """
+    if not enabled(connection):
+        return None
+    if not is_partitioned(connection):
+        with transaction.atomic(using=connection.alias):
+            partition_table(connection)
+    return ensure_partitions(connection)
+
+
+def extend_after_migrate(sender, using, **kwargs):
+    """
+    post_migrate: секции вперёд при каждом развёртывании. Саму таблицу
+    секционирует миграция 0013 или, если настройку включили позже,
+    команда partitions.
+    """
+    from django.db import connections
+
+    connection = connections[using]
+    if enabled(connection) and is_partitioned(connection):
+        ensure_partitions(connection)
+
+
+# ============================================================
+# Архивация
+# ============================================================
+
+def _archive_partition(cursor, name, drop):
+    """Отсоединить секцию и свернуть её в ArchivedSets. Возвращает (подходов, пользователи)."""
+    q = cursor.db.ops.quote_name
+    archived = q(ArchivedSets._meta.db_table)
+    workouts = q(Workout._meta.db_table)
+
+    # Сначала отсоединить: новые подходы в секцию больше не попадут,
+    # и сводка читает уже обычную таблицу
+    cursor.execute(f'ALTER TABLE {q(TABLE)} DETACH PARTITION {q(name)}')
+    cursor.execute(
+        f'SELECT DISTINCT w.user_id FROM {q(name)} s JOIN {workouts} w ON w.id = s.workout_id',
+    )
+    users = {row[0] for row in cursor.fetchall()}
+    cursor.execute(
+        f'INSERT INTO {archived} AS a '
+        f'(workout_id, exercise_id, sets_count, reps, volume, max_weight, '
+        f'best_e1rm, best_volume, last_set_at) '
+        f'SELECT workout_id, exercise_id, count(*), sum(reps), sum(weight * reps), '
+        f'max(weight), max(weight * (1 + reps / 30.0::float8)), max(weight * reps), '
+        f'max(created_at) FROM {q(name)} GROUP BY workout_id, exercise_id '
+        f'ON CONFLICT (workout_id, exercise_id) DO UPDATE SET '
+        f'sets_count = a.sets_count + EXCLUDED.sets_count, '
+        f'reps = a.reps + EXCLUDED.reps, '
+        f'volume = a.volume + EXCLUDED.volume, '
+        f'max_weight = greatest(a.max_weight, EXCLUDED.max_weight), '
+        f'best_e1rm = greatest(a.best_e1rm, EXCLUDED.best_e1rm), '
+        f'best_volume = greatest(a.best_volume, EXCLUDED.best_volume), '
+        f'last_set_at = greatest(a.last_set_at, EXCLUDED.last_set_at)',
+    )
+    cursor.execute(f'SELECT count(*) FROM {q(name)}')
+    count = cursor.fetchone()[0]
+    if drop:
+        cursor.execute(f'DROP TABLE {q(name)}')
+    return count, users
+
+
+def archive(retention_months=None, drop=False, connection=default_connection):
+    """
+    Архивировать месячные секции старше retention_months
+    (по умолчанию WORKOUTSET_RETENTION_MONTHS). Каждая секция —
+    в своей транзакции. Возвращает [(имя секции, подходов)].
+    """
+    if retention_months is None:
+        retention_months = settings.WORKOUTSET_RETENTION_MONTHS
+    cutoff = add_months(month_start(timezone.now()), -retention_months)
+
+    result = []
+    for month in attached_months(connection):
+        if month >= cutoff:
+            break
+        name = partition_name(month)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            count, users = _archive_partition(cursor, name, drop)
+            for user_id in users:
+                bump_version(user_scope(user_id))
+        result.append((name, count))
+    return result
@@ -0,0 +1,166 @@
+"""
+Быстрый путь чтения для списков: строки .values() → dict.
+
+Сериализатор DRF на каждый объект создаёт поля, обходит атрибуты
+модели и собирает ReturnDict; на большой странице это дороже самих
+запросов. Читатель один раз разбирает поля того же сериализатора
+(RowMapper) и дальше превращает строки .values() в словари с теми же
+ключами в том же порядке; значения, требующие преобразования (даты,
+время, числа с плавающей точкой), проходят через to_representation
+тех же полей DRF, поэтому JSON совпадает байт в байт.
+
+Вычисляемые и вложенные поля (SerializerMethodField, вложенные
+сериализаторы) читатель досчитывает сам — одним запросом на страницу.
+Сериализаторы по-прежнему используются для записи и детальных ответов.
+"""
+
+from collections import defaultdict
+from functools import cached_property
+
+from django.db.models import F
+from rest_framework import serializers
+
+from .models import Exercise
+from .serializers import (
+    ExerciseSerializer,
+    ScheduledWorkoutSerializer,
+    ScheduleRuleSerializer,
+    WorkoutListSerializer,
+    WorkoutSetSerializer,
+)
+
+# Поля, у которых to_representation не меняет значение из БД
+_IDENTITY = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.RelatedField,
+)
+
+
+class RowMapper:
+    """
+    Поля сериализатора → (ключ, колонка .values(), преобразование).
+
+    computed — имена полей, значения которых читатель кладёт в строку
+    сам (под тем же именем) до преобразования.
+    """
+
+    def __init__(self, serializer_class, computed=()):
+        self.serializer_class = serializer_class
+        self.computed = frozenset(computed)
+
+    @cached_property
+    def plan(self):
+        plan = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if name in self.computed:
+                plan.append((name, name, None))
+                continue
+            assert not isinstance(field, (
+                serializers.SerializerMethodField,
+                serializers.BaseSerializer,
+                serializers.ManyRelatedField,
+            )), f'{self.serializer_class.__name__}.{name} нужно вычислять (computed)'
+            convert = None if isinstance(field, _IDENTITY) else field.to_representation
+            plan.append((name, field.source.replace('.', '__'), convert))
+        return tuple(plan)
+
+    @cached_property
+    def columns(self):
+        return tuple(source for name, source, _ in self.plan if name not in self.computed)
+
+    def __call__(self, row):
+        # None не преобразуется — как в Serializer.to_representation
+        return {
+            name: value if (value := row[source]) is None or convert is None
+            else convert(value)
+            for name, source, convert in self.plan
+        }
+
+
+class Reader:
+    """Строки queryset в формате serializer_class."""
+    mapper = None
+
+    def values(self, queryset):
+        return queryset.prefetch_related(None).values(*self.mapper.columns)
+
+    def related(self, rows):
+        """Queryset с данными для вычисляемых полей страницы (или None)."""
+        return None
+
+    def attach(self, rows, related):
+        """Положить значения вычисляемых полей в строки."""
+
+    def _finish(self, rows, related):
+        self.attach(rows, related)
+        return [self.mapper(row) for row in rows]
+
+    def build(self, rows):
+        related = self.related(rows) if rows else None
+        return self._finish(rows, list(related) if related is not None else [])
+
+    async def abuild(self, rows):
+        related = self.related(rows) if rows else None
+        return self._finish(rows, [item async for item in related] if related is not None else [])
+
+    def read(self, queryset):
+        return self.build(list(self.values(queryset)))
+
+    async def aread(self, queryset):
+        return await self.abuild([row async for row in self.values(queryset)])
+
+
+class WorkoutListReader(Reader):
+    """Как WorkoutListSerializer: итоги — колонки тренировки, подходы не читаются."""
+    mapper = RowMapper(WorkoutListSerializer)
+
+
+class ExerciseReader(Reader):
+    """Как ExerciseSerializer."""
+    mapper = RowMapper(ExerciseSerializer)
+
+
+class WorkoutSetReader(Reader):
+    """Как WorkoutSetSerializer."""
+    mapper = RowMapper(WorkoutSetSerializer)
+
+
+class ScheduledWorkoutReader(Reader):
+    """Как ScheduledWorkoutSerializer: с вложенным списком упражнений."""
+    mapper = RowMapper(ScheduledWorkoutSerializer, computed=('exercises',))
+    exercise_mapper = RowMapper(ExerciseSerializer)
+    # Обратная связь Exercise → модель списка
+    exercises_relation = 'scheduled_workouts'
+
+    def related(self, rows):
+        # Тот же запрос, что у prefetch_related('exercises'),
+        # включая сортировку Exercise.Meta.ordering
+        return (
+            Exercise.objects
+            .filter(**{f'{self.exercises_relation}__in': [row['id'] for row in rows]})
+            .values(*self.exercise_mapper.columns, scheduled_id=F(self.exercises_relation))
+        )
+
+    def attach(self, rows, related):
+        exercises = defaultdict(list)
+        for row in related:
+            exercises[row['scheduled_id']].append(self.exercise_mapper(row))
+        for row in rows:
+            row['exercises'] = exercises.get(row['id'], [])
+
+
+class ScheduleRuleReader(ScheduledWorkoutReader):
+    """Как ScheduleRuleSerializer: с вложенным списком упражнений."""
+    mapper = RowMapper(ScheduleRuleSerializer, computed=('exercises',))
+    exercises_relation = 'schedule_rules'
+
+
+exercises = ExerciseReader()
+workouts = WorkoutListReader()
+sets = WorkoutSetReader()
+scheduled = ScheduledWorkoutReader()
+rules = ScheduleRuleReader()
@@ -0,0 +1,271 @@
+"""
+Индекс личных рекордов: одна строка PersonalRecord на (пользователь, упражнение).
+
+Рекорды обновляются из сигналов при записи подходов. Если удаляется
+или ухудшается подход-рекордсмен, следующий лучший находится одним
+запросом ORDER BY ... LIMIT 1 по подходам этого упражнения в тренировках
+пользователя (индекс (exercise, workout)), без пересчёта всей истории.
+Метрики — выражения над подходом, поэтому сортировка идёт по всем
+подходам упражнения этого пользователя; индекс по весу тут не помогает:
+у подходов нет user, и проход по (exercise, weight) шёл бы через
+подходы всех пользователей общего упражнения.
+
+Поиск следующего лучшего читает всю историю упражнения пользователя,
+поэтому запускается только когда удалённый или перенесённый подход мог
+держать рекорд, а не на каждое удаление.
+
+Подходы архивных секций (см. partitions.py) участвуют через сводки
+ArchivedSets: лучшие значения метрик сохраняются в них при архивации.
+Рекорд, который держит архивный подход, ссылается на отсутствующий
+подход или, после пересчёта, ни на какой (значение остаётся).
+"""
+
+import math
+
+from django.db import transaction
+from django.db.models import F, Max, Q
+
+from .models import ArchivedSets, PersonalRecord, Workout, WorkoutSet
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def estimate_1rm(weight, reps):
+    """Расчётный 1ПМ по формуле Эпли."""
+    return weight * (1 + reps / 30)
+
+
+# Метрика → (вычисление в Python, то же выражение в SQL)
+METRICS = {
+    'max_weight': (
+        lambda weight, reps: weight,
+        F('weight'),
+    ),
+    'best_e1rm': (
+        estimate_1rm,
+        F('weight') * (1 + F('reps') / 30.0),
+    ),
+    'best_volume': (
+        lambda weight, reps: weight * reps,
+        F('weight') * F('reps'),
+    ),
+}
+
+
+def _holder_field(metric):
+    return f'{metric}_set_id'
+
+
+def _find_best(record, metric):
+    """
+    Лучший (подход, значение) по метрике среди оставшихся (или None).
+    Если лучшее значение у архивных подходов — подход None.
+    """
+    _, expression = METRICS[metric]
+    # IN по тренировкам пользователя, а не join: иначе план идёт по подходам
+    # упражнения у всех пользователей и фильтрует их по владельцу
+    workouts = Workout.objects.filter(user_id=record.user_id).values('id')
+    best = (
+        WorkoutSet.objects
+        .filter(exercise_id=record.exercise_id, workout__in=workouts)
+        .annotate(score=expression)
+        .order_by('-score', 'id')
+        .values_list('id', 'score')
+        .first()
+    )
+    archived = ArchivedSets.objects.filter(
+        exercise_id=record.exercise_id, workout__in=workouts,
+    ).aggregate(value=Max(metric))['value']
+    # Архивные подходы раньше живых: при равенстве рекорд за ними
+    if archived is not None and (best is None or archived >= best[1]):
+        return None, archived
+    return best
+
+
+def _recompute(record, metric):
+    best = _find_best(record, metric)
+    value, holder = (best[1], best[0]) if best else (None, None)
+    setattr(record, metric, value)
+    setattr(record, _holder_field(metric), holder)
+
+
+def _locked_record(user_id, exercise_id):
+    record = (
+        PersonalRecord.objects
+        .select_for_update()
+        .filter(user_id=user_id, exercise_id=exercise_id)
+        .first()
+    )
+    if record is None:
+        record, _ = PersonalRecord.objects.get_or_create(
+            user_id=user_id, exercise_id=exercise_id,
+        )
+    return record
+
+
+def _save_or_delete(record):
+    if all(getattr(record, metric) is None for metric in METRICS):
+        record.delete()
+    else:
+        record.save()
+
+
+def record_sets(user_id, exercise_id, sets):
+    """Учесть новые подходы одного упражнения: sets — [(id, weight, reps)]."""
+    with transaction.atomic():
+        record = _locked_record(user_id, exercise_id)
+        changed = False
+        for metric, (compute, _) in METRICS.items():
+            for set_id, weight, reps in sets:
+                value = compute(weight, reps)
+                current = getattr(record, metric)
+                if current is None or value > current:
+                    setattr(record, metric, value)
+                    setattr(record, _holder_field(metric), set_id)
+                    changed = True
+        if changed:
+            record.save()
+
+
+def set_saved(instance, user_id, previous=None):
+    """
+    Обновить рекорды после сохранения подхода.
+
+    previous — прежние (user_id, exercise_id) подхода при обновлении.
+    """
+    key = (user_id, instance.exercise_id)
+    if previous is not None and previous != key:
+        # Подход перенесли в другое упражнение/тренировку другого
+        # пользователя: в старом рекорде он больше не участвует.
+        release_set(previous[0], previous[1], instance.pk)
+        previous = None
+
+    if previous is None:
+        record_sets(*key, [(instance.pk, instance.weight, instance.reps)])
+        return
+
+    with transaction.atomic():
+        record = _locked_record(*key)
+        for metric, (compute, _) in METRICS.items():
+            value = compute(instance.weight, instance.reps)
+            current = getattr(record, metric)
+            if getattr(record, _holder_field(metric)) == instance.pk:
+                if value < current:
+                    # Рекорд ухудшился — возможно, лидирует другой подход
+                    _recompute(record, metric)
+                else:
+                    setattr(record, metric, value)
+            elif current is None or value > current:
+                setattr(record, metric, value)
+                setattr(record, _holder_field(metric), instance.pk)
+        _save_or_delete(record)
+
+
+def release_set(user_id, exercise_id, set_id, weight=None, reps=None):
+    """
+    Пересчитать метрики рекорда, которые держал подход set_id.
+
+    После удаления подхода FK рекордсмена уже обнулён (SET_NULL), как и
+    у рекордов архивных подходов. Тогда weight/reps удалённого подхода
+    отделяют одно от другого: пересчитываются только метрики, значение
+    которых подход достигал.
+    """
+    with transaction.atomic():
+        record = (
+            PersonalRecord.objects
+            .select_for_update()
+            .filter(user_id=user_id, exercise_id=exercise_id)
+            .first()
+        )
+        if record is None:
+            return
+        released = False
+        for metric, (compute, _) in METRICS.items():
+            holder = getattr(record, _holder_field(metric))
+            current = getattr(record, metric)
+            if holder == set_id or (
+                holder is None and weight is not None and current is not None
+                # Значение из SQL может отличаться от Python в последнем знаке
+                and (compute(weight, reps) >= current
+                     or math.isclose(compute(weight, reps), current))
+            ):
+                _recompute(record, metric)
+                released = True
+        if released:
+            _save_or_delete(record)
+
+
+def refresh_orphaned(user_id, exercise_ids):
+    """
+    Пересчитать рекорды упражнений exercise_ids без подхода-рекордсмена.
+
+    После удаления тренировки FK рекордов обнуляются (SET_NULL), а её
+    сводки ArchivedSets удаляются: пересчитываются метрики с пустым
+    подходом, но только по упражнениям удалённой тренировки.
+    """
+    orphaned = Q()
+    for metric in METRICS:
+        orphaned |= Q(**{f'{metric}_set__isnull': True})
+
+    records = PersonalRecord.objects.filter(
+        orphaned, user_id=user_id, exercise_id__in=exercise_ids,
+    )
+
+    with transaction.atomic():
+        for record in records.select_for_update():
+            for metric in METRICS:
+                if getattr(record, _holder_field(metric)) is None:
+                    _recompute(record, metric)
+            _save_or_delete(record)
+
+
+def rebuild_personal_records(user_ids=None):
+    """Пересобрать PersonalRecord с нуля. Возвращает число строк."""
+    records = PersonalRecord.objects.all()
+    sets = WorkoutSet.objects.all()
+    archived = ArchivedSets.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+        sets = sets.filter(workout__user_id__in=user_ids)
+        archived = archived.filter(workout__user_id__in=user_ids)
+
+    rows = (
+        sets
+        .values_list('workout__user_id', 'exercise_id', 'id', 'weight', 'reps')
+        .order_by('id')
+    )
+
+    # Начальные значения — лучшие из архива (без подхода-рекордсмена)
+    best = {
+        (row['workout__user_id'], row['exercise_id']): PersonalRecord(
+            user_id=row['workout__user_id'], exercise_id=row['exercise_id'],
+            **{metric: row[metric] for metric in METRICS},
+        )
+        for row in archived.values('workout__user_id', 'exercise_id').annotate(
+            **{metric: Max(metric) for metric in METRICS},
+        ).order_by()
+    }
+
+    # При равных значениях рекорд остаётся за более ранним подходом
+    for user_id, exercise_id, set_id, weight, reps in rows.iterator(
+        chunk_size=REBUILD_BATCH_SIZE,
+    ):
+        record = best.get((user_id, exercise_id))
+        if record is None:
+            record = best[user_id, exercise_id] = PersonalRecord(
+                user_id=user_id, exercise_id=exercise_id,
+            )
+        for metric, (compute, _) in METRICS.items():
+            value = compute(weight, reps)
+            current = getattr(record, metric)
+            if current is None or value > current:
+                setattr(record, metric, value)
+                setattr(record, _holder_field(metric), set_id)
+
+    with transaction.atomic():
+        records.delete()
+        PersonalRecord.objects.bulk_create(
+            best.values(), batch_size=REBUILD_BATCH_SIZE,
+        )
+
+    return len(best)
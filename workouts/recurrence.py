@@ -0,0 +1,178 @@
+"""
+Повторяющееся расписание (ScheduleRule).
+
+Правило — дни недели (номера ScheduledWorkout.DAY_CHOICES), шаг
+в неделях от недели start_date и ограничение until и/или count.
+Повторения не хранятся: календарь, список предстоящих и диспетчер
+напоминаний разворачивают правило только для запрошенного периода.
+Последнее повторение правила с count считается арифметически и
+хранится в last_date — по нему правила периода выбираются запросом.
+
+Повторение становится отдельной ScheduledWorkout (materialize), когда
+его начинают, выполняют или меняют. Его дата попадает в exceptions
+правила, поэтому оно больше не разворачивается; пропущенные даты
+(skip) попадают туда же. Исключённые повторения учитываются в count.
+"""
+
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from .models import ScheduledWorkout
+
+
+class Pattern(NamedTuple):
+    start_date: date
+    weekdays: frozenset
+    interval: int
+    until: date | None
+    count: int | None
+    exceptions: frozenset
+
+
+def _date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _monday(day):
+    return day - timedelta(days=day.weekday())
+
+
+def pattern(rule):
+    """Pattern правила: модели, строки .values() или ответа читателя."""
+    get = rule.get if isinstance(rule, dict) else lambda name: getattr(rule, name)
+    return Pattern(
+        start_date=_date(get('start_date')),
+        weekdays=frozenset(get('weekdays')),
+        interval=get('interval') or 1,
+        until=_date(get('until')),
+        count=get('count'),
+        exceptions=frozenset(_date(day) for day in get('exceptions') or ()),
+    )
+
+
+def last_date(rule):
+    """Дата последнего повторения (None — правило бессрочное)."""
+    end = rule.until
+    if rule.count and rule.weekdays:
+        days = sorted(rule.weekdays)
+        monday = _monday(rule.start_date)
+        first_week = [day for day in days if day >= rule.start_date.weekday()]
+        if rule.count <= len(first_week):
+            last = monday + timedelta(days=first_week[rule.count - 1])
+        else:
+            # Остальные повторения — полными активными неделями
+            rest = rule.count - len(first_week) - 1
+            weeks = (rest // len(days) + 1) * rule.interval
+            last = monday + timedelta(weeks=weeks, days=days[rest % len(days)])
+        end = last if end is None else min(end, last)
+    return end
+
+
+def occurrences(rule, first, last, skip_exceptions=True):
+    """Даты повторений правила (Pattern) в [first, last] по порядку."""
+    first = max(first, rule.start_date)
+    end = last_date(rule)
+    if end is not None:
+        last = min(last, end)
+    monday = _monday(rule.start_date)
+
+    day = first
+    while day <= last:
+        if (
+            day.weekday() in rule.weekdays
+            and (day - monday).days // 7 % rule.interval == 0
+            and not (skip_exceptions and day in rule.exceptions)
+        ):
+            yield day
+        day += timedelta(days=1)
+
+
+def is_occurrence(rule, day):
+    """Выпадает ли повторение правила (Pattern) на day, без учёта исключений."""
+    return any(occurrences(rule, day, day, skip_exceptions=False))
+
+
+def expand(rules, first, last):
+    """
+    Повторения правил (строки readers.rules) за [first, last] в формате
+    ScheduledWorkoutSerializer: id — None, правило и дата — в rule, rule_date.
+    """
+    rows = []
+    for rule in rules:
+        for day in occurrences(pattern(rule), first, last):
+            rows.append({
+                'id': None,
+                'date': day.isoformat(),
+                'time': rule['time'],
+                'title': rule['title'],
+                'exercises': rule['exercises'],
+                'note': rule['note'],
+                'is_completed': False,
+                'workout': None,
+                'notify_before': rule['notify_before'],
+                'rule': rule['id'],
+                'rule_date': day.isoformat(),
+            })
+    return rows
+
+
+def merge(scheduled, occurrences_rows):
+    """Записи расписания и повторения правил вместе, по дате и времени."""
+    return sorted(
+        [*scheduled, *occurrences_rows],
+        key=lambda row: (row['date'], row['time'] or ''),
+    )
+
+
+def _except(rule, day):
+    rule.exceptions = sorted({*rule.exceptions, day.isoformat()})
+    rule.save()
+
+
+def materialize(rule, day, **fields):
+    """
+    Запись расписания для повторения day: при первом обращении
+    создаётся из правила, fields — изменённые поля записи.
+    None — такого повторения нет или оно пропущено.
+    """
+    scheduled = rule.occurrences.filter(rule_date=day).first()
+    if scheduled is not None:
+        if fields:
+            for name, value in fields.items():
+                setattr(scheduled, name, value)
+            scheduled.save()
+        return scheduled
+    current = pattern(rule)
+    if day in current.exceptions or not is_occurrence(current, day):
+        return None
+
+    scheduled = ScheduledWorkout.objects.create(
+        user_id=rule.user_id,
+        date=day,
+        time=rule.time,
+        title=rule.title,
+        note=rule.note,
+        notify_before=rule.notify_before,
+        rule=rule,
+        rule_date=day,
+        **fields,
+    )
+    # Упражнения правила обычно уже загружены (prefetch_related)
+    through = ScheduledWorkout.exercises.through
+    through.objects.bulk_create(
+        through(scheduledworkout_id=scheduled.pk, exercise_id=exercise.pk)
+        for exercise in rule.exercises.all()
+    )
+    _except(rule, day)
+    return scheduled
+
+
+def skip(rule, day):
+    """Пропустить повторение day (и удалить его запись, если она есть)."""
+    if not is_occurrence(pattern(rule), day):
+        return False
+    for scheduled in rule.occurrences.filter(rule_date=day):
+        scheduled.delete()
+    if day.isoformat() not in rule.exceptions:
+        _except(rule, day)
+    return True
@@ -0,0 +1,229 @@
+"""
+Инкрементальные агрегаты по подходам.
+
+DailyVolume хранит тоннаж пользователя за локальный день (TIME_ZONE),
+поэтому аналитика читает по строке на день, а не все подходы.
+Агрегаты обновляются из сигналов (см. signals.py) атомарными F()-апдейтами,
+а rebuild_daily_volume() пересобирает их с нуля. Любое изменение
+агрегата сбрасывает кеш тепловой карты за его год (volume_scope).
+
+Итоги тренировки (Workout.total_sets, total_volume, exercise_count,
+last_set_at) обновляются тем же путём: число подходов и тоннаж —
+F()-приращением, число упражнений и время последнего подхода —
+подзапросом по подходам этой тренировки в том же UPDATE. Списки
+и календарь читают готовые итоги и подходы не загружают.
+
+Подходы архивных секций (см. partitions.py) учитываются через
+ArchivedSets: пересборка складывает их с живыми подходами,
+удаление тренировки или упражнения вычитает их из тоннажа по дням.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, ExtractYear, TruncDate
+from django.utils import timezone
+
+from .cache import bump_version, volume_scope
+from .models import ArchivedSets, DailyVolume, Workout, WorkoutSet
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def local_day(dt):
+    """Локальная дата (TIME_ZONE) для момента начала тренировки."""
+    return timezone.localdate(dt)
+
+
+def apply_volume_delta(user_id, day, volume, sets_count):
+    """Добавить к тоннажу дня volume и sets_count (могут быть < 0)."""
+    if not sets_count and not volume:
+        return
+    bump_version(volume_scope(user_id, day.year))
+
+    rows = DailyVolume.objects.filter(user_id=user_id, date=day)
+    updated = rows.update(
+        volume=F('volume') + volume,
+        sets_count=F('sets_count') + sets_count,
+    )
+    if updated:
+        if sets_count < 0:
+            # День без подходов не показываем — удаляем строку
+            rows.filter(sets_count__lte=0).delete()
+        return
+
+    if sets_count <= 0:
+        # Вычитать не из чего: агрегат уже рассинхронизирован,
+        # его починит rebuild_rollups
+        return
+
+    try:
+        with transaction.atomic():
+            DailyVolume.objects.create(
+                user_id=user_id, date=day,
+                volume=volume, sets_count=sets_count,
+            )
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        rows.update(
+            volume=F('volume') + volume,
+            sets_count=F('sets_count') + sets_count,
+        )
+
+
+def _totals(sets, archived):
+    """
+    Итоги тренировки по подходам sets и сводкам archived —
+    подзапросы для UPDATE Workout.
+    """
+    live = sets.filter(workout=OuterRef('pk')).order_by().values('workout')
+    summaries = archived.filter(workout=OuterRef('pk')).order_by().values('workout')
+
+    def column(queryset, aggregate):
+        return Subquery(queryset.annotate(value=aggregate).values('value'))
+
+    # Упражнения архива, которых нет среди живых подходов тренировки
+    archived_only = summaries.exclude(
+        exercise__in=sets.filter(workout=OuterRef('workout')).values('exercise'),
+    )
+    return {
+        'total_sets': (
+            Coalesce(column(live, Count('id')), 0)
+            + Coalesce(column(summaries, Sum('sets_count')), 0)
+        ),
+        'total_volume': (
+            Coalesce(column(live, Sum(F('weight') * F('reps'))), 0.0)
+            + Coalesce(column(summaries, Sum('volume')), 0.0)
+        ),
+        'exercise_count': (
+            Coalesce(column(live, Count('exercise', distinct=True)), 0)
+            + Coalesce(column(archived_only, Count('id')), 0)
+        ),
+        # Архивируются только старые секции: живой подход всегда позже
+        'last_set_at': Coalesce(
+            column(live, Max('created_at')), column(summaries, Max('last_set_at')),
+        ),
+    }
+
+
+def apply_workout_delta(workout_id, volume, sets_count):
+    """Добавить к итогам тренировки volume и sets_count (могут быть < 0)."""
+    totals = _totals(WorkoutSet.objects.all(), ArchivedSets.objects.all())
+    Workout.objects.filter(pk=workout_id).update(
+        total_sets=F('total_sets') + sets_count,
+        total_volume=F('total_volume') + volume,
+        exercise_count=totals['exercise_count'],
+        last_set_at=totals['last_set_at'],
+    )
+
+
+def subtract_exercise(exercise):
+    """Перед удалением упражнения: итоги тренировок без его подходов."""
+    Workout.objects.filter(
+        Q(pk__in=WorkoutSet.objects.filter(exercise=exercise).values('workout_id'))
+        | Q(pk__in=ArchivedSets.objects.filter(exercise=exercise).values('workout_id')),
+    ).update(**_totals(
+        WorkoutSet.objects.exclude(exercise=exercise),
+        ArchivedSets.objects.exclude(exercise=exercise),
+    ))
+
+
+def rebuild_workout_totals(user_ids=None):
+    """Пересчитать итоги тренировок по подходам. Возвращает число тренировок."""
+    workouts = Workout.objects.all()
+    if user_ids is not None:
+        workouts = workouts.filter(user_id__in=user_ids)
+    return workouts.update(**_totals(WorkoutSet.objects.all(), ArchivedSets.objects.all()))
+
+
+def _group_by_day(queryset, volume=None, sets_count=None):
+    """
+    Тоннаж и число подходов queryset по (пользователь, локальный день).
+    Для сводок ArchivedSets — суммы их колонок volume и sets_count.
+    """
+    return (
+        queryset
+        .annotate(day=TruncDate('workout__start_time'))
+        .values('workout__user_id', 'day')
+        .annotate(
+            volume=Sum(F('weight') * F('reps')) if volume is None else volume,
+            sets_count=Count('id') if sets_count is None else sets_count,
+        )
+        .order_by()
+    )
+
+
+def _group_archived_by_day(queryset):
+    return _group_by_day(queryset, Sum('volume'), Sum('sets_count'))
+
+
+def subtract_sets(queryset, archived=None):
+    """
+    Вычесть из агрегатов все подходы queryset и сводки archived
+    (по одному GROUP BY).
+    """
+    groups = [_group_by_day(queryset)]
+    if archived is not None:
+        groups.append(_group_archived_by_day(archived))
+    for rows in groups:
+        for row in rows:
+            apply_volume_delta(
+                row['workout__user_id'], row['day'],
+                -(row['volume'] or 0), -row['sets_count'],
+            )
+
+
+def _with_archived(groups, archived):
+    """Дни живых подходов с добавленными днями архива (строк архива немного)."""
+    days = {(row['workout__user_id'], row['day']): row for row in archived}
+    for row in groups:
+        extra = days.pop((row['workout__user_id'], row['day']), None)
+        if extra is not None:
+            row['volume'] = (row['volume'] or 0) + (extra['volume'] or 0)
+            row['sets_count'] += extra['sets_count']
+        yield row
+    # Дни, где остались только архивные подходы
+    yield from days.values()
+
+
+def rebuild_daily_volume(user_ids=None):
+    """Пересобрать DailyVolume с нуля. Возвращает число строк."""
+    rollups = DailyVolume.objects.all()
+    sets = WorkoutSet.objects.all()
+    archived = ArchivedSets.objects.all()
+    if user_ids is not None:
+        rollups = rollups.filter(user_id__in=user_ids)
+        sets = sets.filter(workout__user_id__in=user_ids)
+        archived = archived.filter(workout__user_id__in=user_ids)
+
+    groups = _group_by_day(sets)
+    created = 0
+    with transaction.atomic():
+        # Годы, где агрегат был или появится, — их кеш сбрасывается
+        years = set(
+            rollups.annotate(year=ExtractYear('date'))
+            .values_list('user_id', 'year').distinct().order_by()
+        )
+        rollups.delete()
+        batch = []
+        rows = _with_archived(
+            groups.iterator(chunk_size=REBUILD_BATCH_SIZE),
+            _group_archived_by_day(archived),
+        )
+        for row in rows:
+            years.add((row['workout__user_id'], row['day'].year))
+            batch.append(DailyVolume(
+                user_id=row['workout__user_id'],
+                date=row['day'],
+                volume=row['volume'] or 0,
+                sets_count=row['sets_count'],
+            ))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                DailyVolume.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        DailyVolume.objects.bulk_create(batch)
+        created += len(batch)
+        for user_id, year in years:
+            bump_version(volume_scope(user_id, year))
+
+    return created
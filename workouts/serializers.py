@@ -1,8 +1,37 @@
 from collections import OrderedDict
 
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 
-from .models import Exercise, ScheduledWorkout, Workout, WorkoutSet
+from . import catalog
+from .models import Exercise, ScheduledWorkout, ScheduleRule, Workout, WorkoutSet
+
+
+def sets_prefetch():
+    """
+    Подходы тренировок одним запросом вместе с упражнениями.
+
+    Порядок (workout, created_at) совпадает с индексом, поэтому
+    выборка по списку тренировок не требует отдельной сортировки.
+    """
+    return Prefetch(
+        'sets',
+        queryset=WorkoutSet.objects
+        .select_related('exercise')
+        .order_by('workout_id', 'created_at'),
+    )
+
+
+def _workout_sets(obj):
+    """
+    Подходы тренировки из prefetch.
+
+    Если тренировку не выбирали с prefetch (создание, обновление),
+    подходы загружаются один раз на все поля сериализатора.
+    """
+    if 'sets' not in getattr(obj, '_prefetched_objects_cache', {}):
+        prefetch_related_objects([obj], sets_prefetch())
+    return obj.sets.all()
 
 
 class ExerciseSerializer(serializers.ModelSerializer):
@@ -12,7 +41,28 @@ class ExerciseSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'is_custom']
 
 
+class ExerciseField(serializers.PrimaryKeyRelatedField):
+    """Упражнение по id: общие — из справочника в памяти, без запроса."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Exercise.objects.all())
+        super().__init__(**kwargs)
+
+    def cached(self, pk):
+        return catalog.get(pk)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.isdigit():
+            data = int(data)
+        if isinstance(data, int) and not isinstance(data, bool):
+            exercise = self.cached(data)
+            if exercise is not None:
+                return exercise
+        return super().to_internal_value(data)
+
+
 class WorkoutSetSerializer(serializers.ModelSerializer):
+    exercise = ExerciseField()
     exercise_name = serializers.CharField(source='exercise.name', read_only=True)
 
     class Meta:
@@ -21,6 +71,21 @@ class WorkoutSetSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
+class BulkSetItemSerializer(serializers.Serializer):
+    """Элемент пакетной записи подходов (тренировка — из URL)."""
+    exercise = serializers.IntegerField(min_value=1)
+    weight = serializers.FloatField()
+    reps = serializers.IntegerField(min_value=0)
+    rir = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Подзапрос POST /api/batch/: путь вместе с query string, тело — JSON."""
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = serializers.RegexField(r'^/api/', max_length=2000)
+    body = serializers.JSONField(required=False, allow_null=True)
+
+
 class SetInGroupSerializer(serializers.ModelSerializer):
     """Подход внутри группы (без exercise — он уже в родителе)."""
 
@@ -30,24 +95,18 @@ class SetInGroupSerializer(serializers.ModelSerializer):
 
 
 class WorkoutListSerializer(serializers.ModelSerializer):
-    """Краткий — для списка тренировок."""
-    total_sets = serializers.IntegerField(source='sets.count', read_only=True)
-    total_volume = serializers.SerializerMethodField()
+    """Краткий — для списка тренировок: итоги хранятся в самой тренировке."""
 
     class Meta:
         model = Workout
-        fields = ['id', 'start_time', 'end_time', 'status', 'note', 'total_sets', 'total_volume']
-
-    def get_total_volume(self, obj):
-        """Общий тоннаж тренировки (вес × повторения)."""
-        return sum(s.weight * s.reps for s in obj.sets.all())
+        fields = ['id', 'start_time', 'end_time', 'status', 'note', 'total_sets',
+                  'total_volume', 'exercise_count', 'last_set_at']
 
 
 class WorkoutDetailSerializer(serializers.ModelSerializer):
     """Подробный — подходы сгруппированы по упражнениям."""
     exercises = serializers.SerializerMethodField()
     duration_minutes = serializers.SerializerMethodField()
-    total_volume = serializers.SerializerMethodField()
 
     class Meta:
         model = Workout
@@ -55,8 +114,13 @@ class WorkoutDetailSerializer(serializers.ModelSerializer):
                   'duration_minutes', 'total_volume', 'exercises']
 
     def get_exercises(self, obj):
-        """Группировка подходов по упражнениям."""
-        sets = obj.sets.select_related('exercise').order_by('created_at')
+        """
+        Группировка подходов по упражнениям.
+
+        Подходы берутся из prefetch (см. sets_prefetch),
+        уже упорядоченными по created_at и вместе с упражнениями.
+        """
+        sets = _workout_sets(obj)
         groups = OrderedDict()
         for s in sets:
             ex_id = s.exercise_id
@@ -76,15 +140,49 @@ class WorkoutDetailSerializer(serializers.ModelSerializer):
             return round(delta.total_seconds() / 60)
         return None
 
-    def get_total_volume(self, obj):
-        return sum(s.weight * s.reps for s in obj.sets.all())
+
+class PrimaryKeyListField(serializers.ManyRelatedField):
+    """
+    Список id для many-to-many: все объекты одним запросом.
+
+    Стандартный ManyRelatedField проверяет каждый id отдельным get().
+    Если у дочернего поля есть cached(pk) (ExerciseField), найденные
+    там объекты из БД не читаются.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        pks = []
+        for item in data:
+            try:
+                pks.append(int(item))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        found = {}
+        if hasattr(child, 'cached'):
+            for pk in pks:
+                obj = child.cached(pk)
+                if obj is not None:
+                    found[pk] = obj
+        missing = [pk for pk in pks if pk not in found]
+        if missing:
+            found.update(child.get_queryset().in_bulk(missing))
+        for pk in pks:
+            if pk not in found:
+                child.fail('does_not_exist', pk_value=pk)
+        return [found[pk] for pk in pks]
 
 
 class ScheduledWorkoutSerializer(serializers.ModelSerializer):
     exercises = ExerciseSerializer(many=True, read_only=True)
-    exercise_ids = serializers.PrimaryKeyRelatedField(
-        queryset=Exercise.objects.all(),
-        many=True,
+    exercise_ids = PrimaryKeyListField(
+        child_relation=ExerciseField(),
         write_only=True,
         source='exercises',
         required=False,
@@ -95,9 +193,49 @@ class ScheduledWorkoutSerializer(serializers.ModelSerializer):
         model = ScheduledWorkout
         fields = [
             'id', 'date', 'time', 'title', 'exercises', 'exercise_ids',
-            'note', 'is_completed', 'workout', 'notify_before',
+            'note', 'is_completed', 'workout', 'notify_before', 'rule', 'rule_date',
+        ]
+        read_only_fields = ['workout', 'rule', 'rule_date']
+
+
+class ScheduleRuleSerializer(serializers.ModelSerializer):
+    exercises = ExerciseSerializer(many=True, read_only=True)
+    exercise_ids = PrimaryKeyListField(
+        child_relation=ExerciseField(),
+        write_only=True,
+        source='exercises',
+        required=False,
+    )
+    weekdays = serializers.ListField(
+        child=serializers.ChoiceField(choices=ScheduledWorkout.DAY_CHOICES),
+        allow_empty=False,
+    )
+    exceptions = serializers.ListField(child=serializers.DateField(), required=False)
+
+    class Meta:
+        model = ScheduleRule
+        fields = [
+            'id', 'title', 'time', 'exercises', 'exercise_ids', 'note', 'notify_before',
+            'weekdays', 'interval', 'start_date', 'until', 'count', 'exceptions',
         ]
-        read_only_fields = ['workout']
+        extra_kwargs = {
+            'interval': {'min_value': 1},
+            'count': {'min_value': 1},
+        }
+
+    def validate_weekdays(self, value):
+        return sorted(set(value))
+
+    def validate_exceptions(self, value):
+        # В JSONField — ISO-строки
+        return sorted({day.isoformat() for day in value})
+
+    def validate(self, attrs):
+        start_date = attrs.get('start_date', getattr(self.instance, 'start_date', None))
+        until = attrs.get('until', getattr(self.instance, 'until', None))
+        if start_date and until and until < start_date:
+            raise serializers.ValidationError({'until': 'Раньше даты начала'})
+        return attrs
 
 
 class CalendarDaySerializer(serializers.Serializer):
@@ -0,0 +1,355 @@
+"""
+Сигналы, поддерживающие денормализованные агрегаты в актуальном состоянии.
+
+Каскадное удаление (тренировки, упражнения) обрабатывается один раз
+на уровне родителя одним GROUP BY, а не построчно для каждого подхода:
+обработчики подходов проверяют origin удаления.
+
+bulk_create не отправляет post_save, поэтому пакетная запись подходов
+отправляет собственный сигнал bulk_sets_created.
+
+Любая запись тренировок, подходов и расписания увеличивает версию
+данных пользователя: закешированные ответы (календарь) устаревают.
+
+Те же записи получают номер изменения для синхронизации клиентов,
+удаления оставляют Tombstone (см. sync.py).
+
+Сохранение записи расписания или правила повторения оставляет
+ReminderChange для диспетчера напоминаний (см. notifications.py).
+"""
+
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import catalog, notifications, records, recurrence, rollups, sync
+from .cache import CATALOG_SCOPE, bump_version, exercises_scope, user_scope
+from .models import (
+    ArchivedSets,
+    ChangeCounter,
+    Exercise,
+    ScheduledWorkout,
+    ScheduleRule,
+    Workout,
+    WorkoutSet,
+)
+
+
+# Аргументы: workout, sets (созданные bulk_create подходы одной тренировки)
+bulk_sets_created = Signal()
+
+
+def _origin_model(origin):
+    """Модель, с которой началось удаление (экземпляр или QuerySet)."""
+    if isinstance(origin, QuerySet):
+        return origin.model
+    return type(origin)
+
+
+@receiver(pre_save, sender=WorkoutSet)
+def remember_previous_set(sender, instance, raw=False, **kwargs):
+    """Запомнить прежние значения подхода перед обновлением."""
+    instance._previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous = (
+        WorkoutSet.objects
+        .filter(pk=instance.pk)
+        .values(
+            'weight', 'reps', 'exercise_id', 'workout_id',
+            'workout__user_id', 'workout__start_time',
+        )
+        .first()
+    )
+
+
+@receiver(post_save, sender=WorkoutSet)
+def set_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    workout = instance.workout
+    day = rollups.local_day(workout.start_time)
+    volume = instance.weight * instance.reps
+
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        rollups.apply_volume_delta(workout.user_id, day, volume, 1)
+        rollups.apply_workout_delta(workout.pk, volume, 1)
+        records.set_saved(instance, workout.user_id)
+        return
+
+    old_day = rollups.local_day(previous['workout__start_time'])
+    old_volume = previous['weight'] * previous['reps']
+    if previous['workout_id'] == workout.pk:
+        rollups.apply_workout_delta(workout.pk, volume - old_volume, 0)
+    else:
+        rollups.apply_workout_delta(previous['workout_id'], -old_volume, -1)
+        rollups.apply_workout_delta(workout.pk, volume, 1)
+    if (previous['workout__user_id'], old_day) == (workout.user_id, day):
+        rollups.apply_volume_delta(workout.user_id, day, volume - old_volume, 0)
+    else:
+        rollups.apply_volume_delta(
+            previous['workout__user_id'], old_day, -old_volume, -1,
+        )
+        rollups.apply_volume_delta(workout.user_id, day, volume, 1)
+
+    records.set_saved(
+        instance, workout.user_id,
+        previous=(previous['workout__user_id'], previous['exercise_id']),
+    )
+
+
+@receiver(bulk_sets_created)
+def sets_bulk_created(sender, workout, sets, **kwargs):
+    volume = sum(s.weight * s.reps for s in sets)
+    rollups.apply_volume_delta(
+        workout.user_id, rollups.local_day(workout.start_time), volume, len(sets),
+    )
+    rollups.apply_workout_delta(workout.pk, volume, len(sets))
+
+    by_exercise = defaultdict(list)
+    for s in sets:
+        by_exercise[s.exercise_id].append((s.pk, s.weight, s.reps))
+    for exercise_id, items in by_exercise.items():
+        records.record_sets(workout.user_id, exercise_id, items)
+
+
+@receiver(post_delete, sender=WorkoutSet)
+def set_deleted(sender, instance, origin=None, **kwargs):
+    # Каскад от тренировки/упражнения уже учтён в их pre_delete,
+    # а при удалении пользователя агрегаты удаляются каскадом.
+    if _origin_model(origin) is not WorkoutSet:
+        return
+
+    workout = instance.workout
+    rollups.apply_volume_delta(
+        workout.user_id,
+        rollups.local_day(workout.start_time),
+        -(instance.weight * instance.reps),
+        -1,
+    )
+    rollups.apply_workout_delta(workout.pk, -(instance.weight * instance.reps), -1)
+    records.release_set(
+        workout.user_id, instance.exercise_id, instance.pk,
+        instance.weight, instance.reps,
+    )
+
+
+@receiver(pre_delete, sender=Workout)
+def workout_deleting(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Workout:
+        return
+    sets = WorkoutSet.objects.filter(workout=instance)
+    archived = ArchivedSets.objects.filter(workout=instance)
+    rollups.subtract_sets(sets, archived)
+    # Рекорды могут измениться только по упражнениям этой тренировки
+    instance._exercise_ids = set(
+        sets.values_list('exercise_id', flat=True).order_by()
+        .union(archived.values_list('exercise_id', flat=True))
+    )
+
+
+@receiver(post_delete, sender=Workout)
+def workout_deleted(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Workout:
+        return
+    # Подходы удалены, FK рекордов обнулены — ищем следующих лидеров
+    exercise_ids = getattr(instance, '_exercise_ids', None)
+    if exercise_ids:
+        records.refresh_orphaned(instance.user_id, exercise_ids)
+
+
+@receiver(pre_delete, sender=Exercise)
+def exercise_deleting(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Exercise:
+        return
+    rollups.subtract_sets(
+        WorkoutSet.objects.filter(exercise=instance),
+        ArchivedSets.objects.filter(exercise=instance),
+    )
+    rollups.subtract_exercise(instance)
+
+
+# ============================================================
+# Версии данных для кеша
+# ============================================================
+
+# Упражнения расписания (M2M) меняются вместе с сохранением самой записи
+# (сериализатор, админка), поэтому отдельный m2m_changed не нужен:
+# с ним Django перестаёт вставлять связи без предварительного SELECT.
+@receiver(post_save, sender=Workout)
+@receiver(post_delete, sender=Workout)
+@receiver(post_save, sender=ScheduledWorkout)
+@receiver(post_delete, sender=ScheduledWorkout)
+@receiver(post_save, sender=ScheduleRule)
+@receiver(post_delete, sender=ScheduleRule)
+def user_data_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_version(user_scope(instance.user_id))
+
+
+@receiver(post_save, sender=WorkoutSet)
+@receiver(post_delete, sender=WorkoutSet)
+def set_changed(sender, instance, raw=False, origin=None, **kwargs):
+    if raw:
+        return
+    # При каскаде версию уже увеличил родитель
+    if origin is not None and _origin_model(origin) is not WorkoutSet:
+        return
+    bump_version(user_scope(instance.workout.user_id))
+
+
+@receiver(bulk_sets_created)
+def sets_bulk_changed(sender, workout, **kwargs):
+    bump_version(user_scope(workout.user_id))
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def exercise_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.user_id is None:
+        # Копия справочника в этом процессе — сразу, в остальных — по версии
+        catalog.invalidate()
+        bump_version(CATALOG_SCOPE)
+    else:
+        bump_version(user_scope(instance.user_id))
+        bump_version(exercises_scope(instance.user_id))
+
+
+# ============================================================
+# Номера изменений для синхронизации
+# ============================================================
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    # Счётчик сразу: первая запись не тратит запросы на его создание
+    if created and not raw:
+        ChangeCounter.objects.create(user=instance)
+
+
+@receiver(pre_save, sender=Workout)
+@receiver(pre_save, sender=ScheduledWorkout)
+@receiver(pre_save, sender=ScheduleRule)
+def sequence_user_data(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance.seq = sync.next_seq(instance.user_id)
+
+
+@receiver(pre_save, sender=Exercise)
+def sequence_exercise(sender, instance, raw=False, **kwargs):
+    # Общий справочник синхронизируется через ETag списка
+    if raw or instance.user_id is None:
+        return
+    instance.seq = sync.next_seq(instance.user_id)
+    if not instance._state.adding:
+        # Название упражнения входит в подходы и расписание
+        Workout.objects.filter(sets__exercise=instance).update(seq=instance.seq)
+        ScheduledWorkout.objects.filter(exercises=instance).update(seq=instance.seq)
+        ScheduleRule.objects.filter(exercises=instance).update(seq=instance.seq)
+
+
+@receiver(pre_save, sender=WorkoutSet)
+def sequence_set(sender, instance, raw=False, **kwargs):
+    # Регистрируется после remember_previous_set: _previous уже прочитан
+    if raw:
+        return
+    user_id = instance.workout.user_id
+    instance.seq = sync.next_seq(user_id)
+    sync.touch_workouts([instance.workout_id], instance.seq)
+
+    previous = getattr(instance, '_previous', None)
+    if previous is None or previous['workout_id'] == instance.workout_id:
+        return
+    if previous['workout__user_id'] == user_id:
+        sync.touch_workouts([previous['workout_id']], instance.seq)
+    else:
+        seq = sync.next_seq(previous['workout__user_id'])
+        sync.touch_workouts([previous['workout_id']], seq)
+        sync.bury(previous['workout__user_id'], seq, [('set', instance.pk)])
+
+
+@receiver(post_delete, sender=WorkoutSet)
+def set_buried(sender, instance, origin=None, **kwargs):
+    # Каскад от тренировки/упражнения учтён в их pre_delete
+    if _origin_model(origin) is not WorkoutSet:
+        return
+    user_id = instance.workout.user_id
+    seq = sync.next_seq(user_id)
+    sync.bury(user_id, seq, [('set', instance.pk)])
+    sync.touch_workouts([instance.workout_id], seq)
+
+
+@receiver(pre_delete, sender=Workout)
+def workout_buried(sender, instance, origin=None, **kwargs):
+    # При удалении пользователя его данные (и счётчик) удаляются каскадом
+    if _origin_model(origin) is not Workout:
+        return
+    seq = sync.next_seq(instance.user_id)
+    sets = WorkoutSet.objects.filter(workout=instance).values_list('pk', flat=True)
+    sync.bury(
+        instance.user_id, seq,
+        [('workout', instance.pk), *(('set', pk) for pk in sets)],
+    )
+    # Связь расписания с тренировкой обнуляется (SET_NULL)
+    ScheduledWorkout.objects.filter(workout=instance).update(seq=seq)
+
+
+@receiver(post_delete, sender=ScheduledWorkout)
+def schedule_buried(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not ScheduledWorkout:
+        return
+    sync.bury(instance.user_id, sync.next_seq(instance.user_id), [('schedule', instance.pk)])
+
+
+@receiver(pre_delete, sender=ScheduleRule)
+def rule_buried(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not ScheduleRule:
+        return
+    seq = sync.next_seq(instance.user_id)
+    sync.bury(instance.user_id, seq, [('rule', instance.pk)])
+    # Связь записей-повторений с правилом обнуляется (SET_NULL)
+    ScheduledWorkout.objects.filter(rule=instance).update(seq=seq)
+
+
+@receiver(pre_delete, sender=Exercise)
+def exercise_buried(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is not Exercise:
+        return
+    sync.exercise_removed(instance)
+
+
+# ============================================================
+# Напоминания
+# ============================================================
+
+@receiver(post_save, sender=ScheduledWorkout)
+def schedule_reminder_changed(sender, instance, raw=False, **kwargs):
+    # Удаление не отслеживается: диспетчер перечитывает запись перед отправкой
+    if raw:
+        return
+    notifications.record_change(scheduled_id=instance.pk)
+
+
+@receiver(post_save, sender=ScheduleRule)
+def rule_reminders_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    notifications.record_change(rule_id=instance.pk)
+
+
+# ============================================================
+# Правила повторения
+# ============================================================
+
+@receiver(pre_save, sender=ScheduleRule)
+def rule_bounds(sender, instance, raw=False, **kwargs):
+    # Последнее повторение — для выборки правил периода одним условием
+    instance.last_date = recurrence.last_date(recurrence.pattern(instance))
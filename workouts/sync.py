@@ -0,0 +1,250 @@
+"""
+Дельта-синхронизация для мобильных клиентов.
+
+У каждого пользователя свой счётчик изменений (ChangeCounter). Запись
+тренировки, подхода, запланированной тренировки или своего упражнения
+получает следующий номер (seq), удаление оставляет Tombstone с номером.
+Клиент хранит курсор — последний полученный номер — и запрашивает
+только то, что изменилось после него (GET /api/sync/?since=).
+
+Номер выдаёт UPDATE ... RETURNING по строке счётчика в транзакции
+записи: строка заблокирована до коммита, поэтому записи одного
+пользователя коммитятся в порядке номеров, и курсор, прочитанный
+из счётчика, не обгоняет незакоммиченные записи. Пишущие запросы
+API выполняются в транзакции (AtomicWritesMixin в views.py).
+
+Подход меняет и представление тренировки (total_sets, total_volume),
+поэтому тренировка получает тот же номер, а в ответ попадают все
+подходы изменившихся тренировок — индекс по подходам не нужен.
+Правила повторения (ScheduleRule) синхронизируются как есть: клиент
+разворачивает повторения сам (см. recurrence.py). Общий справочник
+упражнений синхронизируется списком /api/exercises/ с ETag.
+
+Надгробия хранятся SYNC_TOMBSTONE_RETENTION_DAYS дней. Счётчик
+запоминает последний удалённый номер (pruned_seq): курсору меньше него
+уже не отдать все удаления, и клиент получает ResyncRequired — полную
+загрузку, как при первом запуске.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import readers
+from .models import (
+    ChangeCounter,
+    Exercise,
+    ScheduledWorkout,
+    ScheduleRule,
+    Tombstone,
+    Workout,
+    WorkoutSet,
+)
+
+# Тип Tombstone → ключ ответа
+KINDS = {
+    'workout': 'workouts',
+    'set': 'sets',
+    'schedule': 'schedule',
+    'exercise': 'exercises',
+    'rule': 'rules',
+}
+
+
+class ResyncRequired(Exception):
+    """Надгробия после курсора удалены: нужна полная синхронизация."""
+
+
+def next_seq(user_id):
+    """Следующий номер изменения пользователя (блокирует счётчик до коммита)."""
+    meta = ChangeCounter._meta
+    quote = connection.ops.quote_name
+    seq = quote(meta.get_field('seq').column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {quote(meta.db_table)} SET {seq} = {seq} + 1 '
+            f'WHERE {quote(meta.pk.column)} = %s RETURNING {seq}',
+            [user_id],
+        )
+        row = cursor.fetchone()
+    if row is not None:
+        return row[0]
+
+    try:
+        with transaction.atomic():
+            ChangeCounter.objects.create(user_id=user_id, seq=1)
+        return 1
+    except IntegrityError:
+        # Счётчик создал параллельный запрос
+        return next_seq(user_id)
+
+
+def _counter(user_id):
+    """(последний выданный номер, последний удалённый номер надгробия)."""
+    return (
+        ChangeCounter.objects
+        .filter(user_id=user_id)
+        .values_list('seq', 'pruned_seq')
+        .first()
+    ) or (0, 0)
+
+
+def current(user_id):
+    """Последний выданный номер (0 — изменений не было)."""
+    return _counter(user_id)[0]
+
+
+def touch_workouts(workout_ids, seq):
+    """Отметить тренировки изменёнными (изменились их подходы)."""
+    Workout.objects.filter(pk__in=workout_ids).update(seq=seq)
+
+
+def bury(user_id, seq, items):
+    """Tombstone для удалённых записей: items — пары (тип, id)."""
+    tombstones = [
+        Tombstone(user_id=user_id, kind=kind, object_id=pk, seq=seq)
+        for kind, pk in items
+    ]
+    if tombstones:
+        Tombstone.objects.bulk_create(tombstones)
+        # Один запрос очистки на SYNC_TOMBSTONE_PRUNE_EVERY надгробий
+        if any(
+            t.pk is not None and t.pk % settings.SYNC_TOMBSTONE_PRUNE_EVERY == 0
+            for t in tombstones
+        ):
+            prune_tombstones()
+
+
+def prune_tombstones():
+    """Удалить надгробия старше SYNC_TOMBSTONE_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    old = Tombstone.objects.filter(deleted_at__lt=cutoff)
+    with transaction.atomic():
+        for user_id, seq in (
+            old.values('user_id').annotate(seq=Max('seq'))
+            .values_list('user_id', 'seq').order_by()
+        ):
+            ChangeCounter.objects.filter(
+                user_id=user_id, pruned_seq__lt=seq,
+            ).update(pruned_seq=seq)
+        return old.delete()[0]
+
+
+def exercise_removed(exercise):
+    """
+    Перед удалением упражнения: его подходы пропадут каскадом, а из
+    расписания и правил — связь. Затронутые пользователи получают по номеру.
+    """
+    sets = defaultdict(list)
+    workouts = defaultdict(set)
+    for pk, workout_id, user_id in (
+        WorkoutSet.objects
+        .filter(exercise=exercise)
+        .values_list('id', 'workout_id', 'workout__user_id')
+    ):
+        sets[user_id].append(pk)
+        workouts[user_id].add(workout_id)
+    schedule = defaultdict(list)
+    for pk, user_id in (
+        ScheduledWorkout.objects.filter(exercises=exercise).values_list('id', 'user_id')
+    ):
+        schedule[user_id].append(pk)
+    rules = defaultdict(list)
+    for pk, user_id in (
+        ScheduleRule.objects.filter(exercises=exercise).values_list('id', 'user_id')
+    ):
+        rules[user_id].append(pk)
+
+    users = set(sets) | set(schedule) | set(rules)
+    if exercise.user_id is not None:
+        users.add(exercise.user_id)
+    for user_id in users:
+        seq = next_seq(user_id)
+        buried = [('set', pk) for pk in sets[user_id]]
+        if user_id == exercise.user_id:
+            buried.append(('exercise', exercise.pk))
+        bury(user_id, seq, buried)
+        if workouts[user_id]:
+            touch_workouts(workouts[user_id], seq)
+        if schedule[user_id]:
+            ScheduledWorkout.objects.filter(pk__in=schedule[user_id]).update(seq=seq)
+        if rules[user_id]:
+            ScheduleRule.objects.filter(pk__in=rules[user_id]).update(seq=seq)
+
+
+def _rows(reader, queryset, since, upper, limit=None):
+    columns = reader.mapper.columns if reader else ('kind', 'object_id')
+    rows = (
+        queryset
+        .filter(seq__gt=since, seq__lte=upper)
+        .order_by('seq')
+        .values(*columns, 'seq')
+    )
+    return list(rows[:limit + 1] if limit is not None else rows)
+
+
+def changes(user, since, limit=None):
+    """
+    Изменения после номера since: не больше limit записей каждого типа,
+    страница не делит записи одного номера. has_more — есть следующая
+    страница (запросить с since=cursor). ResyncRequired — надгробия
+    после since уже удалены.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    upper, pruned = _counter(user.pk)
+    if since < pruned:
+        raise ResyncRequired
+    result = {
+        'cursor': max(since, upper),
+        'has_more': False,
+        **{key: [] for key in KINDS.values()},
+        'deleted': {key: [] for key in KINDS.values()},
+    }
+    if since >= upper:
+        return result
+
+    sources = {
+        'workouts': (readers.workouts, Workout.objects.filter(user=user)),
+        'schedule': (readers.scheduled, ScheduledWorkout.objects.filter(user=user)),
+        'exercises': (readers.exercises, Exercise.objects.filter(user=user)),
+        'rules': (readers.rules, ScheduleRule.objects.filter(user=user)),
+        'deleted': (None, Tombstone.objects.filter(user=user)),
+    }
+    pages = {
+        name: _rows(reader, queryset, since, upper, limit)
+        for name, (reader, queryset) in sources.items()
+    }
+
+    # Граница страницы — номер, до которого все типы прочитаны полностью
+    truncated = {name for name, rows in pages.items() if len(rows) > limit}
+    bound = upper
+    for name in truncated:
+        rows = pages[name]
+        last = rows[limit]['seq']
+        # Если вся страница — один номер, он читается целиком
+        bound = min(bound, last - 1 if rows[0]['seq'] < last else last)
+    if truncated:
+        result['cursor'] = bound
+        result['has_more'] = bound < upper
+        for name, rows in pages.items():
+            if len(rows) > limit and rows[limit]['seq'] <= bound:
+                reader, queryset = sources[name]
+                pages[name] = _rows(reader, queryset, since, bound)
+            else:
+                pages[name] = [row for row in rows if row['seq'] <= bound]
+
+    for name in ('workouts', 'schedule', 'exercises', 'rules'):
+        result[name] = sources[name][0].build(pages[name])
+    if result['workouts']:
+        result['sets'] = readers.sets.read(
+            WorkoutSet.objects
+            .filter(workout_id__in=[row['id'] for row in result['workouts']])
+            .order_by('workout_id', 'created_at')
+        )
+    for row in pages['deleted']:
+        result['deleted'][KINDS[row['kind']]].append(row['object_id'])
+    return result
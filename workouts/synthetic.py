@@ -0,0 +1,175 @@
+"""
+Синтетические данные для нагрузочных замеров.
+
+Пользователи, многолетняя история тренировок с подходами по упражнениям
+общего справочника, расписание вокруг текущей даты и программа —
+правило повторения на per_week дней в неделю. Всё пишется
+пачками (bulk_create, подходы — insert_sets), сигналы не отправляются:
+агрегаты пересобираются один раз в конце. Генерация детерминирована
+при одинаковом seed.
+"""
+
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import records, recurrence, rollups
+from .importers import insert_sets
+from .models import Exercise, ScheduledWorkout, ScheduleRule, Workout
+
+# Подходов в одной вставке
+BATCH_SIZE = 5000
+
+
+class SyntheticData:
+    """
+    users пользователей × years лет истории, per_week тренировок в неделю,
+    в каждой exercises упражнений по sets подходов.
+    """
+
+    def __init__(
+        self, users=10, years=1, per_week=3, exercises=5, sets=3,
+        schedule_days=30, prefix='bench', password='bench', seed=0,
+    ):
+        self.users = users
+        self.years = years
+        self.per_week = per_week
+        self.exercises = exercises
+        self.sets = sets
+        self.schedule_days = schedule_days
+        self.prefix = prefix
+        self.password = password
+        self.random = random.Random(seed)
+        self.stats = {'users': 0, 'workouts': 0, 'sets': 0, 'scheduled': 0, 'rules': 0}
+
+    def _create_users(self):
+        existing = User.objects.filter(username__startswith=self.prefix).count()
+        # Хеш пароля дорогой — считаем его один раз на всех
+        password = make_password(self.password)
+        users = User.objects.bulk_create(
+            User(username=f'{self.prefix}{existing + i}', password=password)
+            for i in range(self.users)
+        )
+        self.stats['users'] = len(users)
+        return users
+
+    def _training_days(self):
+        today = timezone.localdate()
+        day = today - timedelta(days=365 * self.years)
+        while day < today:
+            for offset in sorted(self.random.sample(range(7), min(self.per_week, 7))):
+                if day + timedelta(days=offset) < today:
+                    yield day + timedelta(days=offset)
+            day += timedelta(days=7)
+
+    def _start(self, day):
+        return timezone.make_aware(
+            datetime.combine(day, time(self.random.randint(7, 21), self.random.choice((0, 30)))),
+        )
+
+    def _create_workouts(self, user):
+        starts = [self._start(day) for day in self._training_days()]
+        workouts = Workout.objects.bulk_create(
+            Workout(user=user, status='FINISHED') for _ in starts
+        )
+        # start_time — auto_now_add: bulk_create проставил текущее время
+        for workout, start in zip(workouts, starts):
+            workout.start_time = start
+            workout.end_time = start + timedelta(minutes=self.random.randint(40, 90))
+        Workout.objects.bulk_update(workouts, ['start_time', 'end_time'], batch_size=1000)
+        self.stats['workouts'] += len(workouts)
+        return workouts
+
+    def _set_rows(self, workouts, catalog):
+        """Подходы с медленным ростом рабочих весов по неделям."""
+        base = {exercise: self.random.uniform(20, 100) for exercise in catalog}
+        first = workouts[0].start_time if workouts else None
+        for workout in workouts:
+            weeks = (workout.start_time - first).days / 7
+            created_at = workout.start_time
+            for exercise in self.random.sample(catalog, min(self.exercises, len(catalog))):
+                weight = base[exercise] * (1 + 0.005 * weeks)
+                for _ in range(self.sets):
+                    created_at += timedelta(minutes=2)
+                    yield (
+                        workout.pk,
+                        exercise,
+                        round(weight * self.random.uniform(0.9, 1.05) / 2.5) * 2.5,
+                        self.random.randint(5, 12),
+                        self.random.choice((None, 0, 1, 2, 3)),
+                        created_at,
+                    )
+
+    def _insert_sets(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                insert_sets(batch)
+                self.stats['sets'] += len(batch)
+                batch = []
+        if batch:
+            insert_sets(batch)
+            self.stats['sets'] += len(batch)
+
+    def _create_schedule(self, user, catalog):
+        today = timezone.localdate()
+        items = []
+        for offset in range(-7, self.schedule_days):
+            if self.random.random() < self.per_week / 7:
+                items.append(ScheduledWorkout(
+                    user=user,
+                    date=today + timedelta(days=offset),
+                    time=time(self.random.randint(7, 21)),
+                    title='План',
+                    is_completed=offset < 0,
+                ))
+        items = ScheduledWorkout.objects.bulk_create(items)
+
+        through = ScheduledWorkout.exercises.through
+        through.objects.bulk_create(
+            through(scheduledworkout_id=item.pk, exercise_id=exercise)
+            for item in items
+            for exercise in self.random.sample(catalog, min(self.exercises, len(catalog)))
+        )
+        self.stats['scheduled'] += len(items)
+
+    def _create_rule(self, user, catalog):
+        rule = ScheduleRule(
+            user=user,
+            title='Программа',
+            time=time(self.random.randint(7, 21)),
+            weekdays=sorted(self.random.sample(range(7), min(self.per_week, 7))),
+            start_date=timezone.localdate() - timedelta(days=self.random.randint(0, 60)),
+        )
+        # bulk_create и save без сигналов: last_date считается здесь
+        rule.last_date = recurrence.last_date(recurrence.pattern(rule))
+        ScheduleRule.objects.bulk_create([rule])
+        rule.exercises.set(self.random.sample(catalog, min(self.exercises, len(catalog))))
+        self.stats['rules'] += 1
+
+    def run(self):
+        catalog = list(
+            Exercise.objects.filter(user__isnull=True)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        if not catalog:
+            raise ValueError('Справочник упражнений пуст: выполните migrate')
+
+        with transaction.atomic():
+            users = self._create_users()
+            for user in users:
+                workouts = self._create_workouts(user)
+                self._insert_sets(self._set_rows(workouts, catalog))
+                self._create_schedule(user, catalog)
+                self._create_rule(user, catalog)
+
+            user_ids = [user.pk for user in users]
+            rollups.rebuild_daily_volume(user_ids)
+            rollups.rebuild_workout_totals(user_ids)
+            records.rebuild_personal_records(user_ids)
+        return users
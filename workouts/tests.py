@@ -1,8 +1,63 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import re
+import threading
+from base64 import b64encode
+from importlib import import_module
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from urllib.parse import urlencode, urlsplit
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, F, Max, Sum
+from django.http import HttpResponse
+from django.test import (
+    AsyncRequestFactory,
+    RequestFactory,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-
-from .models import Exercise, ScheduledWorkout, Workout, WorkoutSet
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    async_views, catalog, export, metrics, notifications, partitions, readers, records,
+    recurrence, rollups, sync,
+)
+from . import benchmark as bench
+from .middleware import NPlusOneError, NPlusOneMiddleware, TimingMiddleware, query_shape
+from .models import (
+    ArchivedSets,
+    DailyVolume,
+    Exercise,
+    Notification,
+    PersonalRecord,
+    ReminderChange,
+    ScheduledWorkout,
+    ScheduleRule,
+    Tombstone,
+    Workout,
+    WorkoutSet,
+)
+from .serializers import (
+    ScheduledWorkoutSerializer,
+    WorkoutListSerializer,
+    WorkoutSetSerializer,
+)
+from .views import ExportView, ImportView, build_calendar_summary
 
 
 class ExerciseAPITest(APITestCase):
@@ -20,7 +75,7 @@ class ExerciseAPITest(APITestCase):
         response = self.client.get('/api/exercises/')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        names = [e['name'] for e in response.data]
+        names = [e['name'] for e in response.data['results']]
         self.assertIn('Жим лежа', names)
 
     def test_create_custom_exercise(self):
@@ -45,9 +100,9 @@ class ExerciseAPITest(APITestCase):
 
         other = User.objects.create_user('other', password='test123')
         self.client.force_authenticate(other)
-        response = self.client.get('/api/exercises/')
+        response = self.client.get('/api/exercises/?page_size=200')
 
-        names = [e['name'] for e in response.data]
+        names = [e['name'] for e in response.data['results']]
         self.assertNotIn('Секретное', names)
         self.assertIn('Жим лежа', names)  # общее — видно всем
 
@@ -85,8 +140,8 @@ class WorkoutAPITest(APITestCase):
 
         response = self.client.get('/api/workouts/')
 
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['note'], 'Моя')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['note'], 'Моя')
 
     def test_workout_detail_has_exercises(self):
         """Детали тренировки содержат подходы, сгруппированные по упражнениям."""
@@ -259,6 +314,20 @@ class AnalyticsAPITest(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_invalid_days(self):
+        """Нечисловой или вне диапазона ?days=, нечисловой exercise_id → 400."""
+        max_weight = f'/api/analytics/max/?exercise_id={self.exercise.pk}'
+        for path in (
+            '/api/analytics/volume/?days=abc',
+            '/api/analytics/volume/?days=-1',
+            f'{max_weight}&days=abc',
+            f'{max_weight}&days=10000000',
+            '/api/analytics/max/?exercise_id=abc',
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_personal_records(self):
         """Личные рекорды по упражнениям."""
         response = self.client.get('/api/analytics/records/')
@@ -269,10 +338,244 @@ class AnalyticsAPITest(APITestCase):
         self.assertEqual(response.data[0]['max_weight'], 100.0)
 
 
+class MuscleAnalyticsTest(APITestCase):
+    """Тесты тоннажа по группам мышц."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        squat = Exercise.objects.create(name='Присед', muscle_group='QUADS')
+        for days_ago, sets in ((0, [(bench, 100, 5), (bench, 80, 10), (squat, 120, 5)]),
+                               (1, [(squat, 100, 8)])):
+            workout = Workout.objects.create(user=self.user)
+            Workout.objects.filter(pk=workout.pk).update(
+                start_time=timezone.now() - timezone.timedelta(days=days_ago),
+            )
+            for exercise, weight, reps in sets:
+                WorkoutSet.objects.create(
+                    workout=workout, exercise=exercise, weight=weight, reps=reps,
+                )
+        other = User.objects.create_user('other', password='test123')
+        WorkoutSet.objects.create(
+            workout=Workout.objects.create(user=other), exercise=bench, weight=200, reps=1,
+        )
+
+    def test_by_day(self):
+        response = self.client.get('/api/analytics/muscles/?bucket=day&days=7')
+
+        today = timezone.localdate()
+        self.assertEqual(response.data, [
+            {'date': today - timezone.timedelta(days=1), 'muscle_group': 'QUADS',
+             'sets': 1, 'reps': 8, 'volume': 800.0},
+            {'date': today, 'muscle_group': 'CHEST', 'sets': 2, 'reps': 15, 'volume': 1300.0},
+            {'date': today, 'muscle_group': 'QUADS', 'sets': 1, 'reps': 5, 'volume': 600.0},
+        ])
+
+    def test_by_week(self):
+        response = self.client.get('/api/analytics/muscles/?days=7')
+
+        self.assertTrue(all(row['date'].weekday() == 0 for row in response.data))
+        quads = [row for row in response.data if row['muscle_group'] == 'QUADS']
+        self.assertEqual(sum(row['sets'] for row in quads), 2)
+        self.assertEqual(sum(row['volume'] for row in quads), 1400.0)
+
+    def test_invalid_bucket(self):
+        response = self.client.get('/api/analytics/muscles/?bucket=month')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_days(self):
+        for days in ('abc', '-1', '10000000'):
+            with self.subTest(days=days):
+                response = self.client.get(f'/api/analytics/muscles/?days={days}')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_per_bucket(self):
+        self.client.get('/api/analytics/muscles/?bucket=day')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/analytics/muscles/?bucket=day')
+            self.client.get('/api/analytics/muscles/?bucket=week')
+        self.assertEqual(len(ctx), 1)
+
+
+class LoadAnalyticsTest(APITestCase):
+    """Тесты аналитики нагрузки (load.py)."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        self.squat = Exercise.objects.create(name='Присед', muscle_group='QUADS')
+
+    def workout(self, days_ago, *sets):
+        workout = Workout.objects.create(user=self.user)
+        Workout.objects.filter(pk=workout.pk).update(
+            start_time=timezone.now() - timezone.timedelta(days=days_ago),
+        )
+        for exercise, weight, reps, rir in sets:
+            WorkoutSet.objects.create(
+                workout=workout, exercise=exercise, weight=weight, reps=reps, rir=rir,
+            )
+
+    def test_e1rm_with_rir(self):
+        self.workout(0, (self.bench, 100, 5, 2), (self.bench, 90, 8, None))
+
+        epley = self.client.get('/api/analytics/load/').data['e1rm']
+        brzycki = self.client.get('/api/analytics/load/?formula=brzycki').data['e1rm']
+
+        # 100 × (1 + 7/30) против 90 × (1 + 8/30); 100 × 36 / (37 − 7)
+        self.assertEqual(epley[0]['points'], [
+            {'date': timezone.localdate(), 'e1rm': 123.3},
+        ])
+        self.assertEqual(brzycki[0]['points'][0]['e1rm'], 120.0)
+
+    def test_acute_chronic_workload(self):
+        self.workout(0, (self.bench, 100, 7, None))
+        self.workout(10, (self.squat, 100, 14, None))
+
+        load = self.client.get('/api/analytics/load/?days=30').data['load']
+
+        self.assertEqual(len(load), 31)
+        self.assertEqual(load[-1], {
+            'date': timezone.localdate(),
+            'acute': 100.0,  # 700 / 7
+            'chronic': 75.0,  # (700 + 1400) / 28
+            'ratio': 1.33,
+        })
+        self.assertIsNone(load[0]['ratio'])
+
+    def test_weekly_muscle_volume(self):
+        self.workout(0, (self.bench, 100, 5, None), (self.squat, 120, 5, 1))
+        self.workout(0, (self.bench, 100, 5, None))
+
+        muscles = self.client.get('/api/analytics/load/?days=0').data['muscles']
+
+        week = timezone.localdate() - timezone.timedelta(days=timezone.localdate().weekday())
+        self.assertEqual(muscles, [
+            {'week': week, 'muscle_group': 'CHEST', 'sets': 2, 'volume': 1000.0},
+            {'week': week, 'muscle_group': 'QUADS', 'sets': 1, 'volume': 600.0},
+        ])
+
+    def test_matches_per_set_calculation(self):
+        for day in range(0, 60, 3):
+            self.workout(
+                day, (self.bench, 60 + day, 3 + day % 7, day % 4 or None),
+                (self.squat, 100 - day / 2, 12, None),
+            )
+
+        data = self.client.get(f'/api/analytics/load/?days=30&exercise_id={self.bench.pk}').data
+
+        since = timezone.localdate() - timezone.timedelta(days=30)
+        best = {}
+        for s in WorkoutSet.objects.filter(exercise=self.bench).select_related('workout'):
+            day = timezone.localdate(s.workout.start_time)
+            if day >= since:
+                value = s.weight * (1 + (s.reps + (s.rir or 0)) / 30)
+                best[day] = max(best.get(day, 0), value)
+        self.assertEqual(
+            [(p['date'], p['e1rm']) for p in data['e1rm'][0]['points']],
+            [(day, round(value, 1)) for day, value in sorted(best.items())],
+        )
+
+    def test_invalid_formula(self):
+        response = self.client.get('/api/analytics/load/?formula=lander')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_days_and_exercise(self):
+        for query in ('days=abc', 'days=-1', 'days=10000000', 'exercise_id=abc'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/analytics/load/?{query}')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cached_until_write(self):
+        self.workout(0, (self.bench, 100, 5, None))
+        self.client.get('/api/analytics/load/')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/api/analytics/load/')
+        self.assertEqual(len(ctx), 0)
+
+        self.workout(0, (self.bench, 110, 5, None))
+        e1rm = self.client.get('/api/analytics/load/').data['e1rm']
+        self.assertEqual(e1rm[0]['points'][0]['e1rm'], 128.3)
+
+
+class HeatmapTest(APITestCase):
+    """Тесты тепловой карты активности за год."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        # 1 января в 01:00 по Москве (в UTC — ещё 31 декабря) и 31 декабря
+        self.first = self.workout(2024, 1, 1, 1, [(80, 10), (100, 5)])
+        self.workout(2024, 12, 31, 18, [(60, 12)])
+        self.workout(2025, 3, 1, 18, [(50, 10)])
+
+    def workout(self, year, month, day, hour, sets):
+        workout = Workout.objects.create(user=self.user)
+        Workout.objects.filter(pk=workout.pk).update(
+            start_time=timezone.make_aware(timezone.datetime(year, month, day, hour)),
+        )
+        workout.refresh_from_db()
+        for weight, reps in sets:
+            WorkoutSet.objects.create(
+                workout=workout, exercise=self.exercise, weight=weight, reps=reps,
+            )
+        return workout
+
+    def test_sets_by_day(self):
+        response = self.client.get('/api/analytics/heatmap/?year=2024')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual((data['year'], data['metric'], data['start']), (2024, 'sets', '2024-01-01'))
+        self.assertEqual(len(data['values']), 366)
+        self.assertEqual((data['values'][0], data['values'][-1], data['max']), (2, 1, 2))
+        self.assertEqual(sum(data['values']), 3)
+
+    def test_volume(self):
+        data = self.client.get('/api/analytics/heatmap/?year=2025&metric=volume').data
+        self.assertEqual(len(data['values']), 365)
+        self.assertEqual(data['values'][31 + 28], 500)
+
+    def test_invalid_params(self):
+        for query in ('year=abc', 'year=0', 'metric=reps'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/analytics/heatmap/?{query}')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalidated_only_by_its_year(self):
+        self.client.get('/api/analytics/heatmap/?year=2024')
+        self.client.get('/api/analytics/heatmap/?year=2025')
+
+        self.client.post('/api/sets/', {
+            'workout': self.first.pk, 'exercise': self.exercise.pk, 'weight': 90, 'reps': 8,
+        })
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/analytics/heatmap/?year=2024')
+            self.client.get('/api/analytics/heatmap/?year=2025')
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(response.data['values'][0], 3)
+
+    def test_rebuild_invalidates(self):
+        self.client.get('/api/analytics/heatmap/?year=2024')
+        DailyVolume.objects.filter(user=self.user).delete()
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/analytics/heatmap/?year=2024')
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(response.data['values'][0], 2)
+
+
 class CalendarAPITest(APITestCase):
     """Тесты календаря."""
 
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user('athlete', password='test123')
         self.client.force_authenticate(self.user)
 
@@ -294,3 +597,2753 @@ class CalendarAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         today_data = [d for d in response.data if d['has_workout']]
         self.assertGreaterEqual(len(today_data), 1)
+
+
+class CalendarSummaryTest(APITestCase):
+    """Тесты итогов календаря (?view=summary)."""
+
+    URL = '/api/calendar/?start=2026-02-01&end=2026-02-28&view=summary'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        exercise = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        # Две тренировки 10 февраля (одна без подходов) и одна в час ночи
+        # 11-го по Москве — в UTC это ещё 10-е
+        for day, hour, sets in ((10, 9, [(80, 10), (100, 5)]), (10, 18, []), (11, 1, [(60, 12)])):
+            workout = Workout.objects.create(user=self.user)
+            Workout.objects.filter(pk=workout.pk).update(
+                start_time=timezone.make_aware(timezone.datetime(2026, 2, day, hour)),
+            )
+            for weight, reps in sets:
+                WorkoutSet.objects.create(
+                    workout=workout, exercise=exercise, weight=weight, reps=reps,
+                )
+        ScheduledWorkout.objects.create(user=self.user, date='2026-02-12', title='Грудь')
+        ScheduledWorkout.objects.create(
+            user=self.user, date='2026-02-12', title='Спина', is_completed=True,
+        )
+        # Понедельники с 16 февраля; 23-е пропущено
+        ScheduleRule.objects.create(
+            user=self.user, title='Ноги', weekdays=[0],
+            start_date='2026-02-16', exceptions=['2026-02-23'],
+        )
+
+    def day(self, response, day):
+        return response.data[day - 1]
+
+    def test_totals(self):
+        response = self.client.get(self.URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 28)
+        self.assertEqual(self.day(response, 10), {
+            'date': '2026-02-10', 'workouts': 2, 'sets': 2, 'volume': 1300.0,
+            'scheduled': 0, 'completed': 0,
+        })
+        self.assertEqual(self.day(response, 11)['volume'], 720.0)
+        self.assertEqual(
+            (self.day(response, 12)['scheduled'], self.day(response, 12)['completed']), (2, 1),
+        )
+        self.assertEqual(
+            [self.day(response, day)['scheduled'] for day in (16, 23)], [1, 0],
+        )
+        self.assertEqual(self.day(response, 1), {
+            'date': '2026-02-01', 'workouts': 0, 'sets': 0, 'volume': 0.0,
+            'scheduled': 0, 'completed': 0,
+        })
+
+    def test_matches_full_calendar(self):
+        summary = self.client.get(self.URL).data
+        full = self.client.get(self.URL.replace('&view=summary', '')).data
+
+        for short, day in zip(summary, full):
+            with self.subTest(date=day['date']):
+                self.assertEqual(short['workouts'], len(day['completed_workouts']))
+                self.assertEqual(
+                    short['sets'], sum(w['total_sets'] for w in day['completed_workouts']),
+                )
+                self.assertEqual(short['scheduled'], len(day['scheduled']))
+
+    def test_one_query_per_source(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.URL)
+        self.assertEqual(len(ctx), 3)
+
+    def test_write_invalidates(self):
+        self.client.get(self.URL)
+        self.client.post('/api/schedule/', {'date': '2026-02-01', 'title': 'Кардио'})
+
+        response = self.client.get(self.URL)
+        self.assertEqual(self.day(response, 1)['scheduled'], 1)
+
+    def test_unknown_view(self):
+        response = self.client.get('/api/calendar/?view=week')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CalendarCacheTest(APITestCase):
+    """Тесты кеша календаря."""
+
+    URL = '/api/calendar/?start=2026-02-01&end=2026-02-28'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        self.workout = Workout.objects.create(user=self.user)
+        Workout.objects.filter(pk=self.workout.pk).update(
+            start_time=timezone.make_aware(timezone.datetime(2026, 2, 10, 18)),
+        )
+        self.scheduled = ScheduledWorkout.objects.create(
+            user=self.user, date='2026-02-12', title='Грудь',
+        )
+        self.scheduled.exercises.add(self.exercise)
+
+    def day(self, response, day):
+        return response.data[day - 1]
+
+    def test_repeated_request_is_served_from_cache(self):
+        first = self.client.get(self.URL)
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(self.URL)
+
+        self.assertEqual(len(ctx), 0)
+        self.assertEqual(first.data, second.data)
+
+    def test_set_write_invalidates(self):
+        """Новый подход сразу виден в календаре."""
+        self.client.get(self.URL)
+        self.client.post('/api/sets/', {
+            'workout': self.workout.pk, 'exercise': self.exercise.pk,
+            'weight': 80, 'reps': 10,
+        })
+
+        response = self.client.get(self.URL)
+        workout = self.day(response, 10)['completed_workouts'][0]
+        self.assertEqual(workout['total_sets'], 1)
+        self.assertEqual(workout['total_volume'], 800)
+
+    def test_schedule_write_invalidates(self):
+        self.client.get(self.URL)
+        self.client.post(f'/api/schedule/{self.scheduled.pk}/complete/')
+
+        response = self.client.get(self.URL)
+        self.assertTrue(self.day(response, 12)['scheduled'][0]['is_completed'])
+
+    def test_global_exercise_rename_invalidates(self):
+        self.client.get(self.URL)
+        self.exercise.name = 'Жим штанги лежа'
+        self.exercise.save()
+
+        response = self.client.get(self.URL)
+        names = [e['name'] for e in self.day(response, 12)['scheduled'][0]['exercises']]
+        self.assertEqual(names, ['Жим штанги лежа'])
+
+    def test_other_user_write_keeps_cache(self):
+        """Запись другого пользователя не сбрасывает мой кеш."""
+        self.client.get(self.URL)
+        other = User.objects.create_user('other', password='test123')
+        Workout.objects.create(user=other)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.URL)
+        self.assertEqual(len(ctx), 0)
+
+
+class AsyncViewsMixin:
+    """Данные и вызов асинхронных представлений с JWT."""
+
+    def create_data(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.exercise = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        self.workout = Workout.objects.create(user=self.user)
+        for weight, reps in ((80, 10), (100, 5)):
+            WorkoutSet.objects.create(
+                workout=self.workout, exercise=self.exercise,
+                weight=weight, reps=reps,
+            )
+        scheduled = ScheduledWorkout.objects.create(
+            user=self.user, date=timezone.localdate(), title='Грудь',
+        )
+        scheduled.exercises.add(self.exercise)
+
+    async def call(self, view, path, token=None):
+        if token is None:
+            token = str(RefreshToken.for_user(self.user).access_token)
+        request = AsyncRequestFactory().get(
+            path, headers={'Authorization': f'Bearer {token}'} if token else {},
+        )
+        return await view.as_view()(request)
+
+
+@override_settings(ASYNC_PARALLEL_QUERIES=False)
+class AsyncViewsTest(AsyncViewsMixin, APITestCase):
+    """Асинхронные представления отвечают так же, как синхронные."""
+
+    def setUp(self):
+        cache.clear()
+        self.create_data()
+        self.client.force_authenticate(self.user)
+
+    def cases(self):
+        return [
+            (async_views.AsyncCalendarView, '/api/calendar/'),
+            (async_views.AsyncCalendarView, '/api/calendar/?start=2026-02-01&end=2026-02-28'),
+            (async_views.AsyncCalendarView, '/api/calendar/?view=summary'),
+            (async_views.AsyncCalendarView, '/api/calendar/?view=week'),
+            (async_views.AsyncUpcomingNotificationsView, '/api/notifications/upcoming/'),
+            (async_views.AsyncVolumeAnalyticsView, '/api/analytics/volume/?days=30'),
+            (async_views.AsyncMaxWeightAnalyticsView,
+             f'/api/analytics/max/?exercise_id={self.exercise.pk}&days=30'),
+            (async_views.AsyncMaxWeightAnalyticsView, '/api/analytics/max/'),
+            (async_views.AsyncVolumeAnalyticsView, '/api/analytics/volume/?days=abc'),
+            (async_views.AsyncMaxWeightAnalyticsView,
+             f'/api/analytics/max/?exercise_id={self.exercise.pk}&days=abc'),
+            (async_views.AsyncPersonalRecordsView, '/api/analytics/records/'),
+            (async_views.AsyncMuscleAnalyticsView, '/api/analytics/muscles/?bucket=day'),
+            (async_views.AsyncMuscleAnalyticsView, '/api/analytics/muscles/?bucket=month'),
+            (async_views.AsyncLoadAnalyticsView, '/api/analytics/load/?days=30'),
+            (async_views.AsyncLoadAnalyticsView, '/api/analytics/load/?formula=x'),
+            (async_views.AsyncHeatmapView, '/api/analytics/heatmap/?metric=volume'),
+            (async_views.AsyncHeatmapView, '/api/analytics/heatmap/?year=abc'),
+        ]
+
+    async def test_same_response_as_sync(self):
+        for view, path in self.cases():
+            with self.subTest(path=path):
+                await cache.aclear()
+                expected = await sync_to_async(self.client.get)(path)
+                response = await self.call(view, path)
+
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(json.loads(response.content), expected.json())
+
+    async def test_requires_authentication(self):
+        response = await self.call(async_views.AsyncCalendarView, '/api/calendar/', token='')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response.headers)
+
+        response = await self.call(async_views.AsyncCalendarView, '/api/calendar/', token='bad')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(response.content)['code'], 'token_not_valid')
+
+
+class AsyncParallelQueriesTest(AsyncViewsMixin, TransactionTestCase):
+    """Выборки календаря в отдельных потоках видят закоммиченные данные."""
+
+    def setUp(self):
+        cache.clear()
+        self.create_data()
+
+    @override_settings(ASYNC_PARALLEL_QUERIES=True)
+    async def test_calendar_in_parallel(self):
+        response = await self.call(async_views.AsyncCalendarView, '/api/calendar/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        today = next(
+            day for day in json.loads(response.content)
+            if day['date'] == timezone.localdate().isoformat()
+        )
+        self.assertEqual(today['completed_workouts'][0]['total_volume'], 1300)
+        self.assertEqual(today['scheduled'][0]['title'], 'Грудь')
+
+
+class DailyVolumeRollupTest(APITestCase):
+    """Тесты агрегата тоннажа по дням."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = Exercise.objects.create(
+            name='Жим лежа', muscle_group='CHEST',
+        )
+        self.workout = Workout.objects.create(user=self.user)
+        self.today = timezone.localdate(self.workout.start_time)
+
+    def rollup(self):
+        return DailyVolume.objects.get(user=self.user, date=self.today)
+
+    def test_create_set_updates_rollup(self):
+        """Новый подход добавляет тоннаж и счётчик подходов."""
+        WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.exercise, weight=80, reps=10,
+        )
+        WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.exercise, weight=100, reps=5,
+        )
+
+        self.assertEqual(self.rollup().volume, 1300.0)
+        self.assertEqual(self.rollup().sets_count, 2)
+
+    def test_update_set_applies_delta(self):
+        """Изменение подхода через API пересчитывает тоннаж."""
+        ws = WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.exercise, weight=80, reps=10,
+        )
+        response = self.client.patch(f'/api/sets/{ws.pk}/', {'weight': 90})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.rollup().volume, 900.0)
+        self.assertEqual(self.rollup().sets_count, 1)
+
+    def test_delete_set_removes_empty_day(self):
+        """Удаление последнего подхода убирает день из агрегата."""
+        ws = WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.exercise, weight=80, reps=10,
+        )
+        self.client.delete(f'/api/sets/{ws.pk}/')
+
+        self.assertFalse(DailyVolume.objects.filter(user=self.user).exists())
+
+    def test_workout_delete_cascades_to_rollup(self):
+        """Удаление тренировки вычитает все её подходы."""
+        other = Workout.objects.create(user=self.user)
+        WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.exercise, weight=80, reps=10,
+        )
+        WorkoutSet.objects.create(
+            workout=other, exercise=self.exercise, weight=50, reps=10,
+        )
+        WorkoutSet.objects.create(
+            workout=other, exercise=self.exercise, weight=60, reps=10,
+        )
+
+        self.client.delete(f'/api/workouts/{other.pk}/')
+
+        self.assertEqual(self.rollup().volume, 800.0)
+        self.assertEqual(self.rollup().sets_count, 1)
+
+    def test_rebuild_command(self):
+        """rebuild_rollups восстанавливает испорченный агрегат."""
+        WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.exercise, weight=80, reps=10,
+        )
+        DailyVolume.objects.update(volume=1, sets_count=7)
+
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        self.assertEqual(self.rollup().volume, 800.0)
+        self.assertEqual(self.rollup().sets_count, 1)
+
+
+class WorkoutTotalsTest(APITestCase):
+    """Тесты итогов тренировки, хранимых в Workout."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        self.squat = Exercise.objects.create(name='Присед', muscle_group='QUADS')
+        self.workout = Workout.objects.create(user=self.user)
+
+    def add(self, exercise, weight, reps, workout=None):
+        return WorkoutSet.objects.create(
+            workout=workout or self.workout, exercise=exercise, weight=weight, reps=reps,
+        )
+
+    def totals(self, workout=None):
+        return Workout.objects.values_list(*Workout.TOTAL_FIELDS).get(
+            pk=(workout or self.workout).pk,
+        )
+
+    def expected(self, workout=None):
+        """Итоги, посчитанные по подходам заново."""
+        sets = list(WorkoutSet.objects.filter(workout=workout or self.workout))
+        return (
+            len(sets),
+            float(sum(s.weight * s.reps for s in sets)),
+            len({s.exercise_id for s in sets}),
+            max((s.created_at for s in sets), default=None),
+        )
+
+    def test_set_writes(self):
+        first = self.add(self.bench, 80, 10)
+        last = self.add(self.bench, 100, 5)
+        self.assertEqual(self.totals(), (2, 1300.0, 1, last.created_at))
+
+        self.client.patch(f'/api/sets/{first.pk}/', {'exercise': self.squat.pk, 'reps': 8})
+        self.assertEqual(self.totals(), (2, 1140.0, 2, last.created_at))
+
+        self.client.delete(f'/api/sets/{last.pk}/')
+        self.assertEqual(self.totals(), (1, 640.0, 1, first.created_at))
+
+        self.client.delete(f'/api/sets/{first.pk}/')
+        self.assertEqual(self.totals(), (0, 0.0, 0, None))
+
+    def test_set_moved_to_other_workout(self):
+        other = Workout.objects.create(user=self.user)
+        moved = self.add(self.bench, 80, 10)
+        self.add(self.squat, 100, 5)
+
+        self.client.patch(f'/api/sets/{moved.pk}/', {'workout': other.pk})
+        self.assertEqual(self.totals(), self.expected())
+        self.assertEqual(self.totals(other), (1, 800.0, 1, moved.created_at))
+
+    def test_bulk_sets(self):
+        self.add(self.bench, 80, 10)
+        self.client.post(f'/api/workouts/{self.workout.pk}/sets/bulk/', [
+            {'exercise': self.squat.pk, 'weight': 100, 'reps': 5},
+            {'exercise': self.bench.pk, 'weight': 60, 'reps': 12},
+        ], format='json')
+        self.assertEqual(self.totals(), self.expected())
+        self.assertEqual(self.totals()[:3], (3, 2020.0, 2))
+
+    def test_exercise_deleted(self):
+        self.add(self.bench, 80, 10)
+        self.add(self.squat, 100, 5)
+        self.client.delete(f'/api/exercises/{self.squat.pk}/')
+        self.assertEqual(self.totals(), (1, 800.0, 1, self.expected()[3]))
+
+    def test_stale_workout_save_keeps_totals(self):
+        stale = Workout.objects.get(pk=self.workout.pk)
+        self.add(self.bench, 80, 10)
+        stale.note = 'Тяжело'
+        stale.save()
+        self.assertEqual(self.totals()[:2], (1, 800.0))
+
+    def test_list_does_not_read_sets(self):
+        self.add(self.bench, 80, 10)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/workouts/')
+        item = response.data['results'][0]
+        self.assertEqual(
+            (item['total_sets'], item['total_volume'], item['exercise_count']), (1, 800.0, 1),
+        )
+        self.assertFalse([q for q in ctx.captured_queries if 'workouts_workoutset' in q['sql']])
+
+    def test_rebuild_repairs(self):
+        self.add(self.bench, 80, 10)
+        self.add(self.squat, 100, 5)
+        Workout.objects.update(total_sets=0, total_volume=7, exercise_count=0, last_set_at=None)
+
+        out = StringIO()
+        call_command('rebuild_rollups', user=[self.user.pk], stdout=out)
+        self.assertIn('итоги 1 тренировок', out.getvalue())
+        self.assertEqual(self.totals(), self.expected())
+
+
+class PersonalRecordIndexTest(APITestCase):
+    """Тесты индекса личных рекордов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = Exercise.objects.create(
+            name='Присед', muscle_group='QUADS',
+        )
+        self.workout = Workout.objects.create(user=self.user)
+
+    def add_set(self, weight, reps, workout=None):
+        return WorkoutSet.objects.create(
+            workout=workout or self.workout, exercise=self.exercise,
+            weight=weight, reps=reps,
+        )
+
+    def record(self):
+        return PersonalRecord.objects.get(user=self.user, exercise=self.exercise)
+
+    def test_tracks_each_metric_separately(self):
+        """Вес, 1ПМ и тоннаж могут принадлежать разным подходам."""
+        heavy = self.add_set(130, 1)
+        volume = self.add_set(100, 12)
+
+        record = self.record()
+        self.assertEqual(record.max_weight, 130)
+        self.assertEqual(record.max_weight_set_id, heavy.pk)
+        self.assertEqual(record.best_volume, 1200)
+        self.assertEqual(record.best_volume_set_id, volume.pk)
+        self.assertEqual(record.best_e1rm_set_id, volume.pk)  # 140 > 134.3
+
+    def test_delete_holder_falls_back_to_next_best(self):
+        """Удаление рекордного подхода → рекорд переходит к следующему."""
+        self.add_set(100, 5)
+        best = self.add_set(120, 3)
+
+        self.client.delete(f'/api/sets/{best.pk}/')
+
+        self.assertEqual(self.record().max_weight, 100)
+
+    def test_fallback_reads_only_own_sets(self):
+        """Следующий лучший ищется по тренировкам пользователя, а не по упражнению."""
+        other = User.objects.create_user('other', password='test123')
+        self.add_set(200, 1, workout=Workout.objects.create(user=other))
+        self.add_set(100, 5)
+        best = self.add_set(120, 3)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.delete(f'/api/sets/{best.pk}/')
+
+        self.assertEqual(self.record().max_weight, 100)
+        if connection.vendor == 'sqlite':
+            fallback = next(
+                query['sql'] for query in ctx.captured_queries
+                if 'ORDER BY' in query['sql'] and 'LIMIT 1' in query['sql']
+                and '"workouts_workoutset"."weight"' in query['sql']
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + fallback)
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            self.assertIn('set_exercise_workout_idx (exercise_id=? AND workout_id=?)', plan)
+
+    def archive_best(self, weight, reps):
+        """Рекорд за архивным подходом: сводка ArchivedSets и пересборка."""
+        ArchivedSets.objects.create(
+            workout=Workout.objects.create(user=self.user), exercise=self.exercise,
+            sets_count=1, reps=reps, volume=weight * reps, max_weight=weight,
+            best_e1rm=weight * (1 + reps / 30), best_volume=weight * reps,
+            last_set_at=timezone.now(),
+        )
+        records.rebuild_personal_records(user_ids=[self.user.pk])
+
+    def test_delete_query_budget(self):
+        """
+        Удаление подхода ищет следующего лучшего, только если он держал
+        рекорд: рекорды архивных подходов не пересчитываются каждый раз.
+        """
+        self.archive_best(200, 5)
+        best = self.add_set(100, 5)
+        light = self.add_set(60, 5)
+
+        with self.assertNumQueries(17):
+            self.client.delete(f'/api/sets/{light.pk}/')
+        with self.assertNumQueries(17):
+            self.client.delete(f'/api/sets/{best.pk}/')
+
+        record = self.record()
+        self.assertEqual(record.max_weight, 200)
+        self.assertIsNone(record.max_weight_set_id)
+
+    def test_delete_holder_query_budget(self):
+        """Рекордсмен: два запроса поиска на каждую его метрику и запись рекорда."""
+        self.add_set(100, 5)
+        best = self.add_set(120, 3)  # вес и 1ПМ, но не тоннаж подхода
+
+        with self.assertNumQueries(17 + 2 * 2 + 1):
+            self.client.delete(f'/api/sets/{best.pk}/')
+
+        self.assertEqual(self.record().max_weight, 100)
+
+    def test_update_holder_downwards(self):
+        """Уменьшение веса рекордного подхода пересчитывает рекорд."""
+        second = self.add_set(100, 5)
+        best = self.add_set(120, 3)
+
+        self.client.patch(f'/api/sets/{best.pk}/', {'weight': 90})
+
+        self.assertEqual(self.record().max_weight, 100)
+        self.assertEqual(self.record().max_weight_set_id, second.pk)
+
+    def test_delete_workout_with_record(self):
+        """Удаление тренировки с рекордом → рекорд из других тренировок."""
+        other = Workout.objects.create(user=self.user)
+        self.add_set(100, 5)
+        self.add_set(150, 1, workout=other)
+
+        self.client.delete(f'/api/workouts/{other.pk}/')
+
+        self.assertEqual(self.record().max_weight, 100)
+
+    def test_last_set_removes_record(self):
+        """Без подходов запись о рекорде удаляется."""
+        ws = self.add_set(100, 5)
+        ws.delete()
+
+        self.assertFalse(PersonalRecord.objects.exists())
+
+    def test_endpoint_reports_workout(self):
+        """Эндпоинт отдаёт подход и тренировку рекорда одним запросом."""
+        ws = self.add_set(100, 5)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/analytics/records/')
+
+        self.assertEqual(response.data[0]['max_weight_set_id'], ws.pk)
+        self.assertEqual(response.data[0]['max_weight_workout_id'], self.workout.pk)
+        self.assertEqual(response.data[0]['best_volume'], 500.0)
+
+    def test_rebuild_matches_incremental(self):
+        """Пересборка даёт тот же результат, что и инкрементальное обновление."""
+        self.add_set(100, 5)
+        self.add_set(120, 3)
+        before = PersonalRecord.objects.values().get()
+
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        after = PersonalRecord.objects.values().get()
+        before.pop('id'), after.pop('id')
+        self.assertEqual(before, after)
+
+
+class QueryPlanTest(APITestCase):
+    """
+    Регрессия планов запросов: EXPLAIN для каждого эндпоинта.
+
+    Падает, если по «горячей» таблице снова появляется полный проход
+    (Seq Scan / SCAN), сортировка во временной структуре (Sort /
+    USE TEMP B-TREE), которые должны закрывать индексы, или если
+    в планах маршрута нет ни одного из ожидаемых для него индексов.
+    """
+
+    HOT_TABLES = {
+        'workouts_workout',
+        'workouts_workoutset',
+        'workouts_scheduledworkout',
+        'workouts_dailyvolume',
+        'workouts_personalrecord',
+    }
+
+    # Маршрут → индексы горячих таблиц, хотя бы один из которых должен
+    # быть в плане. Имена заданы в Meta.indexes и одинаковы на всех СУБД
+    EXPECTED_INDEXES = {
+        'workout-list': {'workout_user_start_id_idx'},
+        'workout-list-cursor': {'workout_user_start_id_idx'},
+        'workout-detail': {'set_workout_created_idx'},
+        'workoutset-list': {'set_workout_created_idx'},
+        'schedule-list': {'schedule_user_date_id_idx'},
+        'calendar': {'workout_user_start_id_idx', 'schedule_user_date_id_idx'},
+        'calendar-summary': {'workout_user_start_id_idx', 'schedule_user_date_id_idx'},
+        'notifications-upcoming': {'schedule_user_date_id_idx', 'schedule_upcoming_idx'},
+        'analytics-max': {'set_exercise_workout_idx', 'workout_user_start_id_idx'},
+        'analytics-muscles': {'workout_user_start_id_idx', 'set_workout_created_idx'},
+        'analytics-load': {'workout_user_start_id_idx', 'set_workout_created_idx'},
+        'export': {'workout_user_start_id_idx', 'set_workout_created_idx'},
+    }
+
+    # Маршрут → почему сортировку не закрыть индексом
+    ALLOWED_SORTS = {
+        # Фильтр — владелец тренировки (join), порядок — created_at подхода:
+        # нужный ключ (user, created_at) есть только у денормализованной копии
+        'workoutset-list': 'подходы всех тренировок по created_at (join через тренировку)',
+        # Ключ группировки — локальная дата (TIME_ZONE) от start_time:
+        # индекс упорядочен по моменту в UTC, а не по выражению
+        'analytics-max': 'GROUP BY по локальной дате — выражению над start_time',
+        # К локальной дате/неделе добавляется группа мышц из справочника (join)
+        'analytics-muscles': 'GROUP BY по локальной дате/неделе и группе мышц',
+        # Как analytics-max: группировка тренировок по локальной дате
+        'calendar-summary': 'GROUP BY по локальной дате — выражению над start_time',
+        # Тренировки идут по индексу, сортируются только подходы внутри
+        # одной тренировки — дешёвая досортировка хвоста ключа
+        'export': 'досортировка подходов внутри одной тренировки (RIGHT PART OF ORDER BY)',
+    }
+
+    PLAN_MARKERS = {
+        'sqlite': {
+            'explain': 'EXPLAIN QUERY PLAN ',
+            'scan': re.compile(r'\bSCAN (\w+)'),
+            'sort': re.compile(r'USE TEMP B-TREE'),
+            'index': re.compile(r'USING (?:COVERING )?INDEX (\w+)'),
+        },
+        'postgresql': {
+            'explain': 'EXPLAIN ',
+            'scan': re.compile(r'Seq Scan on (\w+)'),
+            'sort': re.compile(r'\bSort\b'),
+            'index': re.compile(r'(?:Scan(?: Backward)? using|Bitmap Index Scan on) (\w+)'),
+        },
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('athlete', password='test123')
+        other = User.objects.create_user('other', password='test123')
+        exercises = list(Exercise.objects.filter(user__isnull=True)[:8])
+
+        for owner in (cls.user, other):
+            for i in range(40):
+                workout = Workout.objects.create(user=owner)
+                WorkoutSet.objects.bulk_create(
+                    WorkoutSet(
+                        workout=workout, exercise=exercise,
+                        weight=40 + i, reps=8,
+                    )
+                    for exercise in exercises[i % 4:i % 4 + 4]
+                )
+                ScheduledWorkout.objects.create(
+                    user=owner, date=f'2026-02-{i % 28 + 1:02d}', title='План',
+                )
+        if connection.vendor == 'postgresql':
+            cls.add_bulk_history()
+        call_command('rebuild_rollups', stdout=StringIO())
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        cls.workout = Workout.objects.filter(user=cls.user).first()
+        cls.set = WorkoutSet.objects.filter(workout=cls.workout).first()
+        cls.scheduled = ScheduledWorkout.objects.filter(user=cls.user).first()
+        cls.exercise = exercises[0]
+
+    @classmethod
+    def add_bulk_history(cls):
+        """
+        История других пользователей: на крошечных таблицах Postgres
+        честно выбирает Seq Scan, а с долей пользователя в пару
+        процентов — индексы, как в продакшене.
+        """
+        exercises = list(Exercise.objects.filter(user__isnull=True)[:8])
+        for n in range(20):
+            owner = User.objects.create_user(f'bulk{n}', password='test123')
+            workouts = Workout.objects.bulk_create(
+                Workout(user=owner) for _ in range(100)
+            )
+            WorkoutSet.objects.bulk_create(
+                WorkoutSet(workout=workout, exercise=exercise, weight=50, reps=8)
+                for i, workout in enumerate(workouts)
+                for exercise in exercises[i % 4:i % 4 + 4]
+            )
+            ScheduledWorkout.objects.bulk_create(
+                ScheduledWorkout(user=owner, date=f'2026-02-{i % 28 + 1:02d}', title='План')
+                for i in range(100)
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def routes(self):
+        next_page = self.client.get('/api/workouts/?page_size=10').data['next']
+        return {
+            'exercise-list': '/api/exercises/',
+            'workout-list': '/api/workouts/',
+            'workout-list-cursor': next_page,
+            'workout-detail': f'/api/workouts/{self.workout.pk}/',
+            'workoutset-list': '/api/sets/',
+            'workoutset-detail': f'/api/sets/{self.set.pk}/',
+            'schedule-list': '/api/schedule/',
+            'schedule-detail': f'/api/schedule/{self.scheduled.pk}/',
+            'calendar': '/api/calendar/',
+            'calendar-summary': '/api/calendar/?view=summary',
+            'notifications-upcoming': '/api/notifications/upcoming/',
+            'analytics-volume': '/api/analytics/volume/',
+            'analytics-max': f'/api/analytics/max/?exercise_id={self.exercise.pk}',
+            'analytics-records': '/api/analytics/records/',
+            'analytics-muscles': '/api/analytics/muscles/',
+            'analytics-load': '/api/analytics/load/',
+            'analytics-heatmap': '/api/analytics/heatmap/',
+            'export': '/api/export/?format=csv',
+        }
+
+    def explain(self, sql):
+        markers = self.PLAN_MARKERS[connection.vendor]
+        with connection.cursor() as cursor:
+            cursor.execute(markers['explain'] + sql)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_hot_paths_use_indexes(self):
+        if connection.vendor not in self.PLAN_MARKERS:
+            self.skipTest(f'Нет разбора EXPLAIN для {connection.vendor}')
+        markers = self.PLAN_MARKERS[connection.vendor]
+
+        for name, url in self.routes().items():
+            with self.subTest(route=name):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+                used = set()
+                for query in ctx.captured_queries:
+                    sql = query['sql']
+                    if not sql.startswith('SELECT'):
+                        continue
+                    plan = self.explain(sql)
+                    main_table = re.search(r'FROM "(\w+)"', sql).group(1)
+                    used.update(markers['index'].findall(plan))
+
+                    scanned = set(markers['scan'].findall(plan)) & self.HOT_TABLES
+                    self.assertFalse(
+                        scanned, f'Полный проход по {scanned}:\n{sql}\n{plan}',
+                    )
+                    if main_table in self.HOT_TABLES and name not in self.ALLOWED_SORTS:
+                        self.assertIsNone(
+                            markers['sort'].search(plan),
+                            f'Сортировка без индекса:\n{sql}\n{plan}',
+                        )
+
+                expected = self.EXPECTED_INDEXES.get(name)
+                if expected:
+                    self.assertTrue(
+                        expected & used,
+                        f'Ни одного из {sorted(expected)} в планах: {sorted(used)}',
+                    )
+
+
+class KeysetPaginationTest(APITestCase):
+    """Тесты курсорной пагинации списков."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        """Пройти все страницы вперёд, вернуть id в порядке выдачи."""
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next'] and urlsplit(response.data['next'])
+            url = url and f'{url.path}?{url.query}'
+        return ids, pages
+
+    def test_ties_broken_by_id(self):
+        """Одинаковый start_time: ни пропусков, ни повторов между страницами."""
+        for _ in range(7):
+            Workout.objects.create(user=self.user)
+        Workout.objects.update(start_time=timezone.now())
+
+        ids, pages = self.walk('/api/workouts/?page_size=3')
+
+        expected = list(
+            Workout.objects.order_by('-start_time', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+
+    @override_settings(API_PAGE_SIZE=2, API_MAX_PAGE_SIZE=3)
+    def test_page_sizes_from_settings(self):
+        for _ in range(5):
+            Workout.objects.create(user=self.user)
+
+        self.assertEqual(len(self.client.get('/api/workouts/').data['results']), 2)
+        response = self.client.get('/api/workouts/?page_size=100')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_nullable_time_in_schedule(self):
+        """Расписание с пустым time листается в порядке (date, time, id)."""
+        for day, time in [(1, None), (1, '09:00'), (1, '18:00'), (2, None), (2, '07:00')]:
+            ScheduledWorkout.objects.create(
+                user=self.user, date=f'2026-02-0{day}', time=time, title='План',
+            )
+
+        ids, _ = self.walk('/api/schedule/?page_size=2')
+
+        expected = list(
+            ScheduledWorkout.objects.order_by('date', 'time', 'id')
+            .values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_previous_link(self):
+        """Ссылка previous возвращает предыдущую страницу."""
+        for _ in range(4):
+            Workout.objects.create(user=self.user)
+
+        first = self.client.get('/api/workouts/?page_size=2').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_page_size_is_capped(self):
+        """page_size больше максимума ограничивается API_MAX_PAGE_SIZE."""
+        response = self.client.get('/api/exercises/?page_size=100000')
+
+        self.assertEqual(
+            len(response.data['results']),
+            min(settings.API_MAX_PAGE_SIZE, Exercise.objects.count()),
+        )
+
+    def test_invalid_cursor(self):
+        """Испорченный курсор или значения не того типа → 404."""
+        response = self.client.get('/api/workouts/?cursor=cD14eXo=')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        for position in (['not-a-date', 'x'], [{'a': 1}, 1]):
+            # Как CursorPagination.encode_cursor: base64 от p=<позиция>
+            cursor = b64encode(urlencode({'p': json.dumps(position)}).encode())
+            response = self.client.get('/api/workouts/', {'cursor': cursor.decode()})
+
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkSetsAPITest(APITestCase):
+    """Тесты пакетной записи подходов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = Exercise.objects.create(
+            name='Жим лежа', muscle_group='CHEST',
+        )
+        self.workout = Workout.objects.create(user=self.user)
+        self.url = f'/api/workouts/{self.workout.pk}/sets/bulk/'
+
+    def payload(self, count):
+        return [
+            {'exercise': self.exercise.pk, 'weight': 60 + i, 'reps': 10, 'rir': 2}
+            for i in range(count)
+        ]
+
+    def test_bulk_create(self):
+        """Пачка подходов создаётся и попадает в агрегаты и рекорды."""
+        response = self.client.post(self.url, self.payload(3), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(self.workout.sets.count(), 3)
+        self.assertEqual(DailyVolume.objects.get(user=self.user).sets_count, 3)
+        record = PersonalRecord.objects.get(user=self.user)
+        self.assertEqual(record.max_weight, 62)
+        self.assertEqual(record.max_weight_set_id, response.data['ids'][2])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        """Число запросов не зависит от размера пачки."""
+        # Первая пачка создаёт строки агрегатов, дальше — только UPDATE
+        self.client.post(self.url, self.payload(1), format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self.payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, self.payload(50), format='json')
+
+        self.assertEqual(len(small), len(large))
+
+    def test_per_item_errors(self):
+        """Ошибки возвращаются по индексам, ничего не создаётся."""
+        foreign = Exercise.objects.create(
+            name='Чужое', muscle_group='BACK', is_custom=True,
+            user=User.objects.create_user('other', password='test123'),
+        )
+        items = self.payload(3)
+        items[1]['reps'] = -1
+        items[2]['exercise'] = foreign.pk
+
+        response = self.client.post(self.url, items, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1, 2])
+        self.assertIn('reps', response.data['errors'][0])
+        self.assertIn('exercise', response.data['errors'][1])
+        self.assertFalse(WorkoutSet.objects.exists())
+
+    @override_settings(BULK_SETS_MAX_BATCH=5)
+    def test_batch_limit(self):
+        """Пачка больше лимита отклоняется целиком."""
+        response = self.client.post(self.url, self.payload(6), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(WorkoutSet.objects.exists())
+
+    def test_foreign_workout(self):
+        """В чужую тренировку записать нельзя."""
+        other = User.objects.create_user('other', password='test123')
+        self.client.force_authenticate(other)
+
+        response = self.client.post(self.url, self.payload(1), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(NPLUSONE_DETECTION=True, NPLUSONE_RAISE=True)
+class QueryBudgetTest(APITestCase):
+    """
+    Бюджет запросов для каждого маршрута workouts/urls.py и users/urls.py.
+
+    Данные — как у активного пользователя (сотни подходов, расписание
+    на месяц), поэтому запрос в цикле по объектам сразу выходит за бюджет,
+    а NPlusOneMiddleware падает на повторяющихся запросах.
+    """
+
+    URLCONFS = ('workouts.urls', 'users.urls')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('athlete', password='test123')
+        other = User.objects.create_user('other', password='test123')
+        cls.exercises = list(Exercise.objects.filter(user__isnull=True)[:12])
+        cls.custom = Exercise.objects.create(
+            name='Моё упражнение', muscle_group='BACK',
+            is_custom=True, user=cls.user,
+        )
+
+        now = timezone.now()
+        for owner in (cls.user, other):
+            for i in range(60):
+                workout = Workout.objects.create(user=owner)
+                Workout.objects.filter(pk=workout.pk).update(
+                    start_time=now - timezone.timedelta(days=i % 28, hours=i),
+                )
+                WorkoutSet.objects.bulk_create(
+                    WorkoutSet(
+                        workout=workout, exercise=exercise,
+                        weight=40 + i + n, reps=8, rir=2,
+                    )
+                    for exercise in cls.exercises[i % 6:i % 6 + 4]
+                    for n in range(2)
+                )
+            for i in range(30):
+                scheduled = ScheduledWorkout.objects.create(
+                    user=owner, date=timezone.localdate() + timezone.timedelta(days=i % 14 - 7),
+                    time='18:00', title='План',
+                )
+                scheduled.exercises.set(cls.exercises[i % 8:i % 8 + 4])
+            rule = ScheduleRule.objects.create(
+                user=owner, title='Программа', time='19:00', weekdays=[0, 2, 4],
+                start_date=timezone.localdate() - timezone.timedelta(days=30),
+            )
+            rule.exercises.set(cls.exercises[:4])
+        if connection.vendor == 'postgresql':
+            cls.add_bulk_history()
+        call_command('rebuild_rollups', stdout=StringIO())
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        cls.workout = Workout.objects.filter(user=cls.user).first()
+        cls.set = WorkoutSet.objects.filter(workout=cls.workout).first()
+        cls.scheduled = ScheduledWorkout.objects.filter(user=cls.user).first()
+        cls.rule = ScheduleRule.objects.get(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        # Бюджеты — для установившегося режима: справочник уже в памяти
+        catalog.global_exercises()
+        self.client.force_authenticate(self.user)
+
+    def cases(self):
+        """(маршрут, метод, url, тело, максимум запросов)."""
+        exercise_ids = [e.pk for e in self.exercises[:6]]
+        doomed_workout = Workout.objects.create(user=self.user)
+        empty_workout = Workout.objects.create(user=self.user)
+        fresh_schedule = ScheduledWorkout.objects.create(
+            user=self.user, date='2026-03-01', title='Новая',
+        )
+        sets = [
+            {'exercise': e.pk, 'weight': 50, 'reps': 10}
+            for e in self.exercises[:3] for _ in range(5)
+        ]
+        fresh_rule = ScheduleRule.objects.create(
+            user=self.user, title='Новая', weekdays=[1], start_date='2026-03-01',
+        )
+        days = [
+            day.isoformat() for day in recurrence.occurrences(
+                recurrence.pattern(self.rule),
+                timezone.localdate(), timezone.localdate() + timezone.timedelta(days=14),
+            )
+        ]
+        occurrence = f'/api/schedule-rules/{self.rule.pk}/occurrences'
+        rule_data = {
+            'title': 'Программа', 'weekdays': [0, 3], 'start_date': '2026-03-02',
+            'exercise_ids': exercise_ids,
+        }
+        return [
+            ('api-root', 'get', '/api/', None, 0),
+            ('exercise-list', 'get', '/api/exercises/', None, 1),
+            ('exercise-list', 'post', '/api/exercises/',
+             {'name': 'Тяга', 'muscle_group': 'BACK'}, 4),
+            ('exercise-detail', 'get', f'/api/exercises/{self.custom.pk}/', None, 1),
+            ('exercise-detail', 'patch', f'/api/exercises/{self.custom.pk}/',
+             {'description': 'Новое'}, 8),
+            ('workout-list', 'get', '/api/workouts/', None, 1),
+            ('workout-list', 'post', '/api/workouts/', {'note': 'Ноги'}, 4),
+            ('workout-detail', 'get', f'/api/workouts/{self.workout.pk}/', None, 2),
+            ('workout-detail', 'patch', f'/api/workouts/{self.workout.pk}/',
+             {'note': 'Спина'}, 5),
+            ('workout-detail', 'delete', f'/api/workouts/{doomed_workout.pk}/', None, 16),
+            ('workout-finish', 'post', f'/api/workouts/{self.workout.pk}/finish/', None, 6),
+            ('workout-bulk-sets', 'post',
+             f'/api/workouts/{empty_workout.pk}/sets/bulk/', sets, 19),
+            ('workoutset-list', 'get', '/api/sets/', None, 1),
+            ('workoutset-list', 'post', '/api/sets/',
+             {'workout': self.workout.pk, 'exercise': self.exercises[0].pk,
+              'weight': 200, 'reps': 1}, 12),
+            ('workoutset-detail', 'get', f'/api/sets/{self.set.pk}/', None, 1),
+            ('workoutset-detail', 'patch', f'/api/sets/{self.set.pk}/', {'reps': 9}, 14),
+            ('workoutset-detail', 'delete', f'/api/sets/{self.set.pk}/', None, 17),
+            ('schedule-list', 'get', '/api/schedule/', None, 2),
+            ('schedule-list', 'post', '/api/schedule/',
+             {'date': '2026-03-02', 'title': 'Грудь', 'exercise_ids': exercise_ids}, 8),
+            ('schedule-detail', 'get', f'/api/schedule/{self.scheduled.pk}/', None, 2),
+            ('schedule-detail', 'put', f'/api/schedule/{self.scheduled.pk}/',
+             {'date': '2026-03-03', 'title': 'Грудь', 'exercise_ids': exercise_ids}, 10),
+            ('schedule-detail', 'delete', f'/api/schedule/{fresh_schedule.pk}/', None, 9),
+            ('schedule-complete', 'post',
+             f'/api/schedule/{self.scheduled.pk}/complete/', None, 7),
+            ('schedule-start', 'post', f'/api/schedule/{self.scheduled.pk}/start/', None, 9),
+            ('schedulerule-list', 'get', '/api/schedule-rules/', None, 2),
+            ('schedulerule-list', 'post', '/api/schedule-rules/', rule_data, 8),
+            ('schedulerule-detail', 'get', f'/api/schedule-rules/{self.rule.pk}/', None, 2),
+            ('schedulerule-detail', 'put', f'/api/schedule-rules/{fresh_rule.pk}/', rule_data, 10),
+            ('schedulerule-detail', 'delete', f'/api/schedule-rules/{fresh_rule.pk}/', None, 11),
+            ('schedulerule-occurrence', 'patch', f'{occurrence}/{days[0]}/',
+             {'time': '07:00'}, 16),
+            ('schedulerule-occurrence', 'delete', f'{occurrence}/{days[1]}/', None, 8),
+            ('schedulerule-occurrence-complete', 'post',
+             f'{occurrence}/{days[2]}/complete/', None, 13),
+            ('schedulerule-occurrence-start', 'post', f'{occurrence}/{days[3]}/start/', None, 18),
+            ('calendar', 'get', '/api/calendar/', None, 5),
+            ('calendar', 'get', '/api/calendar/?view=summary', None, 3),
+            ('notifications-upcoming', 'get', '/api/notifications/upcoming/', None, 4),
+            ('notifications-stream', 'get', '/api/notifications/stream/', None, 0),
+            ('notifications-stream-ticket', 'post', '/api/notifications/stream/ticket/', None, 0),
+            ('analytics-volume', 'get', '/api/analytics/volume/', None, 1),
+            ('analytics-max', 'get',
+             f'/api/analytics/max/?exercise_id={self.exercises[0].pk}', None, 1),
+            ('analytics-records', 'get', '/api/analytics/records/', None, 1),
+            ('analytics-muscles', 'get', '/api/analytics/muscles/', None, 1),
+            ('analytics-load', 'get', '/api/analytics/load/', None, 3),
+            ('analytics-heatmap', 'get', '/api/analytics/heatmap/', None, 1),
+            ('export', 'get', '/api/export/?format=ndjson', None, 1),
+            ('import', 'post', '/api/import/', {'file': SimpleUploadedFile(
+                'strong.csv', STRONG_CSV.encode(), content_type='text/csv',
+            )}, 23),
+            ('sync', 'get', '/api/sync/?since=0', None, 9),
+            ('batch', 'post', '/api/batch/', {'requests': [
+                {'method': 'GET', 'path': path} for path in bench.LAUNCH_PATHS
+            ]}, 13),
+            ('register', 'post', '/api/auth/register/',
+             {'username': 'newcomer', 'password': 'secret123'}, 3),
+        ]
+
+    def test_every_route_has_budget(self):
+        """Новый маршрут без бюджета запросов — ошибка."""
+        routes = set()
+        for urlconf in self.URLCONFS:
+            for pattern in import_module(urlconf).urlpatterns:
+                if pattern.name:
+                    routes.add(pattern.name)
+
+        covered = {name for name, *_ in self.cases()}
+        self.assertEqual(routes - covered, set())
+
+    def test_query_budgets(self):
+        for name, method, url, data, budget in self.cases():
+            with self.subTest(route=name, method=method):
+                with CaptureQueriesContext(connection) as ctx:
+                    upload = isinstance(data, dict) and any(
+                        isinstance(value, SimpleUploadedFile) for value in data.values()
+                    )
+                    response = getattr(self.client, method)(
+                        url, data, format='multipart' if upload else 'json',
+                    )
+                    # Открытый поток (SSE) — только установка соединения
+                    if response.streaming and not response.is_async:
+                        b''.join(response.streaming_content)
+                self.assertLess(
+                    response.status_code, 400, getattr(response, 'data', None),
+                )
+                self.assertLessEqual(
+                    len(ctx), budget,
+                    '\n'.join(query['sql'] for query in ctx.captured_queries),
+                )
+
+
+class ExportAPITest(APITestCase):
+    """Тесты потоковой выгрузки."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.exercise = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        for day in (2, 1):
+            workout = Workout.objects.create(user=self.user, note='Грудь, "тяжело"')
+            Workout.objects.filter(pk=workout.pk).update(
+                start_time=timezone.now() - timezone.timedelta(days=day),
+            )
+            for reps in (10, 8, 6):
+                WorkoutSet.objects.create(
+                    workout=workout, exercise=self.exercise, weight=80, reps=reps,
+                )
+        other = User.objects.create_user('other', password='test123')
+        WorkoutSet.objects.create(
+            workout=Workout.objects.create(user=other),
+            exercise=self.exercise, weight=200, reps=1,
+        )
+
+    def body(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_ndjson(self):
+        response = self.client.get('/api/export/?format=ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row['reps'] for row in rows], [10, 8, 6, 10, 8, 6])
+        self.assertEqual(rows[0]['exercise_name'], 'Жим лежа')
+        self.assertLess(rows[0]['workout_start'], rows[3]['workout_start'])
+
+    def test_csv(self):
+        response = self.client.get('/api/export/?format=csv')
+
+        rows = list(csv.DictReader(io.StringIO(self.body(response).decode())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['workout_note'], 'Грудь, "тяжело"')
+        self.assertEqual(rows[0]['weight'], '80.0')
+
+    def test_gzip(self):
+        plain = self.body(self.client.get('/api/export/?format=csv'))
+        response = self.client.get(
+            '/api/export/?format=csv', HTTP_ACCEPT_ENCODING='gzip, deflate',
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(self.body(response)), plain)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_streams_in_chunks(self):
+        """Заголовок уходит до выборки, строки — пачками."""
+        response = self.client.get('/api/export/?format=csv')
+        chunks = list(response.streaming_content)
+
+        self.assertEqual(chunks[0].decode().strip(), ','.join(export.HEADER))
+        self.assertEqual(len(chunks), 4)  # заголовок + 3 пачки по 2 подхода
+
+    async def test_asgi_stream_is_incremental(self):
+        """Под ASGI первая пачка уходит до того, как построены остальные."""
+        built = []
+
+        def chunks():
+            for number in range(3):
+                built.append(number)
+                yield str(number).encode()
+
+        stream = export.for_server(AsyncRequestFactory().get('/api/export/'), chunks())
+        self.assertEqual((await anext(stream), built), (b'0', [0]))
+        self.assertEqual([chunk async for chunk in stream], [b'1', b'2'])
+        # Под WSGI поток отдаётся как есть
+        self.assertIsInstance(export.for_server(RequestFactory().get('/'), []), list)
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    async def test_asgi_export(self):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        request = AsyncRequestFactory().get(
+            '/api/export/?format=ndjson', headers={'Authorization': f'Bearer {token}'},
+        )
+        response = await sync_to_async(ExportView.as_view())(request)
+
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(b''.join(chunks).splitlines()), 6)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/export/?format=xml')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+
+
+STRONG_CSV = """Date,Workout Name,Duration,Exercise Name,Set Order,Weight,Reps,Distance,Seconds,Notes,Workout Notes,RPE
+2024-01-05 18:30:00,Push,1h 5m,Bench Press (Barbell),1,80,8,0,0,,Хорошо,8
+2024-01-05 18:30:00,Push,1h 5m,Bench Press (Barbell),2,85,6,0,0,,Хорошо,9
+2024-01-05 18:30:00,Push,1h 5m,Zercher Carry,1,60,5,0,0,,Хорошо,
+2024-01-07 09:00:00,Legs,50m,Squat (Barbell),1,100,5,0,0,,,
+2024-01-07 09:00:00,Legs,50m,Treadmill,1,0,0,2,600,,,
+"""
+
+HEVY_CSV = """title,start_time,end_time,description,exercise_title,superset_id,exercise_notes,set_index,set_type,weight_lbs,reps,distance_miles,duration_seconds,rpe
+Upper,"5 Feb 2024, 07:15","5 Feb 2024, 08:20",,Deadlift (Barbell),,,0,normal,225,5,,,7.5
+Upper,"5 Feb 2024, 07:15","5 Feb 2024, 08:20",,Deadlift (Barbell),,,1,normal,245,3,,,
+"""
+
+FITNOTES_CSV = """Date,Exercise,Category,Weight (kgs),Weight Unit,Reps,Distance,Distance Unit,Time,Comment
+2024-03-01,Landmine Press,Shoulders,30,kgs,10,,,,
+2024-03-01,Landmine Press,Shoulders,32.5,kgs,8,,,,
+"""
+
+
+class HistoryImportTest(APITestCase):
+    """Тесты импорта истории из CSV других трекеров."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content, **data):
+        response = self.client.post('/api/import/', {
+            'file': SimpleUploadedFile('export.csv', content.encode(), content_type='text/csv'),
+            **data,
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return [json.loads(line) for line in lines]
+
+    @override_settings(IMPORT_BATCH_SIZE=2)
+    async def test_asgi_progress_before_import_finishes(self):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        request = AsyncRequestFactory().post('/api/import/', {
+            'file': SimpleUploadedFile('export.csv', STRONG_CSV.encode(), content_type='text/csv'),
+        }, headers={'Authorization': f'Bearer {token}'})
+        response = await sync_to_async(ImportView.as_view())(request)
+        self.assertTrue(response.is_async)
+
+        lines = aiter(response.streaming_content)
+        first = json.loads(await anext(lines))
+        workouts = await Workout.objects.filter(user=self.user).acount()
+        self.assertNotIn('done', first)
+        self.assertEqual(workouts, 1)  # вторая тренировка ещё не импортирована
+
+        last = [json.loads(line) async for line in lines][-1]
+        self.assertTrue(last['done'])
+        self.assertEqual(await Workout.objects.filter(user=self.user).acount(), 2)
+
+    @override_settings(IMPORT_BATCH_SIZE=2)
+    def test_disconnect_rebuilds_aggregates(self):
+        """Оборванный на середине импорт пересобирает агрегаты записанных пачек."""
+        response = self.client.post('/api/import/', {
+            'file': SimpleUploadedFile('export.csv', STRONG_CSV.encode(), content_type='text/csv'),
+        }, format='multipart')
+        first = json.loads(next(iter(response.streaming_content)))
+        response.close()
+
+        self.assertNotIn('done', first)
+        workout = Workout.objects.get(user=self.user)
+        self.assertEqual(workout.total_sets, 2)
+        self.assertEqual(DailyVolume.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(PersonalRecord.objects.filter(user=self.user).count(), 1)
+
+    def test_strong(self):
+        result = self.upload(STRONG_CSV)[-1]
+
+        self.assertTrue(result['done'])
+        self.assertEqual(result['format'], 'strong')
+        self.assertEqual((result['workouts'], result['sets']), (2, 4))
+        self.assertEqual(result['skipped'], 1)  # кардио без повторений
+
+        push = Workout.objects.get(user=self.user, note='Push\nХорошо')
+        self.assertEqual(
+            timezone.localtime(push.start_time).replace(tzinfo=None),
+            timezone.datetime(2024, 1, 5, 18, 30),
+        )
+        self.assertEqual(push.status, 'FINISHED')
+        sets = list(push.sets.order_by('created_at'))
+        self.assertEqual([s.weight for s in sets], [80, 85, 60])
+        self.assertEqual([s.rir for s in sets], [2, 1, None])
+        self.assertEqual(sets[0].exercise.name, 'Жим штанги лёжа')
+        self.assertTrue(sets[2].exercise.is_custom)
+        self.assertEqual(sets[2].exercise.user, self.user)
+
+        # Агрегаты пересобраны после импорта
+        self.assertEqual(DailyVolume.objects.filter(user=self.user).count(), 2)
+        record = PersonalRecord.objects.get(user=self.user, exercise=sets[0].exercise)
+        self.assertEqual(record.max_weight, 85)
+
+    def test_hevy_pounds_and_rpe(self):
+        self.upload(HEVY_CSV)
+
+        sets = list(WorkoutSet.objects.filter(workout__user=self.user).order_by('created_at'))
+        self.assertEqual([s.weight for s in sets], [102.06, 111.13])
+        self.assertEqual(sets[0].rir, 2)
+        self.assertEqual(sets[0].exercise.name, 'Становая тяга')
+        self.assertIsNotNone(sets[0].workout.end_time)
+
+    def test_fitnotes_creates_custom_exercise(self):
+        result = self.upload(FITNOTES_CSV)[-1]
+
+        self.assertEqual(result['exercises_created'], 1)
+        exercise = Exercise.objects.get(user=self.user, name='Landmine Press')
+        self.assertEqual(exercise.muscle_group, 'SHOULDERS')
+        self.assertEqual(exercise.sets.count(), 2)
+
+    def test_created_exercises_change_list_etag(self):
+        cache.clear()
+        etag = self.client.get('/api/exercises/')['ETag']
+
+        self.upload(FITNOTES_CSV)
+
+        response = self.client.get('/api/exercises/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Landmine Press', [e['name'] for e in response.data['results']])
+
+    def test_reimport_is_idempotent(self):
+        self.upload(STRONG_CSV)
+        result = self.upload(STRONG_CSV)[-1]
+
+        self.assertEqual((result['workouts'], result['sets']), (0, 0))
+        self.assertEqual(WorkoutSet.objects.filter(workout__user=self.user).count(), 4)
+
+    def test_query_count_does_not_grow_with_file(self):
+        """Запросы — на пачку, а не на строку."""
+        def rows(count):
+            return 'Date,Exercise,Category,Weight (kgs),Reps\n' + ''.join(
+                f'2024-03-{day % 28 + 1:02d},Deadlift,Back,{100 + day},5\n'
+                for day in range(count)
+            )
+
+        with CaptureQueriesContext(connection) as small:
+            self.upload(rows(3))
+        WorkoutSet.objects.all().delete()
+        Workout.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.upload(rows(200))
+
+        self.assertEqual(len(small), len(large))
+
+    def test_progress_per_batch(self):
+        out = StringIO()
+        with NamedTemporaryFile('w', suffix='.csv', encoding='utf-8') as handle:
+            handle.write(STRONG_CSV)
+            handle.flush()
+            call_command(
+                'import_history', handle.name, user='athlete',
+                batch_size=2, stdout=out, stderr=StringIO(),
+            )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)  # 2 пачки + итог
+        self.assertIn('4 подходов', lines[-1])
+
+    def test_unknown_format(self):
+        response = self.client.post('/api/import/', {
+            'file': SimpleUploadedFile('x.csv', b'a,b,c\n1,2,3\n'),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NPlusOneMiddlewareTest(APITestCase):
+    """Тесты поиска N+1."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.workouts = [Workout.objects.create(user=self.user) for _ in range(5)]
+
+    def middleware(self, view):
+        with override_settings(
+            NPLUSONE_DETECTION=True, NPLUSONE_RAISE=True, NPLUSONE_THRESHOLD=5,
+        ):
+            return NPlusOneMiddleware(view)
+
+    def test_query_shape_folds_in_lists(self):
+        self.assertEqual(
+            query_shape('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            query_shape('SELECT 1 WHERE id IN (%s)'),
+        )
+
+    def test_repeated_query_raises(self):
+        """Запрос в цикле по объектам → NPlusOneError."""
+        def view(request):
+            for workout in Workout.objects.all():
+                list(workout.sets.all())
+            return HttpResponse()
+
+        with self.assertRaises(NPlusOneError):
+            self.middleware(view)(RequestFactory().get('/'))
+
+    def test_batched_query_passes(self):
+        def view(request):
+            list(Workout.objects.prefetch_related('sets'))
+            return HttpResponse()
+
+        response = self.middleware(view)(RequestFactory().get('/'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_async_chain(self):
+        """Запросы из потоков sync_to_async тоже считаются."""
+        def queries():
+            for workout in Workout.objects.all():
+                list(workout.sets.all())
+
+        async def view(request):
+            await sync_to_async(queries)()
+            return HttpResponse()
+
+        middleware = self.middleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        with self.assertRaises(NPlusOneError):
+            async_to_sync(middleware)(AsyncRequestFactory().get('/'))
+
+
+class NPlusOneConnectionTest(TransactionTestCase):
+    """Соединение, открытое внутри запроса, не ломает учёт запросов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        Workout.objects.create(user=self.user)
+
+    @override_settings(NPLUSONE_DETECTION=True, SERVER_TIMING=True)
+    def test_connection_opened_inside_request(self):
+        def view(request):
+            list(Workout.objects.all())
+            list(WorkoutSet.objects.all())
+            return HttpResponse()
+
+        chain = TimingMiddleware(NPlusOneMiddleware(view))
+        headers, wrappers = [], []
+
+        def run():
+            # Новый поток — новое соединение, оно откроется внутри запроса
+            try:
+                for _ in range(3):
+                    response = chain(RequestFactory().get('/'))
+                    headers.append(response['Server-Timing'])
+                wrappers.extend(connection.execute_wrappers)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(len(headers), 3)
+        for header in headers:
+            self.assertIn('desc="2 queries"', header)
+        self.assertEqual(len(wrappers), 2)
+
+
+class SyntheticDataTest(APITestCase):
+    """Тесты генератора данных и замера эндпоинтов."""
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command(
+            'generate_data', users=2, years=1, per_week=2, exercises=3, sets=2,
+            stdout=out, **options,
+        )
+        return out.getvalue()
+
+    def test_generate_data(self):
+        self.generate()
+
+        users = User.objects.filter(username__startswith='bench')
+        self.assertEqual(users.count(), 2)
+        workouts = Workout.objects.filter(user__in=users)
+        # 2 пользователя × ~52 недели × 2 тренировки
+        self.assertTrue(200 <= workouts.count() <= 212, workouts.count())
+        self.assertEqual(
+            WorkoutSet.objects.filter(workout__user__in=users).count(),
+            workouts.count() * 3 * 2,
+        )
+        # История в прошлом, агрегаты пересобраны
+        self.assertLess(workouts.latest('start_time').start_time, timezone.now())
+        self.assertGreater(
+            workouts.earliest('start_time').start_time,
+            timezone.now() - timezone.timedelta(days=366),
+        )
+        self.assertEqual(
+            DailyVolume.objects.filter(user__in=users).count(), workouts.count(),
+        )
+        self.assertTrue(PersonalRecord.objects.filter(user__in=users).exists())
+        self.assertTrue(ScheduledWorkout.objects.filter(user__in=users).exists())
+
+    def test_repeated_run_adds_users(self):
+        self.generate()
+        self.generate()
+
+        self.assertEqual(
+            sorted(User.objects.filter(username__startswith='bench')
+                   .values_list('username', flat=True)),
+            ['bench0', 'bench1', 'bench2', 'bench3'],
+        )
+
+    def test_benchmark_covers_every_route(self):
+        self.generate()
+        user = User.objects.get(username='bench0')
+
+        covered = {name for name, *_ in bench.cases(user)}
+        self.assertEqual(bench.route_names() - covered, set())
+
+    def test_benchmark_report(self):
+        self.generate()
+        with NamedTemporaryFile('r', suffix='.json') as output:
+            call_command(
+                'benchmark', iterations=2, warmup=0, output=output.name,
+                stdout=StringIO(),
+            )
+            report = json.load(output)
+
+        self.assertEqual(report['meta']['users'], 2)
+        for result in report['results']:
+            with self.subTest(route=result['route'], method=result['method']):
+                self.assertLess(result['status'], 400)
+                self.assertEqual(result['samples'], 2)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        # Пишущие запросы откатываются
+        self.assertFalse(Exercise.objects.filter(name='Тяга').exists())
+
+    def test_compare_flags_regressions(self):
+        baseline = {'results': [
+            {'route': 'calendar', 'method': 'GET', 'p95_ms': 10.0, 'queries': 2},
+            {'route': 'export', 'method': 'GET', 'p95_ms': 10.0, 'queries': 2},
+        ]}
+        rows = bench.compare(baseline, [
+            {'route': 'calendar', 'method': 'GET', 'p95_ms': 15.0, 'queries': 2},
+            {'route': 'export', 'method': 'GET', 'p95_ms': 10.5, 'queries': 2},
+        ], threshold=20)
+
+        self.assertEqual([row[-1] for row in rows], [True, False])
+
+
+class TimingMiddlewareTest(APITestCase):
+    """Тесты Server-Timing и /metrics."""
+
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        exercise = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        workout = Workout.objects.create(user=self.user)
+        WorkoutSet.objects.create(workout=workout, exercise=exercise, weight=80, reps=10)
+
+    def server_timing(self, response):
+        return {
+            part.split(';')[0]: part
+            for part in response['Server-Timing'].split(', ')
+        }
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/analytics/records/')
+
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'render', 'app', 'total'})
+        self.assertIn(f'desc="{len(ctx)} queries"', timing['db'])
+
+    def test_metrics_per_route(self):
+        for _ in range(3):
+            self.client.get('/api/analytics/records/')
+        response = self.client.get('/api/export/?format=csv')
+        body = b''.join(response.streaming_content)
+
+        with override_settings(METRICS_TOKEN='secret'):
+            text = self.client.get(
+                '/metrics', headers={'Authorization': 'Bearer secret'},
+            ).content.decode()
+        labels = 'route="analytics-records",method="GET"'
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 3', text)
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3', text,
+        )
+        self.assertRegex(text, rf'http_request_db_queries_total{{{labels}}} [1-9]')
+        # Байты потокового ответа — после отдачи тела
+        self.assertIn(
+            f'http_response_bytes_total{{route="export",method="GET"}} {len(body)}', text,
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_closed_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer '})
+        self.assertEqual(response.status_code, 403)
+
+
+class ExerciseCatalogTest(APITestCase):
+    """Тесты справочника упражнений в памяти и ETag списка."""
+
+    URL = '/api/exercises/?page_size=200'
+
+    def setUp(self):
+        cache.clear()
+        catalog.invalidate()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+
+    def names(self, response):
+        return [e['name'] for e in response.data['results']]
+
+    def test_list_merges_custom_exercises_in_order(self):
+        Exercise.objects.create(
+            name='Жим гантелей', muscle_group='CHEST', is_custom=True, user=self.user,
+        )
+        response = self.client.get(self.URL)
+
+        names = self.names(response)
+        self.assertIn('Жим гантелей', names)
+        self.assertEqual(names, sorted(names))
+
+    def test_warm_list_reads_only_custom_exercises(self):
+        self.client.get(self.URL)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.URL)
+
+        self.assertEqual(len(ctx), 1)
+        self.assertIn('"user_id" =', ctx.captured_queries[0]['sql'])
+
+    def test_etag_not_modified(self):
+        etag = self.client.get(self.URL)['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.URL, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(ctx), 0)
+
+        # Другая страница — другой ETag
+        self.assertNotEqual(self.client.get('/api/exercises/?page_size=10')['ETag'], etag)
+
+    def test_etag_changes_on_write(self):
+        etag = self.client.get(self.URL)['ETag']
+        self.client.post('/api/exercises/', {'name': 'Моё', 'muscle_group': 'BACK'})
+
+        response = self.client.get(self.URL, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Моё', self.names(response))
+
+        etag = response['ETag']
+        self.bench.name = 'Жим штанги лежа'
+        self.bench.save()
+        response = self.client.get(self.URL, headers={'If-None-Match': etag})
+        self.assertIn('Жим штанги лежа', self.names(response))
+
+    def test_set_uses_cached_exercise(self):
+        workout = Workout.objects.create(user=self.user)
+        catalog.global_exercises()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/sets/', {
+                'workout': workout.pk, 'exercise': self.bench.pk, 'weight': 80, 'reps': 5,
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['exercise_name'], 'Жим лежа')
+        self.assertFalse(any(
+            'FROM "workouts_exercise"' in query['sql'] for query in ctx.captured_queries
+        ))
+
+    def test_unknown_exercise_rejected(self):
+        workout = Workout.objects.create(user=self.user)
+        response = self.client.post('/api/sets/', {
+            'workout': workout.pk, 'exercise': 999999, 'weight': 80, 'reps': 5,
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReadersTest(APITestCase):
+    """Быстрый путь чтения даёт тот же JSON, что и сериализаторы."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        squat = Exercise.objects.create(name='Присед', muscle_group='LEGS')
+        custom = Exercise.objects.create(
+            name='Мой жим', muscle_group='CHEST', is_custom=True, user=self.user,
+        )
+
+        finished = Workout.objects.create(user=self.user, status='FINISHED', note='Грудь')
+        Workout.objects.filter(pk=finished.pk).update(
+            start_time=timezone.now() - timezone.timedelta(days=1, microseconds=7),
+            end_time=timezone.now(),
+        )
+        WorkoutSet.objects.create(workout=finished, exercise=bench, weight=62.5, reps=8, rir=2)
+        WorkoutSet.objects.create(workout=finished, exercise=bench, weight=0.1, reps=3)
+        WorkoutSet.objects.create(workout=finished, exercise=custom, weight=40, reps=12)
+        Workout.objects.create(user=self.user)  # без подходов и end_time
+
+        with_time = ScheduledWorkout.objects.create(
+            user=self.user, date='2030-01-01', time='07:30', title='Грудь', note='Утро',
+        )
+        with_time.exercises.set([squat, custom, bench])
+        ScheduledWorkout.objects.create(user=self.user, date='2030-01-02', title='Отдых')
+
+    def assertSameJSON(self, reader, serializer_class, queryset):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        self.assertEqual(JSONRenderer().render(reader.read(queryset)), expected)
+
+    def test_workouts(self):
+        self.assertSameJSON(
+            readers.workouts, WorkoutListSerializer,
+            Workout.objects.filter(user=self.user).order_by('-start_time'),
+        )
+
+    def test_sets(self):
+        self.assertSameJSON(
+            readers.sets, WorkoutSetSerializer,
+            WorkoutSet.objects.filter(workout__user=self.user).select_related('exercise'),
+        )
+
+    def test_scheduled(self):
+        self.assertSameJSON(
+            readers.scheduled, ScheduledWorkoutSerializer,
+            ScheduledWorkout.objects.filter(user=self.user).prefetch_related('exercises'),
+        )
+
+    def test_list_pages_match_serializers(self):
+        cases = (
+            ('/api/workouts/', WorkoutListSerializer,
+             Workout.objects.filter(user=self.user).order_by('-start_time', '-id')),
+            ('/api/sets/', WorkoutSetSerializer,
+             WorkoutSet.objects.filter(workout__user=self.user).order_by('created_at', 'id')),
+            ('/api/schedule/', ScheduledWorkoutSerializer,
+             ScheduledWorkout.objects.filter(user=self.user).order_by('date', 'time', 'id')),
+        )
+        for url, serializer_class, queryset in cases:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+                self.assertEqual(response.json()['results'], json.loads(expected))
+
+    def test_empty_page(self):
+        self.assertEqual(readers.workouts.read(Workout.objects.none()), [])
+
+
+class SyncAPITest(APITestCase):
+    """Тесты дельта-синхронизации (/api/sync/)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        self.cursor = self.client.get('/api/sync/').data['cursor']
+
+    def sync(self):
+        response = self.client.get(f'/api/sync/?since={self.cursor}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.cursor = response.data['cursor']
+        return response.data
+
+    def test_changes_since_cursor(self):
+        workout_id = self.client.post('/api/workouts/', {'note': 'Грудь'}).data['id']
+        set_id = self.client.post('/api/sets/', {
+            'workout': workout_id, 'exercise': self.bench.pk, 'weight': 100, 'reps': 5,
+        }).data['id']
+
+        data = self.sync()
+        self.assertEqual([w['id'] for w in data['workouts']], [workout_id])
+        self.assertEqual(data['workouts'][0]['total_volume'], 500)
+        self.assertEqual([s['id'] for s in data['sets']], [set_id])
+        self.assertFalse(data['has_more'])
+
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.sync()
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(data['workouts'], [])
+
+    def test_set_change_resends_workout(self):
+        workout = Workout.objects.create(user=self.user)
+        kept = WorkoutSet.objects.create(workout=workout, exercise=self.bench, weight=100, reps=5)
+        doomed = WorkoutSet.objects.create(workout=workout, exercise=self.bench, weight=80, reps=5)
+        self.sync()
+
+        self.client.delete(f'/api/sets/{doomed.pk}/')
+
+        data = self.sync()
+        self.assertEqual(data['deleted']['sets'], [doomed.pk])
+        self.assertEqual(data['workouts'][0]['total_sets'], 1)
+        self.assertEqual([s['id'] for s in data['sets']], [kept.pk])
+
+    def test_workout_delete_buries_sets(self):
+        workout = Workout.objects.create(user=self.user)
+        workout_set = WorkoutSet.objects.create(
+            workout=workout, exercise=self.bench, weight=100, reps=5,
+        )
+        scheduled = ScheduledWorkout.objects.create(
+            user=self.user, date='2030-01-01', title='Грудь', workout=workout,
+        )
+        self.sync()
+
+        self.client.delete(f'/api/workouts/{workout.pk}/')
+
+        data = self.sync()
+        self.assertEqual(data['deleted']['workouts'], [workout.pk])
+        self.assertEqual(data['deleted']['sets'], [workout_set.pk])
+        self.assertEqual(data['schedule'][0]['id'], scheduled.pk)
+        self.assertIsNone(data['schedule'][0]['workout'])
+
+    def test_custom_exercise_lifecycle(self):
+        exercise_id = self.client.post(
+            '/api/exercises/', {'name': 'Тяга', 'muscle_group': 'BACK'},
+        ).data['id']
+        workout = Workout.objects.create(user=self.user)
+        WorkoutSet.objects.create(workout=workout, exercise_id=exercise_id, weight=60, reps=8)
+        self.assertEqual(self.sync()['exercises'][0]['id'], exercise_id)
+
+        self.client.patch(f'/api/exercises/{exercise_id}/', {'name': 'Тяга штанги'})
+        data = self.sync()
+        self.assertEqual(data['sets'][0]['exercise_name'], 'Тяга штанги')
+
+        self.client.delete(f'/api/exercises/{exercise_id}/')
+        data = self.sync()
+        self.assertEqual(data['deleted']['exercises'], [exercise_id])
+        self.assertEqual(len(data['deleted']['sets']), 1)
+        self.assertEqual(data['workouts'][0]['total_sets'], 0)
+
+    @override_settings(SYNC_TOMBSTONE_PRUNE_EVERY=1, SYNC_TOMBSTONE_RETENTION_DAYS=30)
+    def test_cursor_older_than_tombstones_requires_resync(self):
+        """Надгробия старше срока удаляются, курсор до них → 410 full_resync."""
+        old = self.client.post('/api/workouts/', {'note': 'Грудь'}).data['id']
+        recent = self.client.post('/api/workouts/', {'note': 'Спина'}).data['id']
+        self.client.delete(f'/api/workouts/{old}/')
+        Tombstone.objects.update(deleted_at=timezone.now() - timezone.timedelta(days=31))
+        after_old = sync.current(self.user.pk)
+
+        self.client.delete(f'/api/workouts/{recent}/')
+
+        self.assertEqual(
+            list(Tombstone.objects.values_list('object_id', flat=True)), [recent],
+        )
+        response = self.client.get(f'/api/sync/?since={self.cursor}')
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertTrue(response.data['full_resync'])
+        self.assertEqual(response.data['cursor'], sync.current(self.user.pk))
+
+        self.cursor = after_old
+        self.assertEqual(self.sync()['deleted']['workouts'], [recent])
+
+    def test_other_users_changes_are_invisible(self):
+        other = User.objects.create_user('other', password='test123')
+        Workout.objects.create(user=other)
+
+        data = self.sync()
+        self.assertEqual(data['workouts'], [])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_do_not_lose_changes(self):
+        created = [Workout.objects.create(user=self.user).pk for _ in range(3)]
+        # Пачка подходов — один номер на несколько тренировок
+        imported = Workout.objects.bulk_create(
+            Workout(user=self.user, seq=sync.next_seq(self.user.pk)) for _ in range(3)
+        )
+        scheduled = ScheduledWorkout.objects.create(user=self.user, date='2030-01-01', title='План')
+        Workout.objects.get(pk=created[0]).delete()
+
+        seen, schedule, deleted, pages = set(), set(), set(), 0
+        while True:
+            data = self.sync()
+            pages += 1
+            seen.update(w['id'] for w in data['workouts'])
+            schedule.update(s['id'] for s in data['schedule'])
+            deleted.update(data['deleted']['workouts'])
+            if not data['has_more']:
+                break
+
+        self.assertGreater(pages, 1)
+        self.assertEqual(seen, {*created[1:], *(w.pk for w in imported)})
+        self.assertEqual(schedule, {scheduled.pk})
+        self.assertEqual(deleted, {created[0]})
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/sync/?since=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FailingChannel:
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, notification):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('канал недоступен')
+        self.sent.append(notification.scheduled_id)
+
+
+class NotificationDispatcherTest(APITestCase):
+    """Тесты диспетчера напоминаний (notifications.py)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        self.scheduled = ScheduledWorkout.objects.create(
+            user=self.user, date=self.tomorrow, time='10:00', title='Грудь',
+        )
+        # Напоминание за 30 минут до начала
+        self.at = notifications.starts_at(
+            self.tomorrow, timezone.datetime(2000, 1, 1, 10).time(),
+        ) - timezone.timedelta(minutes=30)
+        self.now = self.at - timezone.timedelta(hours=1)
+        self.channel = FailingChannel(0)
+
+    def dispatcher(self):
+        dispatcher = notifications.Dispatcher(channel=self.channel, clock=lambda: self.now)
+        dispatcher.start()
+        return dispatcher
+
+    def test_fires_at_reminder_time(self):
+        dispatcher = self.dispatcher()
+        wait = dispatcher.tick()
+        self.assertEqual(self.channel.sent, [])
+        self.assertLessEqual(wait, settings.NOTIFICATION_POLL_SECONDS)
+
+        self.now = self.at
+        dispatcher.tick()
+        self.assertEqual(self.channel.sent, [self.scheduled.pk])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.remind_at, self.at)
+        self.assertIsNotNone(notification.sent_at)
+
+        dispatcher.tick()
+        self.assertEqual(self.channel.sent, [self.scheduled.pk])
+
+    def test_picks_up_changes(self):
+        dispatcher = self.dispatcher()
+        later = ScheduledWorkout.objects.create(
+            user=self.user, date=self.tomorrow, time='10:10', title='Спина',
+        )
+        self.client.patch(f'/api/schedule/{self.scheduled.pk}/', {'time': '11:00'})
+
+        self.now = self.at + timezone.timedelta(minutes=10)
+        dispatcher.tick()
+        # Перенесённая запись ещё не наступила, новая — наступила
+        self.assertEqual(self.channel.sent, [later.pk])
+
+        self.now = self.at + timezone.timedelta(hours=1)
+        dispatcher.tick()
+        self.assertEqual(self.channel.sent, [later.pk, self.scheduled.pk])
+
+    def test_start_prunes_changes(self):
+        self.client.patch(f'/api/schedule/{self.scheduled.pk}/', {'time': '11:00'})
+        self.assertTrue(ReminderChange.objects.exists())
+
+        self.dispatcher()
+        self.assertFalse(ReminderChange.objects.exists())
+
+    @override_settings(NOTIFICATION_CHANGE_PRUNE_EVERY=1)
+    def test_old_changes_pruned_without_dispatcher(self):
+        ReminderChange.objects.update(created_at=timezone.now() - timezone.timedelta(days=2))
+        self.client.patch(f'/api/schedule/{self.scheduled.pk}/', {'time': '11:00'})
+
+        # Осталось только свежее изменение
+        self.assertEqual(
+            list(ReminderChange.objects.values_list('scheduled_id', flat=True)),
+            [self.scheduled.pk],
+        )
+
+    def test_skips_completed_and_deleted(self):
+        other = ScheduledWorkout.objects.create(
+            user=self.user, date=self.tomorrow, time='10:00', title='Спина',
+        )
+        dispatcher = self.dispatcher()
+        self.client.post(f'/api/schedule/{self.scheduled.pk}/complete/')
+        self.client.delete(f'/api/schedule/{other.pk}/')
+
+        self.now = self.at
+        dispatcher.tick()
+        self.assertEqual(self.channel.sent, [])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_no_duplicates_after_restart(self):
+        self.now = self.at
+        self.dispatcher().tick()
+        self.dispatcher().tick()
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(self.channel.sent, [self.scheduled.pk])
+
+    def test_edit_of_past_workout_not_sent(self):
+        past = ScheduledWorkout.objects.create(
+            user=self.user, date=self.tomorrow - timezone.timedelta(days=8),
+            time='09:00', title='Ноги',
+        )
+        dispatcher = self.dispatcher()
+        self.client.patch(f'/api/schedule/{past.pk}/', {'title': 'Ноги и спина'})
+
+        dispatcher.tick()
+        self.assertNotIn(('schedule', past.pk), dispatcher.pending)
+        self.assertEqual(self.channel.sent, [])
+        self.assertFalse(Notification.objects.exists())
+
+    def test_start_after_downtime(self):
+        started = ScheduledWorkout.objects.create(
+            user=self.user, date=self.tomorrow, time='09:00', title='Ноги',
+        )
+        # Запуск в 09:40: тренировка в 09:00 уже идёт, в 10:00 — ещё впереди
+        self.now = self.at + timezone.timedelta(minutes=10)
+        self.dispatcher().tick()
+        self.assertEqual(self.channel.sent, [self.scheduled.pk])
+        self.assertFalse(Notification.objects.filter(scheduled=started).exists())
+
+    def test_horizon_moves(self):
+        later = ScheduledWorkout.objects.create(
+            user=self.user, date=self.tomorrow + timezone.timedelta(days=5),
+            time='10:00', title='Ноги',
+        )
+        dispatcher = self.dispatcher()
+        self.assertNotIn(('schedule', later.pk), dispatcher.pending)
+
+        self.now += timezone.timedelta(days=4)
+        dispatcher.tick()
+        self.assertIn(('schedule', later.pk), dispatcher.pending)
+
+    def test_failed_delivery_retried(self):
+        self.channel = FailingChannel(1)
+        dispatcher = self.dispatcher()
+        self.now = self.at
+        with self.assertLogs('workouts.notifications', 'WARNING'):
+            dispatcher.tick()
+        notification = Notification.objects.get()
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn('канал недоступен', notification.last_error)
+
+        dispatcher.tick()
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.sent_at)
+        self.assertEqual(notification.attempts, 2)
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        self.channel = FailingChannel(5)
+        dispatcher = self.dispatcher()
+        self.now = self.at
+        with self.assertLogs('workouts.notifications', 'WARNING') as logs:
+            for _ in range(4):
+                dispatcher.tick()
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(Notification.objects.get().attempts, 2)
+
+    def test_log_channel_writes_json_lines(self):
+        with NamedTemporaryFile('r', suffix='.jsonl', encoding='utf-8') as handle:
+            self.channel = notifications.LogChannel(handle.name)
+            self.now = self.at
+            self.dispatcher().tick()
+            line = json.loads(handle.read())
+        self.assertEqual(line['scheduled'], self.scheduled.pk)
+        self.assertEqual(line['title'], 'Скоро тренировка: Грудь')
+
+    def test_command_once(self):
+        ScheduledWorkout.objects.filter(pk=self.scheduled.pk).update(
+            time=None, notify_before=48 * 60,
+        )
+        out = StringIO()
+        call_command('dispatch_notifications', once=True, stdout=out)
+        self.assertIn('Загружено напоминаний: 1', out.getvalue())
+        self.assertTrue(Notification.objects.filter(sent_at__isnull=False).exists())
+
+
+@override_settings(NOTIFICATION_STREAM_POLL_SECONDS=0.01, NOTIFICATION_STREAM_HEARTBEAT_SECONDS=5)
+class NotificationStreamTest(AsyncViewsMixin, APITestCase):
+    """Тесты потока напоминаний (SSE)."""
+
+    def setUp(self):
+        cache.clear()
+        self.create_data()
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+
+    async def ticket(self):
+        return await sync_to_async(notifications.issue_stream_ticket)(self.user.pk)
+
+    async def open(self, path='/api/notifications/stream/', **headers):
+        request = AsyncRequestFactory().get(path, headers=headers)
+        response = await async_views.AsyncNotificationStreamView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return aiter(response.streaming_content)
+
+    def notify(self, title='Скоро тренировка: Грудь'):
+        return Notification.objects.create(
+            user=self.user, remind_at=timezone.now(), title=title,
+        )
+
+    def event(self, chunk):
+        fields = dict(line.split(': ', 1) for line in chunk.decode().splitlines() if line)
+        return fields['id'], fields['event'], json.loads(fields['data'])
+
+    async def test_pushes_new_notifications(self):
+        events = await self.open(f'/api/notifications/stream/?ticket={await self.ticket()}')
+        chunk = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.05)
+        notification = await sync_to_async(self.notify)()
+
+        event_id, name, data = self.event(await asyncio.wait_for(chunk, 2))
+        self.assertEqual(event_id, str(notification.pk))
+        self.assertEqual(name, 'reminder')
+        self.assertEqual(data['title'], 'Скоро тренировка: Грудь')
+        await events.aclose()
+
+    async def test_other_users_notifications_not_sent(self):
+        other = await sync_to_async(User.objects.create_user)('other', password='test123')
+        events = await self.open(f'/api/notifications/stream/?ticket={await self.ticket()}')
+        chunk = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.05)
+        await sync_to_async(Notification.objects.create)(
+            user=other, remind_at=timezone.now(), title='Чужое',
+        )
+        mine = await sync_to_async(self.notify)()
+
+        event_id, _, _ = self.event(await asyncio.wait_for(chunk, 2))
+        self.assertEqual(event_id, str(mine.pk))
+        await events.aclose()
+
+    async def test_replays_after_last_event_id(self):
+        seen = await sync_to_async(self.notify)('Первое')
+        missed = await sync_to_async(self.notify)('Второе')
+
+        events = await self.open(
+            Authorization=f'Bearer {self.token}', **{'Last-Event-ID': str(seen.pk)},
+        )
+        event_id, _, data = self.event(await asyncio.wait_for(anext(events), 2))
+        self.assertEqual(event_id, str(missed.pk))
+        self.assertEqual(data['title'], 'Второе')
+        await events.aclose()
+
+    @override_settings(NOTIFICATION_STREAM_HEARTBEAT_SECONDS=0.01)
+    async def test_heartbeat(self):
+        events = await self.open(Authorization=f'Bearer {self.token}')
+        self.assertEqual(await asyncio.wait_for(anext(events), 2), b': heartbeat\n\n')
+        await events.aclose()
+
+    async def test_disconnect_unsubscribes(self):
+        events = await self.open(Authorization=f'Bearer {self.token}')
+        chunk = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.05)
+        self.assertIn(self.user.pk, notifications.hub.queues)
+
+        # Так ASGI-обработчик Django обрывает ответ при отключении клиента
+        chunk.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await chunk
+        self.assertNotIn(self.user.pk, notifications.hub.queues)
+
+    async def test_requires_authentication(self):
+        request = AsyncRequestFactory().get('/api/notifications/stream/?ticket=bad')
+        response = await async_views.AsyncNotificationStreamView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+    async def test_ticket_is_single_use(self):
+        path = f'/api/notifications/stream/?ticket={await self.ticket()}'
+        events = await self.open(path)
+        await events.aclose()
+
+        request = AsyncRequestFactory().get(path)
+        response = await async_views.AsyncNotificationStreamView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_access_token_not_accepted_in_query(self):
+        request = AsyncRequestFactory().get(f'/api/notifications/stream/?token={self.token}')
+        response = await async_views.AsyncNotificationStreamView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_issue_ticket(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/notifications/stream/ticket/')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['expires_in'], settings.NOTIFICATION_STREAM_TICKET_SECONDS)
+        self.assertEqual(notifications.redeem_stream_ticket(response.data['ticket']), self.user.pk)
+
+
+class ScheduleRuleTest(APITestCase):
+    """Тесты правил повторения и их повторений (recurrence.py)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.force_authenticate(self.user)
+        self.bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        # Понедельник, среда, пятница с понедельника 2 марта 2026
+        response = self.client.post('/api/schedule-rules/', {
+            'title': 'Программа', 'time': '18:00', 'weekdays': [4, 0, 2, 2],
+            'start_date': '2026-03-02', 'exercise_ids': [self.bench.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.rule = ScheduleRule.objects.get(pk=response.data['id'])
+
+    def occurrence(self, day, suffix=''):
+        return f'/api/schedule-rules/{self.rule.pk}/occurrences/{day}/{suffix}'
+
+    def scheduled_days(self, start='2026-03-01', end='2026-03-15'):
+        response = self.client.get(f'/api/calendar/?start={start}&end={end}')
+        return {
+            day['date']: day['scheduled'] for day in response.data if day['scheduled']
+        }
+
+    def test_weekdays_normalized(self):
+        self.assertEqual(self.rule.weekdays, [0, 2, 4])
+        self.assertIsNone(self.rule.last_date)
+
+    def test_calendar_expands_window(self):
+        days = self.scheduled_days()
+        self.assertEqual(sorted(days), [
+            '2026-03-02', '2026-03-04', '2026-03-06',
+            '2026-03-09', '2026-03-11', '2026-03-13',
+        ])
+        item = days['2026-03-04'][0]
+        self.assertIsNone(item['id'])
+        self.assertEqual(item['rule'], self.rule.pk)
+        self.assertEqual(item['rule_date'], '2026-03-04')
+        self.assertEqual(item['exercises'][0]['name'], 'Жим лежа')
+        scheduled = ScheduledWorkout.objects.create(user=self.user, date='2026-03-03')
+        self.assertEqual(list(item), list(ScheduledWorkoutSerializer(scheduled).data))
+
+    def test_interval_and_count(self):
+        self.client.patch(f'/api/schedule-rules/{self.rule.pk}/', {
+            'interval': 2, 'count': 4,
+        }, format='json')
+        self.rule.refresh_from_db()
+        self.assertEqual(self.rule.last_date.isoformat(), '2026-03-16')
+        self.assertEqual(sorted(self.scheduled_days(end='2026-04-30')), [
+            '2026-03-02', '2026-03-04', '2026-03-06', '2026-03-16',
+        ])
+
+    def test_last_date_matches_enumeration(self):
+        for weekdays, interval, start, count in [
+            ([0, 2, 4], 1, '2026-03-04', 1),
+            ([0, 2, 4], 1, '2026-03-04', 2),
+            ([0, 2, 4], 3, '2026-03-04', 7),
+            ([6], 2, '2026-03-02', 5),
+            ([1, 5], 1, '2026-03-07', 10),
+        ]:
+            with self.subTest(weekdays=weekdays, interval=interval, start=start, count=count):
+                unbounded = recurrence.Pattern(
+                    timezone.datetime.fromisoformat(start).date(), frozenset(weekdays),
+                    interval, None, None, frozenset(),
+                )
+                expected = list(recurrence.occurrences(
+                    unbounded, unbounded.start_date,
+                    unbounded.start_date + timezone.timedelta(days=365),
+                ))[count - 1]
+                self.assertEqual(
+                    recurrence.last_date(unbounded._replace(count=count)), expected,
+                )
+
+    def test_until_before_start_rejected(self):
+        response = self.client.patch(
+            f'/api/schedule-rules/{self.rule.pk}/', {'until': '2026-01-01'}, format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_complete_materializes_occurrence(self):
+        response = self.client.post(self.occurrence('2026-03-04', 'complete/'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_completed'])
+
+        scheduled = ScheduledWorkout.objects.get()
+        self.assertEqual((scheduled.rule_id, scheduled.rule_date.isoformat()),
+                         (self.rule.pk, '2026-03-04'))
+        self.assertEqual(list(scheduled.exercises.all()), [self.bench])
+        # В календаре — запись, а не повторение правила
+        items = self.scheduled_days()['2026-03-04']
+        self.assertEqual([item['id'] for item in items], [scheduled.pk])
+
+    def test_edit_moves_occurrence(self):
+        response = self.client.patch(
+            self.occurrence('2026-03-04'), {'date': '2026-03-05', 'time': '07:00'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(
+            self.occurrence('2026-03-04'), {'note': 'Легко'}, format='json',
+        )
+        self.assertEqual(response.data['note'], 'Легко')
+        self.assertEqual(ScheduledWorkout.objects.count(), 1)
+
+        days = self.scheduled_days()
+        self.assertNotIn('2026-03-04', days)
+        self.assertEqual(days['2026-03-05'][0]['time'], '07:00:00')
+
+    def test_start_occurrence(self):
+        response = self.client.post(self.occurrence('2026-03-06', 'start/'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ScheduledWorkout.objects.get().workout_id, response.data['workout_id'])
+
+        response = self.client.post(self.occurrence('2026-03-06', 'start/'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_skip_occurrence(self):
+        self.client.post(self.occurrence('2026-03-09', 'complete/'))
+        response = self.client.delete(self.occurrence('2026-03-09'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ScheduledWorkout.objects.exists())
+        self.assertNotIn('2026-03-09', self.scheduled_days())
+
+        response = self.client.post(self.occurrence('2026-03-09', 'complete/'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_not_an_occurrence(self):
+        for url in (self.occurrence('2026-03-03', 'complete/'),
+                    self.occurrence('2026-02-27', 'start/'),
+                    self.occurrence('2026-02-30', 'complete/')):
+            with self.subTest(url=url):
+                response = self.client.post(url)
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(ScheduledWorkout.objects.exists())
+
+    def test_upcoming_includes_occurrences(self):
+        today = timezone.now().date()
+        self.client.patch(f'/api/schedule-rules/{self.rule.pk}/', {
+            'weekdays': list(range(7)), 'start_date': today.isoformat(),
+        }, format='json')
+        response = self.client.get('/api/notifications/upcoming/')
+        self.assertEqual(
+            [item['rule_date'] for item in response.data],
+            [today.isoformat(), (today + timezone.timedelta(days=1)).isoformat()],
+        )
+
+    def test_other_users_rules_hidden(self):
+        other = User.objects.create_user('other', password='test123')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.scheduled_days(), {})
+        response = self.client.post(self.occurrence('2026-03-04', 'complete/'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sync(self):
+        cursor = self.client.get('/api/sync/').data['cursor']
+        self.client.post(self.occurrence('2026-03-04', 'complete/'))
+
+        data = self.client.get(f'/api/sync/?since={cursor}').data
+        self.assertEqual([rule['exceptions'] for rule in data['rules']], [['2026-03-04']])
+        self.assertEqual(len(data['schedule']), 1)
+
+        self.client.delete(f'/api/schedule-rules/{self.rule.pk}/')
+        data = self.client.get(f'/api/sync/?since={data["cursor"]}').data
+        self.assertEqual(data['deleted']['rules'], [self.rule.pk])
+        self.assertIsNone(data['schedule'][0]['rule'])
+
+    def test_dispatcher_reminds_occurrences(self):
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        self.client.patch(f'/api/schedule-rules/{self.rule.pk}/', {
+            'weekdays': [tomorrow.weekday()], 'start_date': timezone.localdate().isoformat(),
+        }, format='json')
+        at = notifications.starts_at(
+            tomorrow, timezone.datetime(2000, 1, 1, 18).time(),
+        ) - timezone.timedelta(minutes=30)
+
+        now = [at - timezone.timedelta(hours=1)]
+        channel = FailingChannel(0)
+        dispatcher = notifications.Dispatcher(channel=channel, clock=lambda: now[0])
+        dispatcher.start()
+        self.assertIn(('rule', self.rule.pk, tomorrow), dispatcher.pending)
+
+        now[0] = at
+        dispatcher.tick()
+        notification = Notification.objects.get()
+        self.assertEqual((notification.rule_id, notification.rule_date), (self.rule.pk, tomorrow))
+        self.assertIsNone(notification.scheduled_id)
+
+        restarted = notifications.Dispatcher(channel=channel, clock=lambda: now[0])
+        restarted.start()
+        restarted.tick()
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_dispatcher_no_repeat_after_materialize(self):
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        self.client.patch(f'/api/schedule-rules/{self.rule.pk}/', {
+            'weekdays': [tomorrow.weekday()], 'start_date': timezone.localdate().isoformat(),
+        }, format='json')
+        at = notifications.starts_at(
+            tomorrow, timezone.datetime(2000, 1, 1, 18).time(),
+        ) - timezone.timedelta(minutes=30)
+        now = [at]
+        channel = FailingChannel(0)
+        dispatcher = notifications.Dispatcher(channel=channel, clock=lambda: now[0])
+        dispatcher.start()
+        dispatcher.tick()
+        self.assertEqual(len(channel.sent), 1)
+
+        # Правка повторения после напоминания: запись с тем же remind_at
+        self.client.patch(self.occurrence(tomorrow.isoformat()), {'note': 'Легко'}, format='json')
+        now[0] = at + timezone.timedelta(minutes=1)
+        dispatcher.tick()
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(len(channel.sent), 1)
+
+    def test_dispatcher_skips_started(self):
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        scheduled = ScheduledWorkout.objects.create(
+            user=self.user, date=tomorrow, time=timezone.datetime(2000, 1, 1, 18).time(),
+            title='Ноги', notify_before=30,
+        )
+        self.client.post(f'/api/schedule/{scheduled.pk}/start/')
+        now = [notifications.remind_at(
+            {'date': tomorrow, 'time': scheduled.time, 'notify_before': 30},
+        )]
+        dispatcher = notifications.Dispatcher(channel=FailingChannel(0), clock=lambda: now[0])
+        dispatcher.start()
+        self.assertNotIn(('schedule', scheduled.pk), dispatcher.pending)
+        dispatcher.tick()
+        self.assertFalse(Notification.objects.exists())
+
+    def test_dispatcher_follows_rule_changes(self):
+        tomorrow = timezone.localdate() + timezone.timedelta(days=1)
+        now = [timezone.now()]
+        dispatcher = notifications.Dispatcher(channel=FailingChannel(0), clock=lambda: now[0])
+        dispatcher.start()
+        self.assertFalse([key for key in dispatcher.pending if key[0] == 'rule' and key[2] == tomorrow])
+
+        self.client.patch(f'/api/schedule-rules/{self.rule.pk}/', {
+            'weekdays': [tomorrow.weekday()], 'start_date': timezone.localdate().isoformat(),
+        }, format='json')
+        dispatcher.tick()
+        self.assertIn(('rule', self.rule.pk, tomorrow), dispatcher.pending)
+
+        self.client.delete(self.occurrence(tomorrow.isoformat()))
+        dispatcher.tick()
+        self.assertNotIn(('rule', self.rule.pk, tomorrow), dispatcher.pending)
+
+
+class BatchAPITest(APITestCase):
+    """Тесты пакетных запросов POST /api/batch/."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}',
+        )
+        self.exercise = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        self.workout = Workout.objects.create(user=self.user)
+        WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.exercise, weight=80, reps=10,
+        )
+        ScheduledWorkout.objects.create(user=self.user, date=timezone.localdate(), title='Грудь')
+
+    def batch(self, *requests, **options):
+        return self.client.post(
+            '/api/batch/', {'requests': list(requests), **options}, format='json',
+        )
+
+    def test_launch_requests_match_direct_calls(self):
+        response = self.batch(*({'method': 'GET', 'path': path} for path in bench.LAUNCH_PATHS))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for path, result in zip(bench.LAUNCH_PATHS, response.json()['responses']):
+            with self.subTest(path=path):
+                direct = self.client.get(path)
+                self.assertEqual(result['status'], direct.status_code)
+                self.assertEqual(result['body'], direct.json())
+
+    def test_authenticates_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.batch(
+                {'method': 'GET', 'path': '/api/workouts/'},
+                {'method': 'GET', 'path': '/api/schedule/'},
+                {'method': 'GET', 'path': f'/api/workouts/{self.workout.pk}/'},
+            )
+        self.assertEqual(
+            [result['status'] for result in response.data['responses']], [200, 200, 200],
+        )
+        users = [q for q in ctx.captured_queries if 'FROM "auth_user"' in q['sql']]
+        self.assertEqual(len(users), 1)
+
+    def test_query_string_and_body(self):
+        response = self.batch(
+            {'method': 'POST', 'path': '/api/sets/', 'body': {
+                'workout': self.workout.pk, 'exercise': self.exercise.pk,
+                'weight': 100, 'reps': 5,
+            }},
+            {'method': 'GET', 'path': '/api/analytics/heatmap/?metric=volume'},
+        )
+        created, heatmap = response.data['responses']
+        self.assertEqual(created['status'], status.HTTP_201_CREATED)
+        self.assertEqual(created['body']['weight'], 100)
+        self.assertEqual(heatmap['body']['metric'], 'volume')
+        self.assertEqual(max(heatmap['body']['values']), 1300)
+
+    def test_writes_without_atomic_are_independent(self):
+        response = self.batch(
+            {'method': 'POST', 'path': '/api/workouts/', 'body': {'note': 'Утро'}},
+            {'method': 'POST', 'path': '/api/sets/', 'body': {'workout': self.workout.pk}},
+            {'method': 'GET', 'path': '/api/workouts/'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['status'] for result in response.data['responses']], [201, 400, 200],
+        )
+        self.assertEqual(Workout.objects.count(), 2)
+
+    def test_atomic_rolls_back_on_error(self):
+        response = self.batch(
+            {'method': 'POST', 'path': '/api/workouts/', 'body': {'note': 'Утро'}},
+            {'method': 'DELETE', 'path': f'/api/workouts/{self.workout.pk}/'},
+            {'method': 'PATCH', 'path': '/api/workouts/999999/', 'body': {'note': 'x'}},
+            {'method': 'GET', 'path': '/api/workouts/'},
+            atomic=True,
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [result['status'] for result in response.data['responses']], [201, 204, 404],
+        )
+        self.assertEqual(list(Workout.objects.values_list('pk', flat=True)), [self.workout.pk])
+
+    def test_atomic_commits(self):
+        response = self.batch(
+            {'method': 'POST', 'path': '/api/workouts/', 'body': {'note': 'Утро'}},
+            {'method': 'DELETE', 'path': f'/api/workouts/{self.workout.pk}/'},
+            atomic=True,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Workout.objects.values_list('note', flat=True)), ['Утро'])
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_limit(self):
+        response = self.batch(*[{'method': 'GET', 'path': '/api/workouts/'}] * 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_items(self):
+        for body in ({}, {'requests': []}, {'requests': {'method': 'GET'}}):
+            with self.subTest(body=body):
+                response = self.client.post('/api/batch/', body, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.batch(
+            {'method': 'GET', 'path': '/api/workouts/'},
+            {'method': 'HEAD', 'path': '/api/workouts/'},
+            {'method': 'GET', 'path': '/admin/'},
+        )
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+
+    def test_routes_not_available_in_batch(self):
+        response = self.batch(
+            {'method': 'GET', 'path': '/api/missing/'},
+            {'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}},
+            {'method': 'GET', 'path': '/api/export/?format=csv'},
+        )
+        self.assertEqual(
+            [result['status'] for result in response.data['responses']], [404, 400, 400],
+        )
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        response = self.batch({'method': 'GET', 'path': '/api/workouts/'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(NPLUSONE_DETECTION=True, NPLUSONE_RAISE=True, NPLUSONE_THRESHOLD=3)
+    def test_repeated_subrequests_are_not_n_plus_one(self):
+        path = f'/api/workouts/{self.workout.pk}/'
+        response = self.batch(*[{'method': 'GET', 'path': path}] * 4)
+        self.assertEqual(
+            [result['status'] for result in response.data['responses']], [200] * 4,
+        )
+
+
+class PartitionsTest(APITestCase):
+    """Тесты секционирования подходов и архива (на SQLite — без секций)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('athlete', password='test123')
+        self.bench = Exercise.objects.create(name='Жим лежа', muscle_group='CHEST')
+        self.squat = Exercise.objects.create(name='Присед', muscle_group='QUADS')
+        self.workout = Workout.objects.create(user=self.user)
+        for exercise, weight, reps in (
+            (self.bench, 80, 10), (self.bench, 100, 5), (self.squat, 120, 5),
+        ):
+            WorkoutSet.objects.create(
+                workout=self.workout, exercise=exercise, weight=weight, reps=reps,
+            )
+
+    def archive(self, sets):
+        """Как partitions.archive(): сводки в ArchivedSets, подходы — мимо сигналов."""
+        for row in sets.values('workout', 'exercise').annotate(
+            sets_count=Count('id'), total_reps=Sum('reps'),
+            volume=Sum(F('weight') * F('reps')),
+            max_weight=Max('weight'), last_set_at=Max('created_at'),
+            best_e1rm=Max(F('weight') * (1 + F('reps') / 30.0)),
+            best_volume=Max(F('weight') * F('reps')),
+        ).order_by():
+            ArchivedSets.objects.create(
+                workout_id=row['workout'], exercise_id=row['exercise'],
+                sets_count=row['sets_count'], reps=row['total_reps'],
+                volume=row['volume'], max_weight=row['max_weight'],
+                best_e1rm=row['best_e1rm'], best_volume=row['best_volume'],
+                last_set_at=row['last_set_at'],
+            )
+        ids = list(sets.values_list('pk', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {WorkoutSet._meta.db_table} '
+                f'WHERE id IN ({", ".join(["%s"] * len(ids))})',
+                ids,
+            )
+
+    def totals(self):
+        return Workout.objects.values_list(*Workout.TOTAL_FIELDS).get(pk=self.workout.pk)
+
+    def daily(self):
+        return list(DailyVolume.objects.values_list('date', 'volume', 'sets_count'))
+
+    def test_month_helpers(self):
+        # 01:00 1 февраля по Москве — ещё январь в UTC
+        moment = timezone.make_aware(timezone.datetime(2026, 2, 1, 1, 0))
+        self.assertEqual(partitions.month_start(moment), timezone.datetime(2026, 1, 1).date())
+        month = timezone.datetime(2026, 11, 1).date()
+        self.assertEqual(partitions.add_months(month, 3), timezone.datetime(2027, 2, 1).date())
+        self.assertEqual(partitions.add_months(month, -11), timezone.datetime(2025, 12, 1).date())
+
+        name = partitions.partition_name(month)
+        self.assertEqual(name, 'workouts_workoutset_y2026m11')
+        self.assertEqual(partitions.partition_month(name), month)
+        self.assertIsNone(partitions.partition_month(partitions.DEFAULT_PARTITION))
+
+    @override_settings(WORKOUTSET_PARTITIONING=True)
+    def test_sqlite_stays_unpartitioned(self):
+        self.assertFalse(partitions.enabled())
+        self.assertFalse(partitions.is_partitioned())
+        self.assertIsNone(partitions.prepare())
+        with self.assertRaises(CommandError):
+            call_command('partitions', '--archive', stdout=StringIO())
+
+    def test_archive_keeps_totals_and_daily_volume(self):
+        before = self.totals(), self.daily()
+        self.archive(WorkoutSet.objects.filter(exercise=self.bench))
+        self.assertEqual((self.totals(), self.daily()), before)
+
+        rollups.rebuild_daily_volume()
+        rollups.rebuild_workout_totals()
+        self.assertEqual((self.totals(), self.daily()), before)
+
+        # Только архив: день и итоги тренировки тоже остаются
+        self.archive(WorkoutSet.objects.all())
+        rollups.rebuild_daily_volume()
+        rollups.rebuild_workout_totals()
+        self.assertEqual((self.totals(), self.daily()), before)
+
+    def test_archive_keeps_calendar_summary(self):
+        today = timezone.localdate()
+        before = build_calendar_summary(self.user, today, today)
+        self.archive(WorkoutSet.objects.all())
+        self.assertEqual(build_calendar_summary(self.user, today, today), before)
+        self.assertEqual((before[0]['sets'], before[0]['volume']), (3, 1900.0))
+
+    def test_live_sets_next_to_archive(self):
+        self.archive(WorkoutSet.objects.filter(exercise=self.bench))
+        live = WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.bench, weight=60, reps=12,
+        )
+        self.assertEqual(self.totals(), (4, 2620.0, 2, live.created_at))
+
+        WorkoutSet.objects.filter(exercise=self.squat).get().delete()
+        self.assertEqual(self.totals(), (3, 2020.0, 1, live.created_at))
+
+    def records(self):
+        return {
+            row[0]: row[1:] for row in PersonalRecord.objects.filter(user=self.user)
+            .values_list('exercise_id', 'max_weight', 'best_e1rm', 'best_volume')
+        }
+
+    def test_import_keeps_archived_records(self):
+        before = self.records()
+        self.archive(WorkoutSet.objects.all())
+
+        # Импорт пересобирает рекорды пользователя целиком
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/import/', {
+            'file': SimpleUploadedFile('strong.csv', STRONG_CSV.encode(), content_type='text/csv'),
+        }, format='multipart')
+        self.assertTrue(json.loads(b''.join(response.streaming_content).splitlines()[-1])['done'])
+
+        self.assertEqual({key: self.records()[key] for key in before}, before)
+
+    def test_recompute_falls_back_to_archive(self):
+        before = self.records()[self.bench.pk]
+        self.archive(WorkoutSet.objects.filter(exercise=self.bench))
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.records()[self.bench.pk], before)
+
+        # Живой подход лучше архива, потом удаляется — рекорд снова из архива
+        best = WorkoutSet.objects.create(
+            workout=self.workout, exercise=self.bench, weight=150, reps=1,
+        )
+        self.assertEqual(self.records()[self.bench.pk][0], 150)
+        best.delete()
+        self.assertEqual(self.records()[self.bench.pk], before)
+        self.assertIsNone(PersonalRecord.objects.get(exercise=self.bench).max_weight_set_id)
+
+    def test_delete_subtracts_archive(self):
+        self.archive(WorkoutSet.objects.filter(exercise=self.bench))
+        self.bench.delete()
+        self.assertEqual(self.totals()[:3], (1, 600.0, 1))
+        self.assertEqual([row[1:] for row in self.daily()], [(600.0, 1)])
+
+        self.archive(WorkoutSet.objects.all())
+        self.workout.delete()
+        self.assertEqual(self.daily(), [])
+        self.assertFalse(ArchivedSets.objects.exists())
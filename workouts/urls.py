@@ -1,28 +1,64 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import AsyncNotificationStreamView
 from .views import (
     ExerciseViewSet,
     WorkoutViewSet,
     WorkoutSetViewSet,
     ScheduledWorkoutViewSet,
+    ScheduleRuleViewSet,
     CalendarView,
     UpcomingNotificationsView,
+    NotificationStreamTicketView,
     VolumeAnalyticsView,
     MaxWeightAnalyticsView,
     PersonalRecordsView,
+    MuscleAnalyticsView,
+    LoadAnalyticsView,
+    HeatmapView,
+    ExportView,
+    ImportView,
+    SyncView,
+    BatchView,
 )
 
+if settings.ASYNC_VIEWS:
+    from .async_views import (
+        AsyncCalendarView as CalendarView,
+        AsyncUpcomingNotificationsView as UpcomingNotificationsView,
+        AsyncVolumeAnalyticsView as VolumeAnalyticsView,
+        AsyncMaxWeightAnalyticsView as MaxWeightAnalyticsView,
+        AsyncPersonalRecordsView as PersonalRecordsView,
+        AsyncMuscleAnalyticsView as MuscleAnalyticsView,
+        AsyncLoadAnalyticsView as LoadAnalyticsView,
+        AsyncHeatmapView as HeatmapView,
+    )
+
 router = DefaultRouter()
 router.register('exercises', ExerciseViewSet, basename='exercise')
 router.register('workouts', WorkoutViewSet, basename='workout')
 router.register('sets', WorkoutSetViewSet, basename='workoutset')
 router.register('schedule', ScheduledWorkoutViewSet, basename='schedule')
+router.register('schedule-rules', ScheduleRuleViewSet, basename='schedulerule')
 
 urlpatterns = router.urls + [
     path('calendar/', CalendarView.as_view(), name='calendar'),
     path('notifications/upcoming/', UpcomingNotificationsView.as_view(), name='notifications-upcoming'),
+    path('notifications/stream/', AsyncNotificationStreamView.as_view(), name='notifications-stream'),
+    path(
+        'notifications/stream/ticket/', NotificationStreamTicketView.as_view(),
+        name='notifications-stream-ticket',
+    ),
     path('analytics/volume/', VolumeAnalyticsView.as_view(), name='analytics-volume'),
     path('analytics/max/', MaxWeightAnalyticsView.as_view(), name='analytics-max'),
     path('analytics/records/', PersonalRecordsView.as_view(), name='analytics-records'),
+    path('analytics/muscles/', MuscleAnalyticsView.as_view(), name='analytics-muscles'),
+    path('analytics/load/', LoadAnalyticsView.as_view(), name='analytics-load'),
+    path('analytics/heatmap/', HeatmapView.as_view(), name='analytics-heatmap'),
+    path('export/', ExportView.as_view(), name='export'),
+    path('import/', ImportView.as_view(), name='import'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('batch/', BatchView.as_view(), name='batch'),
 ]
@@ -1,44 +1,151 @@
+import hashlib
+import io
+import json
+import re
+from calendar import isleap
 from collections import defaultdict
-from datetime import date, timedelta
+from contextlib import closing
+from datetime import date, datetime, time, timedelta
 
-from django.db.models import Sum, Max, F
-from django.db.models.functions import TruncDate
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateField, F, Max, Q, Sum
+from django.db.models.functions import TruncDate, TruncWeek
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Exercise, ScheduledWorkout, Workout, WorkoutSet
+from . import batch, catalog, export, load, metrics, notifications, readers, recurrence, sync
+from .cache import (
+    CATALOG_SCOPE,
+    exercises_scope,
+    get_or_build,
+    get_version,
+    user_scope,
+    volume_scope,
+)
+from .importers import HistoryImporter, ImportFormatError
+from .models import (
+    DailyVolume,
+    Exercise,
+    PersonalRecord,
+    ScheduledWorkout,
+    ScheduleRule,
+    Workout,
+    WorkoutSet,
+)
 from .serializers import (
+    BatchItemSerializer,
+    BulkSetItemSerializer,
     ExerciseSerializer,
     ScheduledWorkoutSerializer,
+    ScheduleRuleSerializer,
     WorkoutListSerializer,
     WorkoutDetailSerializer,
     WorkoutSetSerializer,
+    sets_prefetch,
 )
+from .signals import bulk_sets_created
+
+
+class AtomicWritesMixin:
+    """
+    Пишущие запросы — в одной транзакции: номер изменения (sync.py)
+    и сама запись коммитятся вместе, ответ с ошибкой откатывает всё.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code >= 400:
+                transaction.set_rollback(True)
+        return response
+
+
+class ReaderListMixin:
+    """list() через читатель (readers.py) вместо сериализатора, с той же пагинацией."""
+    reader = None
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.reader.build(page))
+        return Response(self.reader.build(list(queryset)))
 
-class ExerciseViewSet(viewsets.ModelViewSet):
-    """CRUD для упражнений."""
+
+class ExerciseViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
+    """
+    CRUD для упражнений.
+
+    Список собирается из справочника в памяти процесса (catalog.py)
+    и упражнений пользователя и отдаётся с ETag: при совпадении
+    If-None-Match ответ — 304 без обращения к БД.
+    """
     serializer_class = ExerciseSerializer
+    ordering = catalog.ORDERING
 
     def get_queryset(self):
         return Exercise.objects.filter(
-            user__isnull=True,
-        ) | Exercise.objects.filter(user=self.request.user)
+            Q(user__isnull=True) | Q(user=self.request.user),
+        )
+
+    def _list_etag(self, request):
+        # Ответ зависит от справочника, упражнений пользователя,
+        # страницы (курсор, page_size) и формата
+        key = ':'.join(map(str, (
+            catalog.version(),
+            get_version(exercises_scope(request.user.pk)),
+            request.get_full_path(),
+            request.accepted_renderer.format,
+        )))
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        etag = self._list_etag(request)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=304, headers={'ETag': etag})
+
+        exercises = catalog.exercises_for(request.user)
+        page = self.paginate_queryset(exercises)
+        if page is not None:
+            response = self.get_paginated_response(
+                self.get_serializer(page, many=True).data,
+            )
+        else:
+            response = Response(self.get_serializer(exercises, many=True).data)
+        response['ETag'] = etag
+        return response
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user, is_custom=True)
 
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+class WorkoutViewSet(AtomicWritesMixin, ReaderListMixin, viewsets.ModelViewSet):
     """CRUD для тренировок."""
+    ordering = ('-start_time', '-id')
+    reader = readers.workouts
 
     def get_queryset(self):
-        return Workout.objects.filter(
-            user=self.request.user,
-        ).prefetch_related('sets', 'sets__exercise')
+        queryset = Workout.objects.filter(user=self.request.user)
+        # Подходы нужны только подробному ответу: итоги списка
+        # хранятся в самой тренировке (rollups.py)
+        if self.action in ('retrieve', 'finish'):
+            queryset = queryset.prefetch_related(sets_prefetch())
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -57,10 +164,90 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         workout.save()
         return Response(WorkoutDetailSerializer(workout).data)
 
+    @action(detail=True, methods=['post'], url_path='sets/bulk')
+    def bulk_sets(self, request, pk=None):
+        """
+        POST /api/workouts/{id}/sets/bulk/ — записать пачку подходов.
+
+        Принимает массив [{exercise, weight, reps, rir}], проверяет всю
+        пачку (одним запросом — доступность упражнений) и вставляет её
+        одним bulk_create в транзакции: либо все подходы, либо ни одного.
+        """
+        workout = self.get_object()
+        items = request.data
+
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Ожидается непустой массив подходов'}, status=400,
+            )
+        if len(items) > settings.BULK_SETS_MAX_BATCH:
+            return Response(
+                {'error': f'Не больше {settings.BULK_SETS_MAX_BATCH} подходов за запрос'},
+                status=400,
+            )
+
+        # Валидация по элементам: ошибки возвращаются с индексом подхода
+        child = BulkSetItemSerializer()
+        validated, errors = [], []
+        for item in items:
+            try:
+                validated.append(child.run_validation(item))
+                errors.append({})
+            except ValidationError as exc:
+                validated.append(None)
+                errors.append(exc.detail)
+
+        # Доступность упражнений: общие — по справочнику в памяти,
+        # остальные — одним запросом на всю пачку
+        requested = {value['exercise'] for value in validated if value}
+        allowed = {pk for pk in requested if catalog.contains(pk)}
+        if requested - allowed:
+            allowed.update(
+                Exercise.objects
+                .filter(user=request.user, pk__in=requested - allowed)
+                .order_by()
+                .values_list('pk', flat=True)
+            )
+        for index, value in enumerate(validated):
+            if value and value['exercise'] not in allowed:
+                errors[index] = {'exercise': ['Упражнение не найдено']}
+
+        failed = [
+            {'index': index, **item_errors}
+            for index, item_errors in enumerate(errors) if item_errors
+        ]
+        if failed:
+            return Response({'errors': failed}, status=400)
+
+        with transaction.atomic():
+            # bulk_create не вызывает pre_save: номер изменения — один на пачку
+            seq = sync.next_seq(request.user.pk)
+            sets = WorkoutSet.objects.bulk_create([
+                WorkoutSet(
+                    workout=workout,
+                    exercise_id=value['exercise'],
+                    weight=value['weight'],
+                    reps=value['reps'],
+                    rir=value.get('rir'),
+                    seq=seq,
+                )
+                for value in validated
+            ])
+            sync.touch_workouts([workout.pk], seq)
+            bulk_sets_created.send(sender=WorkoutSet, workout=workout, sets=sets)
 
-class WorkoutSetViewSet(viewsets.ModelViewSet):
+        return Response({
+            'workout': workout.pk,
+            'count': len(sets),
+            'ids': [s.pk for s in sets],
+        }, status=201)
+
+
+class WorkoutSetViewSet(AtomicWritesMixin, ReaderListMixin, viewsets.ModelViewSet):
     """CRUD для подходов."""
     serializer_class = WorkoutSetSerializer
+    ordering = ('created_at', 'id')
+    reader = readers.sets
 
     def get_queryset(self):
         return WorkoutSet.objects.filter(
@@ -72,9 +259,11 @@ class WorkoutSetViewSet(viewsets.ModelViewSet):
 # Расписание тренировок
 # ============================================================
 
-class ScheduledWorkoutViewSet(viewsets.ModelViewSet):
+class ScheduledWorkoutViewSet(AtomicWritesMixin, ReaderListMixin, viewsets.ModelViewSet):
     """CRUD для запланированных тренировок."""
     serializer_class = ScheduledWorkoutSerializer
+    ordering = ('date', 'time', 'id')
+    reader = readers.scheduled
 
     def get_queryset(self):
         return ScheduledWorkout.objects.filter(
@@ -87,10 +276,7 @@ class ScheduledWorkoutViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """POST /api/schedule/{id}/complete/ — отметить как выполненную."""
-        scheduled = self.get_object()
-        scheduled.is_completed = True
-        scheduled.save()
-        return Response(ScheduledWorkoutSerializer(scheduled).data)
+        return complete_scheduled(self.get_object())
 
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
@@ -98,98 +284,371 @@ class ScheduledWorkoutViewSet(viewsets.ModelViewSet):
         POST /api/schedule/{id}/start/ — начать тренировку из расписания.
         Создаёт реальную Workout и привязывает к расписанию.
         """
-        scheduled = self.get_object()
+        return start_scheduled(request.user, self.get_object())
 
-        if scheduled.workout:
-            return Response(
-                {'error': 'Тренировка уже начата'},
-                status=400,
-            )
 
-        workout = Workout.objects.create(user=request.user)
-        scheduled.workout = workout
-        scheduled.save()
+def complete_scheduled(scheduled):
+    scheduled.is_completed = True
+    scheduled.save()
+    return Response(ScheduledWorkoutSerializer(scheduled).data)
 
-        return Response({
-            'scheduled': ScheduledWorkoutSerializer(scheduled).data,
-            'workout_id': workout.pk,
-        }, status=201)
+
+def start_scheduled(user, scheduled):
+    if scheduled.workout:
+        return Response(
+            {'error': 'Тренировка уже начата'},
+            status=400,
+        )
+
+    workout = Workout.objects.create(user=user)
+    scheduled.workout = workout
+    scheduled.save()
+
+    return Response({
+        'scheduled': ScheduledWorkoutSerializer(scheduled).data,
+        'workout_id': workout.pk,
+    }, status=201)
+
+
+class ScheduleRuleViewSet(AtomicWritesMixin, ReaderListMixin, viewsets.ModelViewSet):
+    """
+    CRUD для правил повторения (см. recurrence.py).
+
+    Повторение адресуется датой: /api/schedule-rules/{id}/occurrences/{date}/.
+    Изменение, начало или выполнение повторения создаёт для него
+    запись расписания; удаление пропускает повторение.
+    """
+    serializer_class = ScheduleRuleSerializer
+    ordering = ('start_date', 'id')
+    reader = readers.rules
+
+    def get_queryset(self):
+        return ScheduleRule.objects.filter(
+            user=self.request.user,
+        ).prefetch_related('exercises')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def _occurrence(self, day, **fields):
+        """Запись расписания повторения (None — такого повторения нет)."""
+        try:
+            day = date.fromisoformat(day)
+        except ValueError:
+            return None
+        return recurrence.materialize(self.get_object(), day, **fields)
+
+    @action(
+        detail=True, methods=['put', 'patch', 'delete'],
+        url_path=r'occurrences/(?P<day>\d{4}-\d{2}-\d{2})', url_name='occurrence',
+    )
+    def occurrence(self, request, pk=None, day=None):
+        """
+        PUT/PATCH /api/schedule-rules/{id}/occurrences/{date}/ — изменить повторение,
+        DELETE — пропустить его.
+        """
+        if request.method == 'DELETE':
+            try:
+                skipped = recurrence.skip(self.get_object(), date.fromisoformat(day))
+            except ValueError:
+                skipped = False
+            if not skipped:
+                return Response({'error': 'Повторение не найдено'}, status=404)
+            return Response(status=204)
+
+        scheduled = self._occurrence(day)
+        if scheduled is None:
+            return Response({'error': 'Повторение не найдено'}, status=404)
+        serializer = ScheduledWorkoutSerializer(
+            scheduled, data=request.data, partial=request.method == 'PATCH',
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    @action(
+        detail=True, methods=['post'],
+        url_path=r'occurrences/(?P<day>\d{4}-\d{2}-\d{2})/complete',
+        url_name='occurrence-complete',
+    )
+    def complete_occurrence(self, request, pk=None, day=None):
+        """POST /api/schedule-rules/{id}/occurrences/{date}/complete/"""
+        # Новая запись сразу создаётся выполненной
+        scheduled = self._occurrence(day, is_completed=True)
+        if scheduled is None:
+            return Response({'error': 'Повторение не найдено'}, status=404)
+        return Response(ScheduledWorkoutSerializer(scheduled).data)
+
+    @action(
+        detail=True, methods=['post'],
+        url_path=r'occurrences/(?P<day>\d{4}-\d{2}-\d{2})/start',
+        url_name='occurrence-start',
+    )
+    def start_occurrence(self, request, pk=None, day=None):
+        """POST /api/schedule-rules/{id}/occurrences/{date}/start/"""
+        scheduled = self._occurrence(day)
+        if scheduled is None:
+            return Response({'error': 'Повторение не найдено'}, status=404)
+        return start_scheduled(request.user, scheduled)
 
 
 # ============================================================
 # Календарь
+#
+# Выборки и форматирование вынесены в функции: их же используют
+# асинхронные варианты представлений (async_views.py).
 # ============================================================
 
+def _day_start(day):
+    """Начало локального дня (TIME_ZONE) как aware datetime."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def calendar_range(params):
+    """Период календаря из ?start=&end= (по умолчанию — текущий месяц)."""
+    start_str = params.get('start')
+    end_str = params.get('end')
+
+    if start_str and end_str:
+        return date.fromisoformat(start_str), date.fromisoformat(end_str)
+
+    today = date.today()
+    start = today.replace(day=1)
+    # Последний день месяца
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def calendar_workouts(user, start, end):
+    """Выполненные тренировки за период."""
+    # Границы — моменты времени, а не start_time__date:
+    # так работает индекс (user, start_time)
+    return (
+        Workout.objects.filter(
+            user=user,
+            start_time__gte=_day_start(start),
+            start_time__lt=_day_start(end + timedelta(days=1)),
+        )
+        .order_by('start_time')
+    )
+
+
+def calendar_scheduled(user, start, end):
+    """Запланированные тренировки за период."""
+    return (
+        ScheduledWorkout.objects.filter(
+            user=user,
+            date__gte=start,
+            date__lte=end,
+        )
+        .order_by('date', 'time')
+    )
+
+
+def calendar_rules(user, start, end):
+    """Правила повторения, действующие в период [start, end]."""
+    return (
+        ScheduleRule.objects.filter(user=user, start_date__lte=end)
+        .filter(Q(last_date__isnull=True) | Q(last_date__gte=start))
+        .order_by('start_date', 'id')
+    )
+
+
+def calendar_days(start, end, workouts, scheduled, rules=()):
+    """
+    Дни периода [start, end] из строк читателей (readers.workouts,
+    readers.scheduled, readers.rules). Повторения правил
+    разворачиваются только для этого периода.
+
+    День тренировки — дата её начала в локальной зоне: start_time
+    в строке уже переведён в неё, поэтому берётся префикс ISO-строки.
+    """
+    days = defaultdict(lambda: {'completed': [], 'scheduled': []})
+
+    for w in workouts:
+        days[w['start_time'][:10]]['completed'].append(w)
+
+    for s in recurrence.merge(scheduled, recurrence.expand(rules, start, end)):
+        days[s['date']]['scheduled'].append(s)
+
+    result = []
+    current = start
+    while current <= end:
+        day_data = days.get(current.isoformat(), {'completed': [], 'scheduled': []})
+        result.append({
+            'date': current.isoformat(),
+            'has_workout': bool(day_data['completed']),
+            'has_scheduled': bool(day_data['scheduled']),
+            'completed_workouts': day_data['completed'],
+            'scheduled': day_data['scheduled'],
+        })
+        current += timedelta(days=1)
+
+    return result
+
+
+def build_calendar(user, start, end):
+    """Дни периода [start, end]: выполненные тренировки и расписание."""
+    return calendar_days(
+        start, end,
+        readers.workouts.read(calendar_workouts(user, start, end)),
+        readers.scheduled.read(calendar_scheduled(user, start, end)),
+        readers.rules.read(calendar_rules(user, start, end)),
+    )
+
+
+# Поля правила, нужные для подсчёта повторений (recurrence.pattern)
+RULE_PATTERN_FIELDS = ('start_date', 'weekdays', 'interval', 'until', 'count', 'exceptions')
+
+CALENDAR_VIEWS = ('full', 'summary')
+
+
+def summary_workouts(user, start, end):
+    """
+    Тренировки, подходы и тоннаж по локальным дням периода — один GROUP BY
+    по итогам тренировок: без соединения с подходами, и архивные месяцы
+    (ArchivedSets) учитываются так же, как живые.
+    """
+    return (
+        calendar_workouts(user, start, end)
+        .annotate(day=TruncDate('start_time'))
+        .values('day')
+        .annotate(
+            workouts=Count('id'),
+            sets_count=Sum('total_sets'),
+            volume=Sum('total_volume'),
+        )
+        .order_by()
+    )
+
+
+def summary_scheduled(user, start, end):
+    """Запланированные и выполненные записи расписания по дням — один GROUP BY."""
+    return (
+        calendar_scheduled(user, start, end)
+        .values('date')
+        .annotate(
+            scheduled=Count('id'),
+            completed=Count('id', filter=Q(is_completed=True)),
+        )
+        .order_by()
+    )
+
+
+def summary_rules(user, start, end):
+    """Правила периода — только поля, нужные для подсчёта повторений."""
+    return calendar_rules(user, start, end).values(*RULE_PATTERN_FIELDS)
+
+
+def calendar_summary(start, end, workouts, scheduled, rules=()):
+    """
+    Итоги по дням периода [start, end] из строк summary_*: число
+    тренировок, подходов, тоннаж и число запланированных (вместе
+    с повторениями правил) и выполненных записей расписания.
+    """
+    days = defaultdict(lambda: {
+        'workouts': 0, 'sets': 0, 'volume': 0.0, 'scheduled': 0, 'completed': 0,
+    })
+
+    for row in workouts:
+        day = days[row['day']]
+        day['workouts'] = row['workouts']
+        day['sets'] = row['sets_count']
+        day['volume'] = round(row['volume'] or 0, 1)
+
+    for row in scheduled:
+        days[row['date']]['scheduled'] += row['scheduled']
+        days[row['date']]['completed'] += row['completed']
+
+    for rule in rules:
+        for day in recurrence.occurrences(recurrence.pattern(rule), start, end):
+            days[day]['scheduled'] += 1
+
+    result = []
+    current = start
+    while current <= end:
+        result.append({'date': current.isoformat(), **days[current]})
+        current += timedelta(days=1)
+
+    return result
+
+
+def build_calendar_summary(user, start, end):
+    """Итоги по дням периода [start, end] (?view=summary)."""
+    return calendar_summary(
+        start, end,
+        summary_workouts(user, start, end),
+        summary_scheduled(user, start, end),
+        summary_rules(user, start, end),
+    )
+
+
 class CalendarView(APIView):
     """
     GET /api/calendar/?start=2026-02-01&end=2026-02-28
 
     Возвращает данные по дням: выполненные тренировки + расписание.
+    С ?view=summary — только итоги дня (тренировки, подходы, тоннаж,
+    запланировано и выполнено) без вложенных записей; подробности
+    дня клиент запрашивает отдельно, с start=end.
+    Готовый ответ кешируется по версии данных пользователя
+    и пересобирается только после записи (см. cache.py).
     """
 
     def get(self, request):
-        start_str = request.query_params.get('start')
-        end_str = request.query_params.get('end')
-
-        if start_str and end_str:
-            start = date.fromisoformat(start_str)
-            end = date.fromisoformat(end_str)
-        else:
-            today = date.today()
-            start = today.replace(day=1)
-            # Последний день месяца
-            next_month = (start + timedelta(days=32)).replace(day=1)
-            end = next_month - timedelta(days=1)
-
-        # Выполненные тренировки за период
-        workouts = (
-            Workout.objects.filter(
-                user=request.user,
-                start_time__date__gte=start,
-                start_time__date__lte=end,
+        start, end = calendar_range(request.query_params)
+        view = request.query_params.get('view', 'full')
+        if view not in CALENDAR_VIEWS:
+            return Response(
+                {'error': f'view: одно из {", ".join(CALENDAR_VIEWS)}'},
+                status=400,
             )
-            .prefetch_related('sets', 'sets__exercise')
-            .order_by('start_time')
-        )
 
-        # Запланированные тренировки за период
-        scheduled = (
-            ScheduledWorkout.objects.filter(
-                user=request.user,
-                date__gte=start,
-                date__lte=end,
-            )
-            .prefetch_related('exercises')
-            .order_by('date', 'time')
+        if view == 'summary':
+            # Названий упражнений в итогах нет — справочник не влияет
+            return Response(get_or_build(
+                'calendar-summary',
+                (user_scope(request.user.pk),),
+                (start, end),
+                lambda: build_calendar_summary(request.user, start, end),
+                settings.CALENDAR_CACHE_TIMEOUT,
+            ))
+
+        result = get_or_build(
+            'calendar',
+            (user_scope(request.user.pk), CATALOG_SCOPE),
+            (start, end),
+            lambda: build_calendar(request.user, start, end),
+            settings.CALENDAR_CACHE_TIMEOUT,
         )
+        return Response(result)
 
-        # Группировка по дням
-        days = defaultdict(lambda: {'completed': [], 'scheduled': []})
 
-        for w in workouts:
-            d = w.start_time.date()
-            days[d]['completed'].append(WorkoutListSerializer(w).data)
+def upcoming_range():
+    """Дни ближайших 24 часов."""
+    now = timezone.now()
+    return now.date(), (now + timedelta(hours=24)).date()
 
-        for s in scheduled:
-            days[s.date]['scheduled'].append(
-                ScheduledWorkoutSerializer(s).data,
-            )
 
-        # Формируем ответ
-        result = []
-        current = start
-        while current <= end:
-            day_data = days.get(current, {'completed': [], 'scheduled': []})
-            result.append({
-                'date': current.isoformat(),
-                'has_workout': bool(day_data['completed']),
-                'has_scheduled': bool(day_data['scheduled']),
-                'completed_workouts': day_data['completed'],
-                'scheduled': day_data['scheduled'],
-            })
-            current += timedelta(days=1)
+def upcoming_scheduled(user):
+    """Невыполненные тренировки на ближайшие 24 часа."""
+    first, last = upcoming_range()
 
-        return Response(result)
+    return (
+        ScheduledWorkout.objects.filter(
+            user=user,
+            date__gte=first,
+            date__lte=last,
+            is_completed=False,
+        )
+        .order_by('date', 'time')
+    )
+
+
+def upcoming(scheduled, rules):
+    """Записи расписания и повторения правил на ближайшие 24 часа."""
+    return recurrence.merge(scheduled, recurrence.expand(rules, *upcoming_range()))
 
 
 class UpcomingNotificationsView(APIView):
@@ -197,58 +656,182 @@ class UpcomingNotificationsView(APIView):
     GET /api/notifications/upcoming/
 
     Запланированные тренировки на ближайшие 24 часа.
-    Клиент использует notify_before для показа уведомлений.
+    Сами напоминания отправляет сервер (manage.py dispatch_notifications,
+    см. notifications.py); список нужен клиенту для отображения.
     """
 
     def get(self, request):
-        now = timezone.now()
-        tomorrow = now + timedelta(hours=24)
-
-        upcoming = (
-            ScheduledWorkout.objects.filter(
-                user=request.user,
-                date__gte=now.date(),
-                date__lte=tomorrow.date(),
-                is_completed=False,
-            )
-            .prefetch_related('exercises')
-            .order_by('date', 'time')
-        )
+        return Response(upcoming(
+            readers.scheduled.read(upcoming_scheduled(request.user)),
+            readers.rules.read(calendar_rules(request.user, *upcoming_range())),
+        ))
+
+
+class NotificationStreamTicketView(APIView):
+    """
+    POST /api/notifications/stream/ticket/
+
+    Одноразовый пропуск к потоку напоминаний на
+    NOTIFICATION_STREAM_TICKET_SECONDS: EventSource не умеет заголовки,
+    а JWT в ?token= попал бы в журнал доступа.
+    """
 
-        return Response(ScheduledWorkoutSerializer(upcoming, many=True).data)
+    def post(self, request):
+        return Response({
+            'ticket': notifications.issue_stream_ticket(request.user.pk),
+            'expires_in': settings.NOTIFICATION_STREAM_TICKET_SECONDS,
+        }, status=201)
 
 
 # ============================================================
 # Аналитика
 # ============================================================
 
+def volume_rows(user, days):
+    """Тоннаж по дням за последние days дней (из агрегата DailyVolume)."""
+    since = timezone.localdate(timezone.now() - timedelta(days=days))
+
+    # Читаем готовый агрегат: стоимость зависит от числа дней, а не подходов
+    return (
+        DailyVolume.objects
+        .filter(user=user, date__gte=since, sets_count__gt=0)
+        .values('date', 'volume')
+        .order_by('date')
+    )
+
+
+def format_volume(rows):
+    return [
+        {'date': row['date'], 'volume': round(row['volume'], 1)}
+        for row in rows
+    ]
+
+
 class VolumeAnalyticsView(APIView):
     """
     GET /api/analytics/volume/?days=30
 
-    График тоннажа по дням.
+    График тоннажа по дням (из агрегата DailyVolume).
     """
 
     def get(self, request):
-        days = int(request.query_params.get('days', 30))
-        since = timezone.now() - timedelta(days=days)
-
-        data = (
-            WorkoutSet.objects
-            .filter(
-                workout__user=request.user,
-                workout__start_time__gte=since,
-            )
-            .annotate(date=TruncDate('workout__start_time'))
-            .values('date')
-            .annotate(volume=Sum(F('weight') * F('reps')))
-            .order_by('date')
+        days, error = days_option(request.query_params, 30)
+        if error:
+            return Response({'error': error}, status=400)
+        return Response(format_volume(volume_rows(request.user, days)))
+
+
+# Метрика тепловой карты → поле DailyVolume
+HEATMAP_METRICS = {'sets': 'sets_count', 'volume': 'volume'}
+
+
+def heatmap_options(params):
+    """(year, metric) из ?year=&metric= или текст ошибки."""
+    metric = params.get('metric', 'sets')
+    if metric not in HEATMAP_METRICS:
+        return None, f'metric must be one of: {", ".join(HEATMAP_METRICS)}'
+    try:
+        year = int(params.get('year', timezone.localdate().year))
+    except ValueError:
+        return None, 'year must be an integer'
+    if not date.min.year <= year <= date.max.year:
+        return None, 'year out of range'
+    return (year, metric), None
+
+
+def heatmap_rows(user, year, metric):
+    """(дата, значение) дней года с подходами — из агрегата DailyVolume."""
+    # Агрегат уже сгруппирован по локальной дате (TIME_ZONE): строка на день
+    return (
+        DailyVolume.objects
+        .filter(
+            user=user, date__gte=date(year, 1, 1), date__lte=date(year, 12, 31),
+            sets_count__gt=0,
         )
+        .values_list('date', HEATMAP_METRICS[metric])
+        .order_by()
+    )
+
 
-        return Response([
-            {'date': row['date'], 'volume': round(row['volume'], 1)}
-            for row in data
-        ])
+def format_heatmap(year, metric, rows):
+    """Значения всех дней года массивом: values[i] — день start + i."""
+    start = date(year, 1, 1)
+    values = [0] * (366 if isleap(year) else 365)
+    for day, value in rows:
+        # Тоннаж — целыми килограммами: для интенсивности точнее не нужно
+        values[(day - start).days] = round(value)
+    return {
+        'year': year,
+        'metric': metric,
+        'start': start.isoformat(),
+        'max': max(values),
+        'values': values,
+    }
+
+
+class HeatmapView(APIView):
+    """
+    GET /api/analytics/heatmap/?year=2026&metric=sets|volume
+
+    Тепловая карта активности за год: число подходов или тоннаж
+    каждого дня одним массивом. Кешируется по пользователю и году
+    до изменения тоннажа этого года (volume_scope).
+    """
+
+    def get(self, request):
+        options, error = heatmap_options(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+        year, metric = options
+
+        result = get_or_build(
+            'heatmap',
+            (volume_scope(request.user.pk, year),),
+            (metric,),
+            lambda: format_heatmap(year, metric, heatmap_rows(request.user, year, metric)),
+            settings.ANALYTICS_CACHE_TIMEOUT,
+        )
+        return Response(result)
+
+
+def max_weight_options(params):
+    """(exercise_id, days) из ?exercise_id=&days= или текст ошибки."""
+    exercise_id = params.get('exercise_id')
+    if not exercise_id:
+        return None, 'exercise_id is required'
+    try:
+        exercise_id = int(exercise_id)
+    except ValueError:
+        return None, 'exercise_id must be an integer'
+    days, error = days_option(params, 90)
+    if error:
+        return None, error
+    return (exercise_id, days), None
+
+
+def max_weight_rows(user, exercise_id, days):
+    """Максимальный вес по дням для упражнения за последние days дней."""
+    since = timezone.now() - timedelta(days=days)
+
+    return (
+        WorkoutSet.objects
+        .filter(
+            workout__user=user,
+            exercise_id=exercise_id,
+            workout__start_time__gte=since,
+        )
+        .annotate(date=TruncDate('workout__start_time'))
+        .values('date')
+        .annotate(max_weight=Max('weight'))
+        .order_by('date')
+    )
+
+
+def format_max_weight(rows):
+    return [
+        {'date': row['date'], 'max_weight': row['max_weight']}
+        for row in rows
+    ]
 
 
 class MaxWeightAnalyticsView(APIView):
@@ -259,56 +842,402 @@ class MaxWeightAnalyticsView(APIView):
     """
 
     def get(self, request):
-        exercise_id = request.query_params.get('exercise_id')
-        if not exercise_id:
+        options, error = max_weight_options(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+
+        rows = max_weight_rows(request.user, *options)
+        return Response(format_max_weight(rows))
+
+
+def record_rows(user):
+    """Личные рекорды пользователя вместе с подходами-рекордсменами."""
+    return (
+        PersonalRecord.objects
+        .filter(user=user)
+        .values(
+            'exercise_id', 'exercise__name', 'exercise__muscle_group',
+            'max_weight', 'max_weight_set_id',
+            'max_weight_set__workout_id',
+            'best_e1rm', 'best_e1rm_set_id',
+            'best_e1rm_set__workout_id',
+            'best_volume', 'best_volume_set_id',
+            'best_volume_set__workout_id',
+        )
+    )
+
+
+def format_records(rows):
+    # Рекордов не больше, чем упражнений: сортируем в Python,
+    # чтобы запрос шёл по индексу без сортировки по join
+    rows = sorted(rows, key=lambda row: row['exercise__name'])
+
+    return [
+        {
+            'exercise_id': row['exercise_id'],
+            'exercise_name': row['exercise__name'],
+            'muscle_group': row['exercise__muscle_group'],
+            'max_weight': row['max_weight'],
+            'max_weight_set_id': row['max_weight_set_id'],
+            'max_weight_workout_id': row['max_weight_set__workout_id'],
+            'best_e1rm': _round(row['best_e1rm']),
+            'best_e1rm_set_id': row['best_e1rm_set_id'],
+            'best_e1rm_workout_id': row['best_e1rm_set__workout_id'],
+            'best_volume': _round(row['best_volume']),
+            'best_volume_set_id': row['best_volume_set_id'],
+            'best_volume_workout_id': row['best_volume_set__workout_id'],
+        }
+        for row in rows
+    ]
+
+
+class PersonalRecordsView(APIView):
+    """
+    GET /api/analytics/records/
+
+    Личные рекорды по каждому упражнению (из индекса PersonalRecord):
+    максимальный вес, расчётный 1ПМ и тоннаж подхода,
+    плюс подход и тренировка, на которых они установлены.
+    """
+
+    def get(self, request):
+        return Response(format_records(record_rows(request.user)))
+
+
+MUSCLE_BUCKETS = {
+    'day': TruncDate,
+    'week': lambda expression: TruncWeek(expression, output_field=DateField()),
+}
+
+
+def muscle_rows(user, days, bucket):
+    """Подходы, повторения и тоннаж по группам мышц и дням/неделям за days дней."""
+    since = timezone.localdate(timezone.now() - timedelta(days=days))
+
+    # Один GROUP BY по подходам окна: тренировки — по индексу
+    # (user, start_time), их подходы — по (workout, created_at)
+    return (
+        WorkoutSet.objects
+        .filter(workout__user=user, workout__start_time__gte=_day_start(since))
+        .annotate(date=MUSCLE_BUCKETS[bucket]('workout__start_time'))
+        .values('date', 'exercise__muscle_group')
+        .annotate(
+            sets_count=Count('id'),
+            reps_count=Sum('reps'),
+            volume=Sum(F('weight') * F('reps')),
+        )
+        .order_by('date', 'exercise__muscle_group')
+    )
+
+
+def format_muscles(rows):
+    return [
+        {
+            'date': row['date'],
+            'muscle_group': row['exercise__muscle_group'],
+            'sets': row['sets_count'],
+            'reps': row['reps_count'],
+            'volume': round(row['volume'], 1),
+        }
+        for row in rows
+    ]
+
+
+# Дальше начало окна аналитики выходит за пределы date
+MAX_ANALYTICS_DAYS = 100 * 365
+
+
+def days_option(params, default):
+    """?days= как целое от 0 до MAX_ANALYTICS_DAYS или текст ошибки."""
+    try:
+        days = int(params.get('days', default))
+    except ValueError:
+        return None, 'days must be an integer'
+    if not 0 <= days <= MAX_ANALYTICS_DAYS:
+        return None, f'days must be between 0 and {MAX_ANALYTICS_DAYS}'
+    return days, None
+
+
+def muscle_options(params):
+    """(days, bucket) из ?days=&bucket= или текст ошибки."""
+    bucket = params.get('bucket', 'week')
+    if bucket not in MUSCLE_BUCKETS:
+        return None, f'bucket must be one of: {", ".join(MUSCLE_BUCKETS)}'
+    days, error = days_option(params, 30)
+    if error:
+        return None, error
+    return (days, bucket), None
+
+
+class MuscleAnalyticsView(APIView):
+    """
+    GET /api/analytics/muscles/?days=30&bucket=week|day
+
+    Подходы, повторения и тоннаж по группам мышц за каждый день
+    или неделю (date — понедельник). Кешируется до записи данных
+    пользователя или смены дня.
+    """
+
+    def get(self, request):
+        options, error = muscle_options(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+
+        result = get_or_build(
+            'muscles',
+            (user_scope(request.user.pk), CATALOG_SCOPE),
+            (timezone.localdate(), *options),
+            lambda: format_muscles(muscle_rows(request.user, *options)),
+            settings.ANALYTICS_CACHE_TIMEOUT,
+        )
+        return Response(result)
+
+
+def load_options(params):
+    """Параметры нагрузки из ?days=&formula=&exercise_id= или текст ошибки."""
+    formula = params.get('formula', 'epley')
+    if formula not in load.FORMULAS:
+        return None, f'formula must be one of: {", ".join(load.FORMULAS)}'
+    days, error = days_option(params, 90)
+    if error:
+        return None, error
+    exercise_id = params.get('exercise_id')
+    if exercise_id:
+        try:
+            exercise_id = int(exercise_id)
+        except ValueError:
+            return None, 'exercise_id must be an integer'
+    return {
+        'days': days,
+        'formula': formula,
+        'exercise_id': exercise_id or None,
+    }, None
+
+
+class LoadAnalyticsView(APIView):
+    """
+    GET /api/analytics/load/?days=90&formula=epley|brzycki&exercise_id=3
+
+    Тренировочная нагрузка (см. load.py): кривые расчётного 1ПМ
+    по упражнениям с поправкой на RIR, острая/хроническая нагрузка
+    и их отношение по дням, недельный тоннаж по группам мышц.
+    Результат кешируется до записи данных пользователя или смены дня.
+    """
+
+    def get(self, request):
+        options, error = load_options(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+
+        result = get_or_build(
+            'load',
+            (user_scope(request.user.pk), CATALOG_SCOPE),
+            (timezone.localdate(), *options.values()),
+            lambda: load.training_load(request.user, **options),
+            settings.ANALYTICS_CACHE_TIMEOUT,
+        )
+        return Response(result)
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+# ============================================================
+# Выгрузка
+# ============================================================
+
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class ExportView(APIView):
+    """
+    GET /api/export/?format=ndjson|csv
+
+    Вся история подходов пользователя, по строке на подход
+    (с полями тренировки и упражнения). Ответ потоковый; при
+    Accept-Encoding: gzip сжимается на лету.
+    """
+
+    FORMATS = {
+        'ndjson': (export.ndjson_stream, 'application/x-ndjson'),
+        'csv': (export.csv_stream, 'text/csv; charset=utf-8'),
+    }
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= здесь выбирает формат выгрузки, а не рендерер DRF;
+        # ошибки (401, 400) отдаются обычным JSON
+        renderer = JSONRenderer()
+        return renderer, renderer.media_type
+
+    def get(self, request):
+        fmt = request.query_params.get('format', 'ndjson')
+        if fmt not in self.FORMATS:
             return Response(
-                {'error': 'exercise_id is required'}, status=400,
+                {'error': f'format: одно из {", ".join(self.FORMATS)}'},
+                status=400,
             )
 
-        days = int(request.query_params.get('days', 90))
-        since = timezone.now() - timedelta(days=days)
+        encode, content_type = self.FORMATS[fmt]
+        stream = encode(export.export_rows(request.user))
+
+        compress = _ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if compress:
+            stream = export.gzip_stream(stream)
+
+        response = StreamingHttpResponse(
+            export.for_server(request, stream), content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="workouts.{fmt}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
 
-        data = (
-            WorkoutSet.objects
-            .filter(
-                workout__user=request.user,
-                exercise_id=exercise_id,
-                workout__start_time__gte=since,
+class ImportView(APIView):
+    """
+    POST /api/import/ (multipart: file, format — необязательно)
+
+    Импорт CSV-выгрузки Strong, Hevy или FitNotes. Ответ — поток NDJSON:
+    строка прогресса после каждой пачки (строки, подходы, скорость)
+    и итоговая строка с 'done': true.
+    """
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Нужен файл в поле file'}, status=400)
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            importer = HistoryImporter(
+                request.user, stream, fmt=request.data.get('format') or None,
             )
-            .annotate(date=TruncDate('workout__start_time'))
-            .values('date')
-            .annotate(max_weight=Max('weight'))
-            .order_by('date')
+        except ImportFormatError as exc:
+            return Response({'error': str(exc)}, status=400)
+
+        def progress(lines):
+            # Закрытие ответа (отключение клиента) закрывает импорт:
+            # пересборка агрегатов в HistoryImporter.run выполняется сразу
+            with closing(lines):
+                for line in lines:
+                    yield json.dumps(line, ensure_ascii=False) + '\n'
+
+        return StreamingHttpResponse(
+            export.for_server(request, progress(importer.run())),
+            content_type='application/x-ndjson',
         )
 
-        return Response([
-            {'date': row['date'], 'max_weight': row['max_weight']}
-            for row in data
-        ])
 
+# ============================================================
+# Синхронизация
+# ============================================================
 
-class PersonalRecordsView(APIView):
+class SyncView(APIView):
     """
-    GET /api/analytics/records/
+    GET /api/sync/?since=<cursor>
 
-    Личные рекорды по каждому упражнению.
+    Изменения после курсора (см. sync.py): тренировки, все подходы
+    изменившихся тренировок, расписание, свои упражнения и id удалённых
+    записей по типам. Ответ содержит новый cursor; has_more — следующая
+    страница. Без since — только текущий курсор: клиент запоминает его,
+    затем загружает списки целиком и дальше запрашивает изменения.
+    Курсор старше хранимых надгробий → 410 с full_resync: нужно
+    начать так же, как без since.
     """
 
     def get(self, request):
-        data = (
-            WorkoutSet.objects
-            .filter(workout__user=request.user)
-            .values('exercise_id', 'exercise__name', 'exercise__muscle_group')
-            .annotate(max_weight=Max('weight'))
-            .order_by('exercise__name')
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': sync.current(request.user.pk)})
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({'error': 'since must be an integer cursor'}, status=400)
+        try:
+            return Response(sync.changes(request.user, since))
+        except sync.ResyncRequired:
+            return Response({
+                'error': 'cursor is too old, full resync required',
+                'full_resync': True,
+                'cursor': sync.current(request.user.pk),
+            }, status=410)
+
+
+# ============================================================
+# Пакетные запросы
+# ============================================================
+
+class BatchView(APIView):
+    """
+    POST /api/batch/
+
+    {"requests": [{"method": "GET", "path": "/api/workouts/"}, ...],
+     "atomic": false}
+
+    Выполняет до BATCH_MAX_REQUESTS подзапросов к API за один
+    HTTP-запрос (см. batch.py) и возвращает их ответы по порядку:
+    [{status, headers, body}]. С atomic подзапросы идут в одной
+    транзакции; ответ с ошибкой откатывает всё — тогда пакет
+    отвечает 400 с ответами, выполненными до ошибки включительно.
+    """
+
+    def post(self, request):
+        items = request.data.get('requests') if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response(
+                {'error': 'Ожидается непустой массив requests'}, status=400,
+            )
+        if len(items) > settings.BATCH_MAX_REQUESTS:
+            return Response(
+                {'error': f'Не больше {settings.BATCH_MAX_REQUESTS} подзапросов в пакете'},
+                status=400,
+            )
+
+        child = BatchItemSerializer()
+        validated, failed = [], []
+        for index, item in enumerate(items):
+            try:
+                validated.append(child.run_validation(item))
+            except ValidationError as exc:
+                failed.append({'index': index, **exc.detail})
+        if failed:
+            return Response({'errors': failed}, status=400)
+
+        responses, rolled_back = batch.run(
+            request, validated, atomic=bool(request.data.get('atomic')),
         )
+        if rolled_back:
+            return Response({
+                'error': f'Подзапрос {len(responses) - 1} завершился ошибкой, изменения отменены',
+                'responses': responses,
+            }, status=400)
+        return Response({'responses': responses})
+
+
+# ============================================================
+# Метрики
+# ============================================================
+
+@require_GET
+def metrics_view(request):
+    """
+    GET /metrics
 
-        return Response([
-            {
-                'exercise_id': row['exercise_id'],
-                'exercise_name': row['exercise__name'],
-                'muscle_group': row['exercise__muscle_group'],
-                'max_weight': row['max_weight'],
-            }
-            for row in data
-        ])
+    Счётчики запросов процесса в текстовом формате Prometheus
+    (см. metrics.py). Только с Authorization: Bearer <METRICS_TOKEN>;
+    без заданного токена недоступен: время, объёмы и ошибки маршрутов
+    не должны быть публичными.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        return HttpResponse(status=403)
+    if not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}',
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8',
+    )